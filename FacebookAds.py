@@ -1,183 +1,139 @@
 import pandas as pd
 import streamlit as st
 import plotly.express as px
-from google.cloud import storage
-from google.oauth2 import service_account
 from datetime import datetime, timedelta
 from millify import millify
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
-from io import StringIO, BytesIO
-from facebook_business.adobjects.adcreative import AdCreative
-from facebook_business.api import FacebookAdsApi
-from facebook_business.adobjects.ad import Ad
 import streamlit.components.v1 as components
-from facebook_business.adobjects.adaccount import AdAccount
-import requests
+import os
+
+from datasets import BUCKET, load_datasets, get_dataset_version, patch_dataset
+from annotations import apply_changes, diff_annotations, save_annotation_changes
+from periods import slice_period
+from rollups import load_cube, get_cube_version
+from metrics import get_global_metrics, group_metrics
+from creatives import PreviewFetcher
+from figures import cached_figure
+from debug import show_memory_panel, show_graph_panel, show_performance_panel
+from instrumentation import plotly_chart
+from compute_graph import session_graph
+from media import MediaCache, MediaStore, top_spend_lookups, DEFAULT_MEDIA_DIR, DEFAULT_MEDIA_MAX_BYTES
 
 st.set_page_config(layout='wide')
-class NoBlobsFoundError(Exception):
-    pass
 
-def get_custom_metrics(df: pd.DataFrame) -> pd.DataFrame:
+@st.cache_resource(show_spinner=False)
+def get_preview_fetcher(access_token, ad_account) -> PreviewFetcher:
+    return PreviewFetcher(access_token=access_token, ad_account=ad_account)
+
+@st.cache_resource(show_spinner=False)
+def get_media_store(access_token, ad_account) -> MediaStore:
+    max_bytes = int(os.environ['MEDIA_CACHE_MAX_MB']) * 1024 ** 2 if 'MEDIA_CACHE_MAX_MB' in os.environ else DEFAULT_MEDIA_MAX_BYTES
+    cache = MediaCache(directory=os.environ.get('MEDIA_CACHE_DIR', DEFAULT_MEDIA_DIR), max_bytes=max_bytes)
+    return MediaStore(fetcher=get_preview_fetcher(access_token, ad_account), cache=cache)
+
+def show_creative(name, kind, content, height=600, width=300):
+    if content is None:
+        st.warning(f'Preview indisponível para {name}')
+    elif kind == 'video':
+        content = content.replace('height="1920"',  f'height="{height}"')
+        content = content.replace('width="1080"',  f'width="{width}"')
+        components.html(content, height=height, width=width)
+    elif kind == 'image':
+        st.write(name)
+        st.image(content, use_column_width=True)
+    else:
+        st.write(name)
+        components.html(content, width=width, height=height)
+    return
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def group_data(_df: pd.DataFrame, column: str, window_key: tuple):
     """
-    Appends the metrics: Hook_rate, Hold_rate and Attraction_index in a df of facebook ads
-    Hook_rate: views greater then 3s / impressions
-    Hold_rate: views greater then 15s / impressions
-    Attraction_index: views greater then 15s / views greater then 3s
+    metrics.group_metrics of _df (a window of the fb_daily cube) by column. Cached by window_key (data version and
+    filters that produced _df) instead of hashing _df.
     """
-    mock_df = df.copy()
-    needed_cols = {'spend', 'cost_per_thruplay', 'n_video_view', 'impressions', 'date'}
-    if not needed_cols.issubset(set(mock_df.columns)):
-        raise Exception('spend, cost_per_thruplay, n_video_view, impressions or date not found in columns')
-        return
-    else:
-        mock_df['date'] = pd.to_datetime(mock_df['date'])
-        mock_df['date'] = mock_df['date'].dt.date
-        mock_df.sort_values(by='date', inplace=True)
-        return mock_df
-    
-def get_data_from_bucket(bucket_name: str, file_name: str, file_type: str = 'csv') -> BytesIO:
-    """Get file_name from google storage bucket (bucket_name)"""
-    credentials = service_account.Credentials.from_service_account_info(st.secrets["GOOGLE_STORAGE"])
-    client = storage.Client(credentials=credentials)
-    source_bucket_name = bucket_name
-    bucket = client.bucket(source_bucket_name)
-    blob = bucket.blob(file_name)
-    if file_type == 'csv':
-        blob_content = blob.download_as_text()
+    return group_metrics(_df, column)
+
+def build_metric_bar(grouped_fb, metric, column, annotation_option, media, nota_de_corte):
+    """Bar of column by adset (grouped_fb already sorted), colored by the metric or by annotation_option"""
+    color = grouped_fb[column] if annotation_option is None else grouped_fb[annotation_option].astype(str)
+    text = 'lucro' if metric == 'Lucro' else 'n_purchase'
+    metrica_fig = px.bar(grouped_fb, y=grouped_fb.index, x=grouped_fb[column], title=f'Distribuição da métrica {metric} adset', color=color, hover_data=['Valor gasto (%)','Valor gasto (R$)'], height=800, width=300, text=text)
+    if metric == 'Valor gasto':
+        metrica_fig.add_vline(x=nota_de_corte, line_dash='dash', line_color='red', annotation_text='Linha de corte', annotation_position='bottom right')
+    metrica_fig.add_vline(x=media, line_dash= 'dash', line_color='grey', annotation_text='Média', annotation_position='bottom right')
+    return metrica_fig
+
+def build_annotation_bar(grouped_by_annotations, metric, column, annotation_option):
+    """Bar of column by the values of annotation_option (group_data by annotation_option)"""
+    grouped_by_annotations = grouped_by_annotations.sort_values(by=column, ascending=(metric != 'CPA'))
+    metrica_annot_fig = px.bar(grouped_by_annotations, y=grouped_by_annotations.index, x=grouped_by_annotations[column], 
+                               title=f'Distribuição da métrica {metric} por {annotation_option}', 
+                               color=grouped_by_annotations.index.astype(str), 
+                               hover_data=['Valor gasto (%)','Valor gasto (R$)'], height=800, width=300, 
+                               text=[f'{count} adsets' for count in grouped_by_annotations['count']])
+    metrica_annot_fig.add_vline(x=grouped_by_annotations[column].mean(), line_dash= 'dash', line_color='grey',annotation_text='Média',annotation_position='bottom right')
+    return metrica_annot_fig
+
+def build_top_bottom(grouped_fb, metric, column):
+    """5 best and 5 worst adsets of grouped_fb (already sorted) by column"""
+    if (metric == 'CPTV') or (metric == 'CPA'):
+        best_tmp = grouped_fb.head(5)
+        worst_tmp = grouped_fb.tail(5)
     else:
-        blob_content = blob.download_as_bytes()
-    return blob_content
+        best_tmp = grouped_fb.tail(5)
+        worst_tmp = grouped_fb.head(5)
 
-def upload_dataframe_to_gcs(bucket_name, dataframe, destination_blob_name):
-    """Uploads a Pandas DataFrame to Google Cloud Storage in Feather format."""
-    feather_buffer = BytesIO()
-    dataframe.to_feather(feather_buffer)
+    #Ajustando o valor gasto para números amigáveis
+    pretty_values_best = best_tmp['spend'].apply(lambda x: millify(x, precision=1)).to_numpy()
+    pretty_values_worst = worst_tmp['spend'].apply(lambda x: millify(x, precision=1)).to_numpy()
 
-    feather_buffer.seek(0)
-    
-    credentials = service_account.Credentials.from_service_account_info(st.secrets["GOOGLE_STORAGE"])
-    storage_client = storage.Client(credentials=credentials)
-    bucket = storage_client.bucket(bucket_name)
-    blob = bucket.blob(destination_blob_name)
+    fig = make_subplots(rows=1, cols=2, column_titles=[f'5 melhores segundo a métrica {metric}', f'5 piores segundo a métrica {metric}'], shared_yaxes=True)
+    hover_template = 'Valor Gasto: %{customdata}<br> Métrica: %{y}'
+    fig.add_trace(go.Bar(x=best_tmp.index, y=best_tmp[column], customdata=pretty_values_best, hovertemplate=hover_template), row=1, col=1)
+    fig.add_trace(go.Bar(x=worst_tmp.index, y=worst_tmp[column], customdata=pretty_values_worst, hovertemplate=hover_template), row=1, col=2)
+    fig.update_layout(showlegend=False)
+    return fig
 
-    blob.upload_from_file(feather_buffer, content_type="application/octet-stream")
-    return
+def build_scatter(grouped_fb, x, y, annotation_option):
+    if annotation_option is None:
+        scateer_fig = px.scatter(data_frame=grouped_fb, x=x, y=y, color=grouped_fb.index, color_discrete_sequence=px.colors.qualitative.Light24)
+        scateer_fig.update_layout(showlegend=False)
+    else:
+        scateer_fig = px.scatter(data_frame=grouped_fb, x=x, y=y, color=grouped_fb[annotation_option].astype(str), color_discrete_sequence=px.colors.qualitative.Light24)
+    return scateer_fig
 
-def process_data(file_name):
-    tmp_file = get_data_from_bucket(bucket_name='dashboard_marketing_processed', file_name=file_name)
-    fb_data = pd.read_csv(StringIO(tmp_file))
-    fb_data = get_custom_metrics(fb_data)
-    fb_data['action_value_purchase'].fillna(value=0, inplace=True)
-    fb_data['lucro'] = fb_data['action_value_purchase'] - fb_data['spend']
-    fb_data['lucro'] = fb_data['lucro'].round(2)
-    fb = fb_data.loc[(fb_data['campaign_name'] == '[CONVERSAO] [DIP] Broad')].copy()
-    return fb
-
-def get_advideos(hash, access_token):
-    url = f"https://graph.facebook.com/v18.0/{hash}"
-
-    headers = {
-        "Host": "graph.facebook.com",
-        "Authorization": f"Bearer {access_token}",
-    }
-    
-    params = {
-    "fields": "embed_html",
-    }
-    response = requests.get(url, headers=headers, params=params)
-    data = response.json()
-    html = data.get("embed_html")
-    return html
-
-def show_video(hash, access_token, height, width):
-    
-    try:
-        link = get_advideos(hash=hash, access_token=access_token)
-        link = link.replace('height="1920"',  f'height="{height}"')
-        link = link.replace('width="1080"',  f'width="{width}"')
-        components.html(link, height=height, width=width)
-    except Exception as e:
-        st.warning(e)
-    return
+def build_adset_history(fb_data, selected_adsets, metric, column):
+    """Daily column of each of selected_adsets"""
+    selected_data = fb_data.loc[fb_data['name'].isin(selected_adsets)]
+    tmp = selected_data[['date', 'name', 'spend', 'n_purchase', 'lucro', 'n_post_engagement','action_value_purchase', 'n_landing_page_view']].groupby(by=['date', 'name'], observed=True).sum()
+    tmp['cpa_purchase'] = tmp['spend'] / tmp['n_purchase']
+    tmp['ROAS'] = round(tmp['action_value_purchase'] / tmp['spend'],2)
+    tmp['CPTV'] = round(tmp['spend'] / tmp['n_landing_page_view'], 2)
 
-def get_adimage(ad_account, img_hash):
-    account = AdAccount(ad_account)
-    params = {
-        'hashes': [img_hash],
-    }
-    images = account.get_ad_images(params=params, fields=['url'])
-    return images[0].get('url')
-
-@st.cache_data
-def count_adsets_by_annotation(df):
-    idea_counts = {idea: len(df.loc[df['big_idea'] == idea, 'name'].unique()) for idea in df['big_idea'].unique()}
-    awareness_count = {level: len(df.loc[df['awareness_level'] == level, 'name'].unique()) for level in df['awareness_level'].unique()}
-    author_count = {author: len(df.loc[df['Author'] == author, 'name'].unique()) for author in df['Author'].unique()}
-    
-    idea_df = pd.DataFrame.from_dict(data=idea_counts, orient='index', columns=['count'])
-    awareness_df = pd.DataFrame.from_dict(data=awareness_count, orient='index', columns=['count'])
-    author_df = pd.DataFrame.from_dict(data=author_count, orient='index',columns=['count'])
-    
-    return idea_df, awareness_df, author_df
-
-@st.cache_data
-def group_data(df: pd.DataFrame, column: str):
-    grouped_fb = df[[column, 'spend', 'n_purchase', 'lucro', 'n_post_engagement', 'action_value_purchase', 'n_landing_page_view']].groupby(by=[column]).sum()
-    grouped_fb['lucro'] = grouped_fb['lucro'].round(2)
-    grouped_fb['Valor gasto (%)'] = (grouped_fb['spend']/grouped_fb['spend'].sum()) * 100
-    grouped_fb['Valor gasto (%)'] = grouped_fb['Valor gasto (%)'].round(1)
-    grouped_fb['cpa_purchase'] = round(grouped_fb['spend'] / grouped_fb['n_purchase'],2)
-    grouped_fb['Valor gasto (R$)'] = grouped_fb['spend'].apply(lambda x: millify(x, precision=1))
-    grouped_fb['ROAS'] = round(grouped_fb['action_value_purchase']/grouped_fb['spend'],2)
-    grouped_fb['CPTV'] = round(grouped_fb['spend'] / grouped_fb['n_landing_page_view'],2)
-    return grouped_fb
-
-def get_preview(ad_id):
-    creativeID = Ad(ad_id).get_ad_creatives()[0]["id"]
-    fields = [
-    ]
-    params = {
-      'ad_format': 'INSTAGRAM_STANDARD',
-    }
-    tmp = AdCreative(creativeID).get_previews(fields=fields, params=params)
-    tmp = tmp[0]['body']
-    try:
-        return tmp.replace(';t', '&t')
-    except:
-        return None
+    hist_fig = go.Figure()
+    for name in tmp.index.get_level_values('name').unique():
+        aux = tmp.loc[tmp.index.get_level_values('name') == name]
+        hist_fig.add_trace(go.Scatter(x=aux.index.get_level_values('date'), y=aux[column], mode='lines+markers', name=name))
+
+    hist_fig.update_layout(title= f'Evolução da metrica {metric} para {selected_adsets} no periodo', yaxis_title=metric)
+    return hist_fig
 
 def get_adsets_ativos(date_range, fb_data):
     if date_range[0] < date_range[1]:
-        g_data = fb_data[['name', 'date']].groupby(by='name').count()
+        g_data = fb_data[['name', 'date']].groupby(by='name', observed=True).count()
         adsets_ativos = g_data.loc[g_data['date'] > 1].index.get_level_values('name')
         return adsets_ativos
     else:
         return None
     
-def get_global_metrics(df):
-    metricas = {}
-    metricas['alcance'] = df['reach'].sum()
-    metricas["frequencia"] = df['impressions'].sum()/df['reach'].sum()
-    metricas['cpc'] = df['spend'].sum() / df['inline_link_clicks'].sum()
-    metricas['true_visits'] = df['n_landing_page_view'].sum() / df['inline_link_clicks'].sum()
-    metricas['cptv'] = metricas['cpc'] / metricas['true_visits'] #Mesma coisa que o CPTV
-    metricas['cpm'] = df['spend'].sum() / (df['impressions'].sum()/1000)
-    metricas['lp_views'] = df['n_landing_page_view'].sum()
-    metricas['custo_reaçao'] = df['spend'].sum() / df['n_post_reaction'].sum()
-    metricas['custo_comentario'] = df['spend'].sum() / df['n_comments'].sum()
-    metricas['custo_compartilhamento'] = df['spend'].sum() / df['n_shares'].sum()
-    metricas['investimento'] = df['spend'].sum()
-    metricas['faturamento'] = df['action_value_purchase'].sum()
-    metricas['roas'] = metricas['faturamento'] / metricas['investimento']
-    metricas['lucro'] = metricas['faturamento'] - metricas['investimento']
-    metricas['CPTV'] = df['spend'].sum()/df['n_landing_page_view'].sum()
-    return metricas
-
 def update_annotations(old_annotations, new_annotations):
-    old_annotations.update(new_annotations)
-    upload_dataframe_to_gcs(bucket_name='dashboard_marketing_processed', dataframe=old_annotations, destination_blob_name='annotations_df.feather')
+    changes = diff_annotations(old_annotations, new_annotations)
+    if len(changes) == 0:
+        return
+    previous, current = save_annotation_changes(BUCKET, changes) # só as células alteradas vão para o log
+    patch_dataset('annotations', lambda annotations: apply_changes(annotations, changes), previous, current)
     return
 
 ###################### GETTING THE DATA #########################################
@@ -185,79 +141,171 @@ def update_annotations(old_annotations, new_annotations):
 access_token = st.secrets['FACEBOOK']['access_token']
 act_id = st.secrets['FACEBOOK']['act_id']
 
-try:
-    fb = st.session_state['fb']
-    ads = st.session_state['ads']
-    dct_ads = st.session_state['dct']
-    annotations_df = st.session_state['annotations_df']
-except:
-    fb = process_data('processed_adsets.csv')
-    st.session_state['fb'] = fb
-    ads = process_data('processed_ads.csv')
-    st.session_state['ads'] = ads
-    dct_ads = process_data('processed_ads_by_media.csv')
-    st.session_state['dct'] = dct_ads
-    tmp_annotations = get_data_from_bucket(bucket_name='dashboard_marketing_processed', file_name='annotations_df.feather', file_type='.feather')
-    annotations_df = pd.read_feather(BytesIO(tmp_annotations))
-    annotations_df['big_idea'] = annotations_df['big_idea'].astype(str)
-    annotations_df['Author'] = annotations_df['Author'].astype(str)
-    st.session_state['annotations_df'] = annotations_df
-
-
-#Process
-FacebookAdsApi.init(access_token=access_token)
-
-dct_ads['ad_id'] = dct_ads['ad_id'].astype(str)
-ads['ad_id'] = ads['ad_id'].astype(str)
-
-#Check if are new adsets not included in annotadions_df
-not_in_annotations = list(set(fb['name']) - set(annotations_df.index))
-missing_entries_df = pd.DataFrame(index=not_in_annotations, columns=annotations_df.columns)
-missing_entries_df.fillna(value='', inplace=True)
-temp_annotations = pd.concat([annotations_df, missing_entries_df])
-st.session_state['annotations_df'] = temp_annotations
+datasets = load_datasets(['fb', 'ads', 'dct', 'annotations'])
+fb_cube = load_cube('fb_daily') # date x adset x annotations sums of fb
+if st.session_state.get('authentication_status'): # painéis de debug só para quem fez login
+    show_memory_panel()
+
+# Cálculos da página como um grafo: cada nó só roda de novo quando um widget ou dataset do qual depende muda
+graph = session_graph('facebook_ads')
+for name in ['fb', 'ads', 'dct', 'annotations']:
+    graph.set_input(name, datasets[name], key=get_dataset_version(name))
+graph.set_input('fb_cube', fb_cube, key=get_cube_version('fb_daily'))
+
+@graph.node('annotations_df', ['fb', 'annotations'])
+def add_missing_annotations(fb, annotations_df):
+    #Check if are new adsets not included in annotadions_df
+    not_in_annotations = list(set(fb['name']) - set(annotations_df.index))
+    missing_entries_df = pd.DataFrame(index=not_in_annotations, columns=annotations_df.columns)
+    missing_entries_df.fillna(value='', inplace=True)
+    return pd.concat([annotations_df, missing_entries_df])
+
+@graph.node('fb_period', ['fb_cube', 'date_range'])
+@graph.node('benchmark_period', ['fb_cube', 'dates_benchmark'])
+def period_window(fb_cube, date_range):
+    return slice_period(fb_cube, date_range[0], date_range[1])
+
+@graph.node('fb_data', ['fb_period', 'date_range', 'more_than_one_day'])
+@graph.node('fb_benchmark', ['benchmark_period', 'dates_benchmark', 'more_than_one_day'])
+def active_window(window, date_range, more_than_one_day):
+    adsets_ativos = get_adsets_ativos(fb_data=window, date_range=date_range)
+    if (more_than_one_day == 'Sim') and (adsets_ativos is not None):
+        return window.loc[window['name'].isin(adsets_ativos)]
+    return window
+
+@graph.node('media_prefetch', ['dct', 'date_range'])
+def prefetch_media(dct_ads, date_range):
+    get_media_store(access_token, act_id).prefetch(top_spend_lookups(slice_period(dct_ads, date_range[0], date_range[1]))) # aquece o cache dos criativos em segundo plano
+
+@graph.node('limited_annotations', ['annotations_df', 'fb_period'])
+def limit_annotations(annotations_df, fb_period):
+    return annotations_df.loc[annotations_df.index.isin(fb_period['adset_name'].unique())]
+
+graph.node('metricas_globais', ['fb_data'])(get_global_metrics)
+graph.node('referência_globais', ['fb_benchmark'])(get_global_metrics)
+
+@graph.node('grouped_fb', ['fb_data', 'window_key', 'annotations_df'])
+def group_adsets(fb_data, window_key, annotations_df):
+    grouped_fb = group_data(fb_data, 'name', window_key).drop(columns='count')
+    return grouped_fb.merge(annotations_df, left_index=True, right_index=True, how='left')
+
+@graph.node('sorted_grouped_fb', ['grouped_fb', 'metric'])
+def sort_adsets(grouped_fb, metric):
+    # CPA: maior para o menor, as demais métricas do menor para o maior
+    if metric == 'CPA':
+        return grouped_fb.sort_values(by='cpa_purchase', ascending=False)
+    return grouped_fb.sort_values(by=map_option.get(metric), ascending=True)
+
+@graph.node('summary', ['fb_data', 'grouped_fb', 'metricas_globais'])
+def summarize(fb_data, grouped_fb, metricas_globais):
+    n_adsets = fb_data['name'].unique().shape[0]
+    Total_vendas_fb = fb_data['n_purchase'].sum().astype(int)
+    medias = {'Valor gasto': round(fb_data['spend'].sum()/n_adsets, 1),              #Medidas em relação a todo o periodo selecionado
+              'Vendas totais': round(Total_vendas_fb/n_adsets,1),
+              'CPA': round(fb_data['spend'].sum()/fb_data['n_purchase'].sum(), 2),
+              'Lucro': round(grouped_fb['lucro'].sum()/n_adsets, 1),
+              'Engajamento': round(fb_data['n_post_engagement'].sum() / n_adsets,1),
+              'ROAS': round(fb_data['action_value_purchase'].sum()/fb_data['spend'].sum()),
+              'CPTV': round(fb_data['spend'].sum()/fb_data['n_landing_page_view'].sum(),2)
+               }
+    return {'Total_vendas_fb': Total_vendas_fb, 'medias': medias,
+            'nota_de_corte': metricas_globais['investimento']/n_adsets * 0.2}
+
+@graph.node('metric_bar', ['sorted_grouped_fb', 'summary', 'window_key', 'metric', 'annotation_option'])
+def metric_bar(grouped_fb, summary, window_key, metric, annotation_option):
+    return cached_figure('fb_metric_bar', window_key + (metric, annotation_option),
+                         lambda: build_metric_bar(grouped_fb, metric, map_option.get(metric), annotation_option, summary['medias'].get(metric), summary['nota_de_corte']))
+
+@graph.node('annotation_bar', ['fb_data', 'window_key', 'metric', 'annotation_option'])
+def annotation_bar(fb_data, window_key, metric, annotation_option):
+    return cached_figure('fb_annotation_bar', window_key + (metric, annotation_option),
+                         lambda: build_annotation_bar(group_data(fb_data, annotation_option, window_key), metric, map_option.get(metric), annotation_option))
+
+@graph.node('top_bottom', ['sorted_grouped_fb', 'window_key', 'metric'])
+def top_bottom(grouped_fb, window_key, metric):
+    return cached_figure('fb_top_bottom', window_key + (metric,), lambda: build_top_bottom(grouped_fb, metric, map_option.get(metric)))
+
+@graph.node('scatter', ['grouped_fb', 'window_key', 'scatter_metrics', 'annotation_option'])
+def scatter(grouped_fb, window_key, scatter_metrics, annotation_option):
+    return cached_figure('fb_scatter', window_key + (scatter_metrics, annotation_option),
+                         lambda: build_scatter(grouped_fb, map_option.get(scatter_metrics[0]), map_option.get(scatter_metrics[1]), annotation_option))
+
+@graph.node('adset_history', ['fb_data', 'window_key', 'metric', 'selected_adsets'])
+def adset_history(fb_data, window_key, metric, selected_adsets):
+    return cached_figure('fb_adset_history', window_key + (metric, selected_adsets),
+                         lambda: build_adset_history(fb_data, list(selected_adsets), metric, map_option.get(metric)))
+
+@graph.node('creatives', ['ads', 'dct', 'date_range', 'selected_adsets'])
+def select_creatives(ads, dct_ads, date_range, selected_adsets):
+    # Adsets para a análise
+    limited_dct = slice_period(dct_ads, date_range[0], date_range[1])
+    limited_dct = limited_dct.loc[limited_dct['adset_name'].isin(selected_adsets)]
+    limited_ads = slice_period(ads, date_range[0], date_range[1])
+    limited_ads = limited_ads.loc[limited_ads['adset_name'].isin(selected_adsets)]
+
+    tmp_dct = limited_dct.copy() #Pegando os dados de ads dct
+    tmp_dct['name'] = tmp_dct['video_name'].astype('string').fillna(tmp_dct['name'].astype('string'))
+    tmp_dct.drop(['video_name'], axis=1, inplace=True)
+
+    not_dct = set(selected_adsets) - set(limited_dct['adset_name'])
+    if len(not_dct) > 0:
+        tmp_ads = limited_ads.loc[limited_ads['adset_name'].isin(not_dct)]
+        return pd.concat([tmp_dct, tmp_ads], axis=0)
+    return tmp_dct
+
+@graph.node('creatives_fig', ['creatives', 'metric'])
+def creatives_figure(tmp_creatives, metric):
+    tmp_plot = tmp_creatives[['adset_name', 'name', 'spend', 'n_purchase', 'lucro', 'n_post_engagement','action_value_purchase', 'n_landing_page_view']].groupby(by=['adset_name', 'name'], observed=True).sum()
+    tmp_plot['cpa_purchase'] = round(tmp_plot['spend'] / tmp_plot['n_purchase'])
+    tmp_plot['ROAS'] = round(tmp_plot['action_value_purchase']/tmp_plot['spend'], 2)
+    tmp_plot['CPTV'] = round(tmp_plot['spend'] / tmp_plot['n_landing_page_view'], 2)
+    tmp_plot.reset_index(inplace=True)
+
+    if metric == 'CPA':
+        tmp_plot.sort_values(by='cpa_purchase', inplace=True, ascending=False)
+        return px.bar(data_frame=tmp_plot, x='cpa_purchase', y='name', color='adset_name')
+    tmp_plot.sort_values(by=map_option.get(metric), inplace=True, ascending=True)
+    return px.bar(data_frame=tmp_plot, x=map_option.get(metric), y='name', color='adset_name')
+
+@graph.node('creatives_grid', ['creatives', 'selected_adset'])
+def creatives_grid(tmp_creatives, selected_adset):
+    prev = tmp_creatives.loc[tmp_creatives['adset_name'] == selected_adset]
+    prev = prev.loc[prev['name'] != 'Auto-generated videos from image']
+    grid = []
+    for name in prev['name'].unique():
+        creative = prev.loc[prev['name'] == name]
+        if(creative['asset_type'] == 'video_asset').all(): #criativo do tipo video
+            grid.append((name, 'video', creative['hash'].iloc[0]))
+        elif(creative['asset_type'] == 'image_asset').all():
+            grid.append((name, 'image', creative['hash'].iloc[0]))
+        else:
+            grid.append((name, 'preview', creative['ad_id'].iloc[0]))
+    return grid
 
 # FILTRANDO OS DADOS
-date_range = st.sidebar.date_input("Datas", value=(datetime.today()-timedelta(days=7), datetime.today()-timedelta(days=1)), max_value=datetime.today()-timedelta(days=1))
-fb_data = fb.loc[(fb['date'] >= date_range[0]) &(fb['date'] <= date_range[1])].copy()
-fb_data = fb_data.merge(annotations_df, right_index=True, left_on='adset_name', how='left')
+date_range = graph.set_input('date_range', tuple(st.sidebar.date_input("Datas", value=(datetime.today()-timedelta(days=7), datetime.today()-timedelta(days=1)), max_value=datetime.today()-timedelta(days=1))))
+graph.get('media_prefetch')
 metric_options = ['Valor gasto', 'CPA', 'Lucro', 'Engajamento', 'ROAS', 'CPTV']
-metric = st.sidebar.radio(label="Selecione a métrica", options=metric_options, horizontal=True)
+metric = graph.set_input('metric', st.sidebar.radio(label="Selecione a métrica", options=metric_options, horizontal=True))
 map_option = {'Valor gasto':'spend', 'CPA':'cpa_purchase', 'Lucro':'lucro', 'Engajamento':'n_post_engagement', 'ROAS':'ROAS', 'CPTV':'CPTV'}
 
 # Pegando os dados do mes de referência
-dates_benchmark = st.date_input(label='Escolha o período de referência', value=[datetime.strptime('2023-10-01', '%Y-%m-%d'), datetime.strptime('2023-10-31', '%Y-%m-%d')])
-fb_benchmark = fb.loc[(fb['date'] >= dates_benchmark[0]) & (fb['date'] <= dates_benchmark[1])].copy()
-limited_annotations = annotations_df.loc[annotations_df.index.isin(fb_data['adset_name'].unique())]
+graph.set_input('dates_benchmark', tuple(st.date_input(label='Escolha o período de referência', value=[datetime.strptime('2023-10-01', '%Y-%m-%d'), datetime.strptime('2023-10-31', '%Y-%m-%d')])))
 
 # Pegando o número de adsets
-adsets_ativos = get_adsets_ativos(fb_data=fb_data, date_range=date_range)
-adsets_ativos_benchmark = get_adsets_ativos(fb_data=fb_benchmark, date_range=dates_benchmark)
 more_than_one_day = st.sidebar.radio(label='Somente adsets ativos há mais de um dia?', options=['Sim', 'Não'], horizontal=True)
-if (more_than_one_day == 'Sim')&(date_range[0] != date_range[1]):
-    fb_data = fb_data.loc[fb_data['name'].isin(adsets_ativos)].copy()
-    fb_benchmark = fb_benchmark.loc[fb_benchmark['name'].isin(adsets_ativos_benchmark)].copy()
+if date_range[0] == date_range[1]:
+    more_than_one_day = 'Não'
+graph.set_input('more_than_one_day', more_than_one_day)
 
-
-ideia_counts, awareness_counts, authors_count = count_adsets_by_annotation(fb_data)
+graph.set_input('window_key', (get_cube_version('fb_daily'), date_range, more_than_one_day)) # tudo o que define fb_data
 
 ##################### GETTING SOME NUMBERS ######################################
-n_adsets = fb_data['name'].unique().shape[0]
-metricas_globais = get_global_metrics(fb_data)
-referência_globais = get_global_metrics(fb_benchmark)
-Total_vendas_fb = fb_data['n_purchase'].sum().astype(int)
-
-grouped_fb = group_data(fb_data, 'name')
-grouped_fb = grouped_fb.merge(annotations_df, left_index=True, right_index=True, how='left')
-medias = {'Valor gasto': round(fb_data['spend'].sum()/n_adsets, 1),              #Medidas em relação a todo o periodo selecionado
-          'Vendas totais': round(Total_vendas_fb/n_adsets,1),
-          'CPA': round(fb_data['spend'].sum()/fb_data['n_purchase'].sum(), 2),
-          'Lucro': round(grouped_fb['lucro'].sum()/n_adsets, 1),
-          'Engajamento': round(fb_data['n_post_engagement'].sum() / n_adsets,1), 
-          'ROAS': round(fb_data['action_value_purchase'].sum()/fb_data['spend'].sum()),
-          'CPTV': round(fb_data['spend'].sum()/fb_data['n_landing_page_view'].sum(),2)   
-           }
-nota_de_corte = metricas_globais['investimento']/n_adsets * 0.2
+fb_data = graph.get('fb_data')
+fb_benchmark = graph.get('fb_benchmark')
+metricas_globais = graph.get('metricas_globais')
+referência_globais = graph.get('referência_globais')
+Total_vendas_fb = graph.get('summary')['Total_vendas_fb']
 
 ######################### Start #########################################
 st.title('Analise Semanal do desempenho no Facebook')
@@ -284,249 +332,47 @@ annotation_option = None
 with adset_expander:
     annotations_indicator = st.checkbox('Usar dados de anotações (Big Idea, Awareness Level, Author)', value=True)
     if annotations_indicator == True:
-        annotation_option = st.sidebar.radio(label='opções', label_visibility='collapsed', options=annotations_df.columns)
-
-    if metric == 'CPA':
-        grouped_fb.sort_values(by='cpa_purchase', inplace=True, ascending=False)
+        annotation_option = st.sidebar.radio(label='opções', label_visibility='collapsed', options=graph.get('annotations_df').columns)
+    graph.set_input('annotation_option', annotation_option)
 
-        if annotation_option is None:
-            metrica_fig = px.bar(grouped_fb, y=grouped_fb.index, x=grouped_fb[map_option.get(metric)], title=f'Distribuição da métrica {metric} adset', color=grouped_fb[map_option.get(metric)], hover_data=['Valor gasto (%)','Valor gasto (R$)'], height=800, width=300, text='n_purchase')
-        
-        else:
-             metrica_fig = px.bar(grouped_fb, y=grouped_fb.index, x=grouped_fb[map_option.get(metric)], title=f'Distribuição da métrica {metric} adset', color=grouped_fb[annotation_option].astype(str), hover_data=['Valor gasto (%)','Valor gasto (R$)'], height=800, width=300, text='n_purchase')       
-        
-        metrica_fig.add_vline(x=medias[metric], line_dash= 'dash', line_color='grey', annotation_text='Média', annotation_position='bottom right')
-
-    elif metric == 'Valor gasto':
-        grouped_fb.sort_values(by=map_option.get(metric), inplace=True, ascending=True)
-        if annotation_option is None:
-            metrica_fig = px.bar(grouped_fb, y=grouped_fb.index, x=grouped_fb[map_option.get(metric)], title=f'Distribuição da métrica {metric} adset', color=grouped_fb[map_option.get(metric)], hover_data=['Valor gasto (%)','Valor gasto (R$)'], height=800, width=300, text='n_purchase')
-            metrica_fig.add_vline(x=nota_de_corte, line_dash='dash', line_color='red', annotation_text='Linha de corte',annotation_position='bottom right')
-            metrica_fig.add_vline(x=medias[metric], line_dash= 'dash', line_color='grey', annotation_text='Média',annotation_position='bottom right')
-        else:
-            metrica_fig = px.bar(grouped_fb, y=grouped_fb.index, x=grouped_fb[map_option.get(metric)], title=f'Distribuição da métrica {metric} adset', color=grouped_fb[annotation_option].astype(str), hover_data=['Valor gasto (%)','Valor gasto (R$)'], height=800, width=300, text='n_purchase')
-            metrica_fig.add_vline(x=nota_de_corte, line_dash='dash', line_color='red',annotation_text='Linha de corte',annotation_position='bottom right')
-            metrica_fig.add_vline(x=medias[metric], line_dash= 'dash', line_color='grey',annotation_text='Média',annotation_position='bottom right')
-
-    elif metric == 'Lucro':
-        grouped_fb.sort_values(by=map_option.get(metric), inplace=True, ascending=True)
-        if annotation_option is None:
-            metrica_fig = px.bar(grouped_fb, y=grouped_fb.index, x=grouped_fb[map_option.get(metric)], title=f'Distribuição da métrica {metric} adset', color=grouped_fb[map_option.get(metric)], hover_data=['Valor gasto (%)','Valor gasto (R$)'], height=800, width=300, text='lucro')
-            metrica_fig.add_vline(x=medias.get(metric), line_dash= 'dash', line_color='grey',annotation_text='Média',annotation_position='bottom right')
-        else:
-            metrica_fig = px.bar(grouped_fb, y=grouped_fb.index, x=grouped_fb[map_option.get(metric)], title=f'Distribuição da métrica {metric} adset', color=grouped_fb[annotation_option].astype(str), hover_data=['Valor gasto (%)','Valor gasto (R$)'], height=800, width=300, text='lucro')
-            metrica_fig.add_vline(x=medias.get(metric), line_dash= 'dash', line_color='grey',annotation_text='Média',annotation_position='bottom right')            
-    else:
-        grouped_fb.sort_values(by=map_option.get(metric), inplace=True, ascending=True)
-        if annotation_option is None:
-            metrica_fig = px.bar(grouped_fb, y=grouped_fb.index, x=grouped_fb[map_option.get(metric)], title=f'Distribuição da métrica {metric} adset', color=grouped_fb[map_option.get(metric)], hover_data=['Valor gasto (%)','Valor gasto (R$)'], height=800, width=300, text='n_purchase')
-            metrica_fig.add_vline(x=medias.get(metric), line_dash= 'dash', line_color='grey',annotation_text='Média',annotation_position='bottom right')
-        else:
-            metrica_fig = px.bar(grouped_fb, y=grouped_fb.index, x=grouped_fb[map_option.get(metric)], title=f'Distribuição da métrica {metric} adset', color=grouped_fb[annotation_option].astype(str), hover_data=['Valor gasto (%)','Valor gasto (R$)'], height=800, width=300, text='n_purchase')
-            metrica_fig.add_vline(x=medias.get(metric), line_dash= 'dash', line_color='grey',annotation_text='Média',annotation_position='bottom right')            
-
-    st.plotly_chart(metrica_fig, use_container_width=True)
+    plotly_chart(graph.get('metric_bar'), use_container_width=True)
     ########## BAR CHART BY BIG IDEA/AWARENESS LEVEL ########################
     if annotation_option is not None:
-        grouped_by_annotations = group_data(fb_data, annotation_option)
-        if annotation_option == 'big_idea':
-            grouped_by_annotations = grouped_by_annotations.merge(ideia_counts, left_index=True, right_index=True, how='left')
-        elif annotation_option == 'awareness_level':
-            grouped_by_annotations = grouped_by_annotations.merge(awareness_counts, left_index=True, right_index=True, how='left')
-        elif annotation_option == 'Author':
-            grouped_by_annotations = grouped_by_annotations.merge(authors_count, left_index=True, right_index=True, how='left')           
-        
-        if metric == 'CPA':
-            grouped_by_annotations.sort_values(by='cpa_purchase', inplace=True, ascending=False)
-            metrica_annot_fig = px.bar(grouped_by_annotations, y=grouped_by_annotations.index, x=grouped_by_annotations[map_option.get(metric)], 
-                                       title=f'Distribuição da métrica {metric} por {annotation_option}', 
-                                       color=grouped_by_annotations.index.astype(str), 
-                                       hover_data=['Valor gasto (%)','Valor gasto (R$)'], height=800, width=300, 
-                                       text=[f'{count} adsets' for count in grouped_by_annotations['count']])      
-            metrica_annot_fig.add_vline(x=grouped_by_annotations[map_option.get(metric)].mean(), line_dash= 'dash', line_color='grey',annotation_text='Média',annotation_position='bottom right')
-        elif metric == 'Valor gasto':
-            grouped_by_annotations.sort_values(by=map_option.get(metric), inplace=True, ascending=True)
-            metrica_annot_fig = px.bar(grouped_by_annotations, y=grouped_by_annotations.index, x=grouped_by_annotations[map_option.get(metric)], 
-                                       title=f'Distribuição da métrica {metric} por {annotation_option}', 
-                                       color=grouped_by_annotations.index.astype(str), 
-                                       hover_data=['Valor gasto (%)','Valor gasto (R$)'], height=800, width=300, 
-                                       text=[f'{count} adsets' for count in grouped_by_annotations['count']])
-            metrica_annot_fig.add_vline(x=grouped_by_annotations[map_option.get(metric)].mean(), line_dash= 'dash', line_color='grey',annotation_text='Média',annotation_position='bottom right') 
-        
-        elif metric == 'Lucro':
-            grouped_by_annotations.sort_values(by=map_option.get(metric), inplace=True, ascending=True)
-            metrica_annot_fig = px.bar(grouped_by_annotations, y=grouped_by_annotations.index, x=grouped_by_annotations[map_option.get(metric)], 
-                                       title=f'Distribuição da métrica {metric} por {annotation_option}', 
-                                       color=grouped_by_annotations.index.astype(str), 
-                                       hover_data=['Valor gasto (%)','Valor gasto (R$)'], height=800, width=300, 
-                                       text=[f'{count} adsets' for count in grouped_by_annotations['count']])
-            metrica_annot_fig.add_vline(x=grouped_by_annotations[map_option.get(metric)].mean(), line_dash= 'dash', line_color='grey',annotation_text='Média',annotation_position='bottom right')
-        
-        else:
-            grouped_by_annotations.sort_values(by=map_option.get(metric), inplace=True, ascending=True)
-            metrica_annot_fig = px.bar(grouped_by_annotations, y=grouped_by_annotations.index, x=grouped_by_annotations[map_option.get(metric)], 
-                                       title=f'Distribuição da métrica {metric} por {annotation_option}', 
-                                       color=grouped_by_annotations.index.astype(str), 
-                                       hover_data=['Valor gasto (%)','Valor gasto (R$)'], height=800, width=300, 
-                                       text=[f'{count} adsets' for count in grouped_by_annotations['count']])
-            metrica_annot_fig.add_vline(x=grouped_by_annotations[map_option.get(metric)].mean(), line_dash= 'dash', line_color='grey',annotation_text='Média',annotation_position='bottom right') 
-
-        st.plotly_chart(metrica_annot_fig, use_container_width=True)    
+        plotly_chart(graph.get('annotation_bar'), use_container_width=True)
 
     ########## TOP/BOTTON 5 ############################
-    if (metric == 'CPTV') or (metric == 'CPA'):
-        best_tmp = grouped_fb.head(5)
-        worst_tmp = grouped_fb.tail(5)
-    else:
-        best_tmp = grouped_fb.tail(5)
-        worst_tmp = grouped_fb.head(5)
-
-
-    #Ajustando o valor gasto para números amigáveis
-    pretty_values_best = best_tmp['spend'].apply(lambda x: millify(x, precision=1))
-    pretty_values_best = pretty_values_best.to_numpy().reshape((1, 5))
-    pretty_values_worst = worst_tmp['spend'].apply(lambda x: millify(x, precision=1))
-    pretty_values_worst = pretty_values_worst.to_numpy().reshape((1, 5))
     st.write(metric)
+    plotly_chart(graph.get('top_bottom'), use_container_width=True)
 
-
-    fig = make_subplots(rows=1, cols=2, column_titles=[f'5 melhores segundo a métrica {metric}', f'5 piores segundo a métrica {metric}'], shared_yaxes=True)
-
-    hover_template = 'Valor Gasto: %{customdata}<br> Métrica: %{y}'
-    fig.add_trace(
-        go.Bar(x=best_tmp.index, y=best_tmp[map_option.get(metric)],
-            customdata=pretty_values_best.ravel(), hovertemplate=hover_template),
-        row=1, col=1
-    )
-    fig.add_trace(
-        go.Bar(x=worst_tmp.index, y=worst_tmp[map_option.get(metric)],
-            customdata=pretty_values_worst.ravel(), hovertemplate=hover_template), row=1, col=2)
-    fig.update_layout(showlegend=False)
-
-    st.plotly_chart(fig, use_container_width=True)
-
-    scatter_metrics = st.multiselect('Selecione 2 métricas para o gráfico de dispersão', options=metric_options, max_selections=2, default=['Valor gasto', 'ROAS'])
+    scatter_metrics = graph.set_input('scatter_metrics', tuple(st.multiselect('Selecione 2 métricas para o gráfico de dispersão', options=metric_options, max_selections=2, default=['Valor gasto', 'ROAS'])))
     if len(scatter_metrics) == 2:
-        if annotation_option is None:
-            scateer_fig = px.scatter(data_frame=grouped_fb, x=map_option.get(scatter_metrics[0]), y=map_option.get(scatter_metrics[1]),
-                                 color=grouped_fb.index, color_discrete_sequence=px.colors.qualitative.Light24)
-            scateer_fig.update_layout(showlegend=False)
+        plotly_chart(graph.get('scatter'), use_container_width=True)
 
-        else:
-            scateer_fig = px.scatter(data_frame=grouped_fb, x=map_option.get(scatter_metrics[0]), y=map_option.get(scatter_metrics[1]),
-                                 color=grouped_fb[annotation_option].astype(str), color_discrete_sequence=px.colors.qualitative.Light24)
-           
-        st.plotly_chart(scateer_fig, use_container_width=True)         
-        
 ads_expander = st.expander('Análise pontual', True)
 with ads_expander:
-    selected_adsets = st.multiselect(label="Selecione um ou mais Adsets", options=fb_data['name'].unique())
-    tmp = fb_data[['date', 'name', 'spend', 'n_purchase', 'lucro', 'n_post_engagement','action_value_purchase', 'n_landing_page_view']].groupby(by=['date', 'name']).sum()
-    tmp['cpa_purchase'] = tmp['spend'] / tmp['n_purchase']
-    tmp['ROAS'] = round(tmp['action_value_purchase'] / tmp['spend'],2)
-    tmp['CPTV'] = round(tmp['spend'] / tmp['n_landing_page_view'], 2)
-    tmp = tmp.loc[tmp.index.get_level_values('name').isin(selected_adsets)]
-
-    hist_fig = go.Figure()
-    for name in tmp.index.get_level_values('name').unique():
-        aux = tmp.loc[tmp.index.get_level_values('name') == name]
-        hist_fig.add_trace(go.Scatter(x=aux.index.get_level_values('date'), y=aux[map_option.get(metric)], mode='lines+markers', name=name))
+    graph.set_input('selected_adsets', tuple(st.multiselect(label="Selecione um ou mais Adsets", options=fb_data['name'].unique())))
+    plotly_chart(graph.get('adset_history'), use_container_width=True)
+    plotly_chart(graph.get('creatives_fig'), use_container_width=True)
 
-    hist_fig.update_layout(title= f'Evolução da metrica {metric} para {selected_adsets} no periodo', yaxis_title=metric)
-    st.plotly_chart(hist_fig, use_container_width=True)
+    graph.set_input('selected_adset', st.selectbox(label="Selecione um Adset para explorar os criativos", options=graph.get('creatives')['adset_name'].unique()))
+    creatives_grid = graph.get('creatives_grid')
 
-    # Adsets para a análise
-    limited_dct = dct_ads.loc[dct_ads['adset_name'].isin(selected_adsets) & (dct_ads['date'] >= date_range[0]) & (dct_ads['date'] <= date_range[1])]
-    limited_ads = ads.loc[ads['adset_name'].isin(selected_adsets) & (ads['date'] >= date_range[0]) & (ads['date'] <= date_range[1])]
-    
-    tmp_dct = limited_dct.loc[limited_dct['adset_name'].isin(selected_adsets)] #Pegando os dados de ads dct
-    tmp_dct.loc[~tmp_dct['video_name'].isna(), 'name'] = tmp_dct.loc[~tmp_dct['video_name'].isna(), 'video_name'].values
-    tmp_dct.drop(['video_name'], axis=1, inplace=True)
-    
-    not_dct = set(selected_adsets) - set(limited_dct['adset_name'])
-    if len(not_dct) > 0:
-        tmp_ads = limited_ads.loc[limited_ads['adset_name'].isin(not_dct)]
-        tmp_creatives = pd.concat([tmp_dct, tmp_ads], axis=0)
-    else:
-        tmp_creatives = tmp_dct
-    
-    tmp_plot = tmp_creatives[['adset_name', 'name', 'spend', 'n_purchase', 'lucro', 'n_post_engagement','action_value_purchase', 'n_landing_page_view']].groupby(by=['adset_name', 'name']).sum()
-    tmp_plot['cpa_purchase'] = round(tmp_plot['spend'] / tmp_plot['n_purchase'])
-    tmp_plot['ROAS'] = round(tmp['action_value_purchase']/tmp['spend'], 2)
-    tmp_plot['CPTV'] = round(tmp_plot['spend'] / tmp_plot['n_landing_page_view'], 2)
-    tmp_plot.reset_index(inplace=True)
-
-    if metric == 'CPA':
-        tmp_plot.sort_values(by='cpa_purchase', inplace=True, ascending=False)
-        ads_fig = px.bar(data_frame=tmp_plot, x='cpa_purchase', y='name', color='adset_name')
-        
-    else:
-        tmp_plot.sort_values(by=map_option.get(metric), inplace=True, ascending=True)
-        ads_fig = px.bar(data_frame=tmp_plot, x=map_option.get(metric), y='name', color='adset_name')
-
-    st.plotly_chart(ads_fig, use_container_width=True)
-    
-    selected_adset = st.selectbox(label="Selecione um Adset para explorar os criativos", options=tmp_creatives['adset_name'].unique())
-    prev = tmp_creatives.loc[tmp_creatives['adset_name'] == selected_adset]
-    prev = prev.loc[prev['name'] != 'Auto-generated videos from image']
-    col_0, col_1, col_2 = st.columns(3)  
-    for i, name in enumerate(prev['name'].unique()):
-        creative = prev.loc[prev['name'] == name]
-
-        if(creative['asset_type'] == 'video_asset').all(): #criativo do tipo video
-            id_hash = creative[['ad_id', 'hash']].iloc[0].ravel()
-            if i == 0:
-                with col_0:
-                    show_video(hash=id_hash[1], access_token=access_token, height=600, width=300)
-            elif i == 1:
-                with col_1:
-                    show_video(hash=id_hash[1], access_token=access_token, height=600, width=300)
-            else:
-                with col_2:
-                    show_video(hash=id_hash[1], access_token=access_token, height=600, width=300)
-        
-        elif(creative['asset_type'] == 'image_asset').all():
-            id_hash = creative[['ad_id', 'hash', 'name']].iloc[0].ravel()
-            
-            if i == 0:
-                with col_0:
-                    st.write(id_hash[2])
-                    st.image(get_adimage(act_id, id_hash[1]), use_column_width=True)
-
-            elif i == 1:
-                with col_1:
-                    st.write(id_hash[2])
-                    st.image(get_adimage(act_id, id_hash[1]), use_column_width=True)
-            else:
-                with col_2:
-                    st.write(id_hash[2])
-                    st.image(get_adimage(act_id, id_hash[1]), use_column_width=True)
-        else:  
-                id_hash = creative[['ad_id']].iloc[0].ravel()
-                if i == 0:
-                    with col_0:
-                        st.write(name)
-                        components.html(get_preview(id_hash[0]), width=300, height=600)
-
-                elif i == 1:
-                    with col_1:
-                        st.write(name)
-                        components.html(get_preview(id_hash[0]), width=300, height=600)
-                else:
-                    with col_2:
-                        st.write(name)
-                        components.html(get_preview(id_hash[0]), width=300, height=600)
+    # Todos os criativos do adset de uma vez: do cache em disco, ou em lote da Graph API
+    previews = get_media_store(access_token, act_id).get([(kind, key) for _, kind, key in creatives_grid])
+    grid_columns = st.columns(3)
+    for i, (name, kind, key) in enumerate(creatives_grid):
+        with grid_columns[min(i, 2)]:
+            show_creative(name, kind, previews[(kind, key)])
 
 annotatios_exp = st.expander('Anotações')
 with annotatios_exp:
-    new_annotations = st.data_editor(data=limited_annotations, use_container_width=True, column_config={'Unnamed: 0':st.column_config.TextColumn('Adset name'),
+    new_annotations = st.data_editor(data=graph.get('limited_annotations'), use_container_width=True, column_config={'Unnamed: 0':st.column_config.TextColumn('Adset name'),
                                                                                       'big_idea':st.column_config.TextColumn('Big Idea'),
                                                                                       'awareness_level': 'Awareness_level'})
     save = st.button(label='Save')
     if save == True:
-        update_annotations(old_annotations=annotations_df, new_annotations=new_annotations)
-        tmp_annot = get_data_from_bucket(bucket_name='dashboard_marketing_processed', file_name='annotations_df.feather', file_type='.feather')
-        annotations = pd.read_feather(BytesIO(tmp_annot))
-        annotations['big_idea'] = annotations['big_idea'].astype(str)
-        annotations['Author'] = annotations['Author'].astype(str)
-        st.session_state['annotations_df'] = annotations
\ No newline at end of file
+        update_annotations(old_annotations=graph.get('annotations_df'), new_annotations=new_annotations)
+
+if st.session_state.get('authentication_status'): # painéis de debug só para quem fez login
+    show_graph_panel(graph)
+    show_performance_panel()
@@ -0,0 +1,144 @@
+"""
+Adset annotations (big_idea, awareness_level, Author) stored as a snapshot plus a log of the changes saved after it:
+
+    annotations_df.feather: snapshot, its blob metadata 'seq' is the last delta already included in it
+    annotations_log.json  : {"last_seq": n, "deltas": [{"seq": n, "changes": {adset: {column: value}}}, ...]}
+
+A save appends one delta with only the edited cells to the log. The log is uploaded with if_generation_match on the
+generation it was read at and the save is retried on conflict, so two people saving at the same time don't overwrite
+each other, and the cost of a save depends on the size of the change (plus at most COMPACT_EVERY pending deltas),
+not on the number of annotated adsets. When the log reaches COMPACT_EVERY deltas they are folded into a new snapshot,
+also under generation preconditions. Deltas with seq <= the snapshot seq are skipped when reading, so an interrupted
+compaction never applies a delta twice.
+"""
+import json
+import pandas as pd
+from google.api_core.exceptions import PreconditionFailed
+from io import BytesIO
+
+from gcs import read_blob, read_generation, upload_bytes_to_gcs, upload_dataframe_to_gcs
+
+SNAPSHOT_FILE = 'annotations_df.feather'
+LOG_FILE = 'annotations_log.json'
+COMPACT_EVERY = 20
+MAX_SAVE_ATTEMPTS = 5
+
+
+class AnnotationsConflictError(Exception):
+    pass
+
+
+def read_snapshot(bucket_name: str) -> tuple:
+    """(annotations, generation, seq) of the snapshot"""
+    content, generation, metadata = read_blob(bucket_name, SNAPSHOT_FILE)
+    annotations = pd.read_feather(BytesIO(content))
+    return annotations, generation, int(metadata.get('seq', 0))
+
+
+def read_log(bucket_name: str) -> tuple:
+    """(log, generation) of the delta log, an empty log with generation 0 when it doesn't exist yet"""
+    content, generation, _ = read_blob(bucket_name, LOG_FILE)
+    if content is None:
+        return {'last_seq': 0, 'deltas': []}, 0
+    return json.loads(content), generation
+
+
+def apply_changes(annotations: pd.DataFrame, changes: dict) -> pd.DataFrame:
+    """Writes changes ({adset: {column: value}}) into annotations, in place (new adsets are appended)"""
+    for adset, values in changes.items():
+        for column, value in values.items():
+            annotations.loc[adset, column] = value
+    return annotations
+
+
+def diff_annotations(old_annotations: pd.DataFrame, new_annotations: pd.DataFrame) -> dict:
+    """
+    Cells of new_annotations (e.g. the rows edited in st.data_editor) that differ from old_annotations, as
+    {adset: {column: value}}. Empty cells of new_annotations are ignored, like in DataFrame.update.
+    """
+    changes = {}
+    for adset, row in new_annotations.iterrows():
+        old_row = old_annotations.loc[adset] if adset in old_annotations.index else None
+        for column, value in row.items():
+            if pd.isna(value):
+                continue
+            if (old_row is not None) and (column in old_row.index) and (old_row[column] == value):
+                continue
+            changes.setdefault(str(adset), {})[column] = value.item() if hasattr(value, 'item') else value
+    return changes
+
+
+def load_annotations(bucket_name: str) -> pd.DataFrame:
+    """Snapshot with the pending deltas of the log applied"""
+    annotations, _, snapshot_seq = read_snapshot(bucket_name)
+    log, _ = read_log(bucket_name)
+    for delta in log['deltas']:
+        if delta['seq'] > snapshot_seq:
+            apply_changes(annotations, delta['changes'])
+    annotations['big_idea'] = annotations['big_idea'].astype(str)
+    annotations['Author'] = annotations['Author'].astype(str)
+    return annotations
+
+
+def _upload_log(bucket_name: str, log: dict, generation: int) -> int:
+    return upload_bytes_to_gcs(bucket_name=bucket_name, content=json.dumps(log).encode('utf-8'), destination_blob_name=LOG_FILE,
+                               if_generation_match=generation)
+
+
+def save_annotation_changes(bucket_name: str, changes: dict) -> tuple:
+    """
+    Appends changes to the delta log (compacting it when it gets long). Returns the generations of
+    (SNAPSHOT_FILE, LOG_FILE) before and after the save, as two {file: generation} dicts, so the caller can tell
+    whether its loaded copy was current and patch it instead of reloading.
+    """
+    for _ in range(MAX_SAVE_ATTEMPTS):
+        snapshot_generation = read_generation(bucket_name, SNAPSHOT_FILE) # metadata only, the snapshot isn't needed
+        log, log_generation = read_log(bucket_name)
+        seq = log['last_seq'] + 1
+        log['deltas'].append({'seq': seq, 'changes': changes})
+        log['last_seq'] = seq
+        try:
+            new_log_generation = _upload_log(bucket_name, log, log_generation)
+            break
+        except PreconditionFailed: # someone saved in between, append to their version of the log
+            continue
+    else:
+        raise AnnotationsConflictError(f'Could not save the annotations after {MAX_SAVE_ATTEMPTS} attempts')
+
+    previous = {SNAPSHOT_FILE: snapshot_generation, LOG_FILE: log_generation}
+    current = {SNAPSHOT_FILE: snapshot_generation, LOG_FILE: new_log_generation}
+    if len(log['deltas']) >= COMPACT_EVERY:
+        current = compact_annotations(bucket_name)
+    return previous, current
+
+
+def compact_annotations(bucket_name: str) -> dict:
+    """
+    Folds the pending deltas into a new snapshot and drops them from the log. Returns the {file: generation} after it
+    (left as is when another process compacted at the same time).
+    """
+    content, snapshot_generation, metadata = read_blob(bucket_name, SNAPSHOT_FILE)
+    annotations = pd.read_feather(BytesIO(content))
+    snapshot_seq = int(metadata.get('seq', 0))
+    log, log_generation = read_log(bucket_name)
+    pending = [delta for delta in log['deltas'] if delta['seq'] > snapshot_seq]
+
+    try:
+        if len(pending) > 0:
+            for delta in pending:
+                apply_changes(annotations, delta['changes'])
+            snapshot_seq = pending[-1]['seq']
+            snapshot_generation = upload_dataframe_to_gcs(bucket_name=bucket_name, dataframe=annotations, destination_blob_name=SNAPSHOT_FILE,
+                                                          if_generation_match=snapshot_generation, metadata={'seq': str(snapshot_seq)})
+
+        for _ in range(MAX_SAVE_ATTEMPTS):
+            log['deltas'] = [delta for delta in log['deltas'] if delta['seq'] > snapshot_seq]
+            try:
+                log_generation = _upload_log(bucket_name, log, log_generation)
+                break
+            except PreconditionFailed:
+                log, log_generation = read_log(bucket_name)
+    except PreconditionFailed: # the snapshot was compacted by another process
+        snapshot_generation = read_generation(bucket_name, SNAPSHOT_FILE)
+        log_generation = read_generation(bucket_name, LOG_FILE)
+    return {SNAPSHOT_FILE: snapshot_generation, LOG_FILE: log_generation}
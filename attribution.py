@@ -0,0 +1,119 @@
+"""
+Vectorized attribution engines used by the GA4 and Vendas por canal pages.
+"""
+import numpy as np
+import pandas as pd
+
+from instrumentation import instrumented
+
+
+def purchases_by_session(purchases: pd.DataFrame) -> pd.DataFrame:
+    """
+    Session-keyed lookup of purchase events: n_purchases and event_date (of the first purchase) of each
+    ga_session_id, in the order the sessions are first seen
+    """
+    return purchases.groupby('ga_session_id', sort=False).agg(n_purchases=('event_date', 'size'),
+                                                               event_date=('event_date', 'min'))
+
+
+def sales_attribution(events: pd.DataFrame, by_day: bool = False) -> pd.DataFrame:
+    """
+    Sales page attribution: each page_view (outside hotmart) of a session with purchases gets
+    n_purchases_in_session / n_page_views_in_session points. Sessions with purchases but without page views give
+    their purchases to 'direct'.
+
+    Built from one pass over the events (groupby session + weighted sum per Path). Returns the columns Path, Value
+    (in the order the paths are first seen, session by session) or event_date, Path, Value when by_day is True, where
+    event_date is the day of the first purchase of the session.
+    """
+    event_name = events['event_name']
+    return attribute_sales(events.loc[event_name == 'page_view'], events.loc[event_name == 'purchase'], by_day=by_day)
+
+
+@instrumented('kpi.attribute_sales')
+def attribute_sales(page_views: pd.DataFrame, purchases: pd.DataFrame, by_day: bool = False) -> pd.DataFrame:
+    """sales_attribution from the page_view and purchase events already split (see ga4_events)"""
+    sessions = purchases_by_session(purchases)
+    sessions['rank'] = np.arange(len(sessions))
+
+    views = page_views.loc[page_views['ga_session_id'].isin(sessions.index), ['ga_session_id', 'Path', 'event_page_location']]
+    views = views.loc[~views['event_page_location'].astype(str).str.contains('hotmart', regex=False)]
+
+    sessions['n_pages'] = views.groupby('ga_session_id', sort=False).size().reindex(sessions.index).fillna(0)
+    sessions['points'] = sessions['n_purchases'] / sessions['n_pages'].where(sessions['n_pages'] > 0, 1)
+
+    session_of_view = sessions.loc[views['ga_session_id']]
+    direct = sessions.loc[sessions['n_pages'] == 0]
+    contributions = pd.DataFrame({'rank': np.concatenate([session_of_view['rank'].to_numpy(), direct['rank'].to_numpy()]),
+                                  'position': np.concatenate([np.arange(len(views)), np.full(len(direct), -1)]),
+                                  'event_date': np.concatenate([session_of_view['event_date'].to_numpy(), direct['event_date'].to_numpy()]),
+                                  'Path': np.concatenate([views['Path'].astype(object).to_numpy(), np.full(len(direct), 'direct', dtype=object)]),
+                                  'Value': np.concatenate([session_of_view['points'].to_numpy(), direct['points'].to_numpy()])})
+    contributions.sort_values(by=['rank', 'position'], inplace=True, kind='stable')
+
+    keys = ['event_date', 'Path'] if by_day else ['Path']
+    return contributions.groupby(by=keys, sort=False)['Value'].sum().reset_index()
+
+
+UNIDENTIFIED_SOURCES = ['Desconhecido', 'Branding']
+
+
+@instrumented('kpi.split_revenue_by_source')
+def split_revenue_by_source(journeys: pd.DataFrame, by: list = None, sort: bool = False) -> pd.DataFrame:
+    """
+    Multi-touch revenue split: the commission.value of each sale is divided equally between the sources in its
+    utm_source_wchannel list. The result is grouped by the keys in by (columns of journeys, or 'week' for the week of
+    order_date) plus utm_source_wchannel, sorted by the keys when sort is True or else in the order the groups are
+    first seen. Returns the keys and revenue_per_source.
+    """
+    keys = [] if by is None else list(by)
+    columns = [key for key in keys if key != 'week']
+    if ('week' in keys) and ('order_date' not in columns):
+        columns.append('order_date')
+
+    split = journeys[columns + ['utm_source_wchannel']].copy()
+    split['revenue_per_source'] = journeys['commission.value'] / journeys['utm_source_wchannel'].map(len)
+    if 'week' in keys:
+        split['week'] = split['order_date'].dt.to_period('W').dt.start_time
+    split = split.explode('utm_source_wchannel')
+    split = split.loc[split['utm_source_wchannel'].notna()] # sales without sources have nothing to split
+
+    revenue_df = split.groupby(keys + ['utm_source_wchannel'], sort=sort, dropna=False)['revenue_per_source'].sum().reset_index()
+    revenue_df['revenue_per_source'] = revenue_df['revenue_per_source'].astype(float)
+    return revenue_df
+
+
+@instrumented('kpi.revenue_split_views')
+def revenue_split_views(journeys: pd.DataFrame) -> dict:
+    """
+    Every view of the revenue split used by the Vendas por canal page, computed from a single split:
+
+    total     : utm_source_wchannel, total_revenue, %, simplified_source
+    std       : total without the unidentified sources, whose revenue is spread proportionally (total_revenue_std)
+    simplified: same as std grouped by the simplified source (total_revenue_simplified)
+    daily     : order_date, utm_source_wchannel, revenue_per_source
+    """
+    daily = split_revenue_by_source(journeys, by=['order_date'])
+
+    revenue_by_source = daily.groupby('utm_source_wchannel', sort=False)['revenue_per_source'].sum().reset_index()
+    revenue_by_source.columns = ['utm_source_wchannel', 'total_revenue']
+    revenue_by_source['%'] = revenue_by_source['total_revenue']/revenue_by_source['total_revenue'].sum()
+    revenue_by_source['simplified_source'] = revenue_by_source['utm_source_wchannel'].str.split('_').str[0]
+
+    unidentified = revenue_by_source['utm_source_wchannel'].isin(UNIDENTIFIED_SOURCES)
+    unidentified_revenue = revenue_by_source.loc[unidentified, 'total_revenue'].sum()
+
+    revenue_by_source_std = revenue_by_source.loc[~unidentified].copy()
+    revenue_by_source_std['total_revenue_std'] = revenue_by_source_std['total_revenue'] + (unidentified_revenue * revenue_by_source_std['%'])
+
+    revenue_by_source_simplified = revenue_by_source.groupby(by='simplified_source')['total_revenue'].sum().reset_index()
+    revenue_by_source_simplified['%'] = revenue_by_source_simplified['total_revenue']/revenue_by_source_simplified['total_revenue'].sum()
+    revenue_by_source_simplified = revenue_by_source_simplified.loc[~revenue_by_source_simplified['simplified_source'].isin(UNIDENTIFIED_SOURCES)].copy()
+    revenue_by_source_simplified['total_revenue_simplified'] = revenue_by_source_simplified['total_revenue'] + (unidentified_revenue * revenue_by_source_simplified['%'])
+
+    daily = daily.sort_values(by=['order_date', 'utm_source_wchannel'], ignore_index=True)
+
+    return {'total': revenue_by_source,
+            'std': revenue_by_source_std,
+            'simplified': revenue_by_source_simplified,
+            'daily': daily}
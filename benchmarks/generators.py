@@ -0,0 +1,277 @@
+"""
+Synthetic datasets with the columns and types of the processed files in the bucket, for the benchmarks.
+
+Each generator builds the raw frame of one dataset (as read from its blob) with n_rows rows and runs it through the
+same preprocessing as the dataset registry (the prepare_* function of datasets plus schemas.compact_dataset), so the
+result is what load_dataset would return. Values are drawn from a seeded numpy Generator over DAYS days ending at
+END_DATE, with label cardinalities close to the production ones. The people (emails) are drawn from a pool that
+grows with n_rows and is shared by Hotmart, ActiveCampaign and the leads sheet, so the joins between them match.
+"""
+import numpy as np
+import pandas as pd
+
+import datasets
+from schemas import FB_SCHEMA, apply_schema, compact_dataset, DATE_DTYPE
+
+END_DATE = pd.Timestamp('2024-06-30')
+DAYS = 730
+
+CONVERSION_CAMPAIGN = '[CONVERSAO] [DIP] Broad'
+HOTMART_STATUS = (['APPROVED', 'COMPLETE', 'REFUNDED', 'CANCELED', 'CHARGEBACK', 'WAITING_PAYMENT'],
+                  [0.45, 0.3, 0.08, 0.1, 0.02, 0.05])
+HOTMART_SCK = ['email_upgrade-pro', 'email_newsletter', 'email-abandono-carrinho_1', 'vendas_time', 'vendas-upgrade_time',
+               'home', 'popup_blog', 'basico_1', 'basico-expirou', 'seja-pro', 'youtube_video', 'instagram_bio', None]
+HOTMART_SOURCES = ['YouTube', 'Facebook', 'email', 'Google', 'Instagram', None]
+HOTMART_PRODUCTS = ['Asimov Pro', 'Trilha Python', 'Trilha Data Science', 'Dashboards', 'Mentoria']
+PAYMENT_TYPES = ['CREDIT_CARD', 'BILLET', 'PIX', 'PAYPAL']
+GA4_EVENTS = (['session_start', 'page_view', 'purchase', 'scroll', 'click'], [0.2, 0.55, 0.02, 0.15, 0.08])
+GA4_SOURCES = ['Google', 'Facebook + Instagram', 'YouTube', 'Active Campaign', 'Direct', 'Outros']
+GA4_CHANNELS = ['Paid Search', 'Organic Search', 'Paid Social', 'Organic Social', 'Email', 'Direct', 'Referral']
+JOURNEY_SOURCES = ['Google_ads', 'Google_organic', 'Facebook_ads', 'YouTube_organic', 'Instagram_organic',
+                   'ActiveCampaign_email', 'Desconhecido', 'Branding']
+ANNOTATION_VALUES = {'big_idea': [f'Big idea {i}' for i in range(12)], 'awareness_level': ['Unaware', 'Problem aware',
+                     'Solution aware', 'Product aware', ''], 'Author': ['Ana', 'Bruno', 'Carla', 'Diego', '']}
+
+
+def _rng(seed: int) -> np.random.Generator:
+    return np.random.default_rng(seed)
+
+
+def _days(rng: np.random.Generator, n: int) -> pd.DatetimeIndex:
+    """n random days of the last DAYS days, more recent days being more frequent (the business grows)"""
+    offsets = np.floor(DAYS * np.sqrt(rng.random(n))).astype(np.int64)
+    return pd.DatetimeIndex(END_DATE - pd.to_timedelta(DAYS - 1 - offsets, unit='D'))
+
+
+def _labels(rng: np.random.Generator, prefix: str, n_values: int, n: int) -> np.ndarray:
+    """n labels prefix_0 ... prefix_{n_values-1}, with a long tail like real names"""
+    codes = np.minimum(rng.zipf(1.3, n) - 1, n_values - 1)
+    return np.array([f'{prefix}_{i}' for i in range(n_values)], dtype=object)[codes]
+
+
+def _emails(rng: np.random.Generator, n: int, n_people: int) -> np.ndarray:
+    pool = np.array([f'pessoa{i}@example.com' for i in range(n_people)], dtype=object)
+    emails = pool[rng.integers(0, n_people, n)]
+    emails[rng.random(n) < 0.01] = None # formulários sem e-mail
+    return emails
+
+
+def n_people(n_rows: int) -> int:
+    """Size of the email pool used by the generators for datasets of n_rows rows"""
+    return max(100, n_rows // 4)
+
+
+def raw_fb(n_rows: int, seed: int = 0, ads: bool = False) -> pd.DataFrame:
+    """Facebook adsets file (ads=True: the ads / ads_by_media files, with ad_id, hash and asset_type)"""
+    rng = _rng(seed)
+    n_adsets = max(20, int(np.sqrt(n_rows)))
+    adset_codes = rng.integers(0, n_adsets, n_rows)
+    impressions = rng.gamma(2, 800, n_rows).round()
+    clicks = rng.binomial(impressions.astype(np.int64), 0.012)
+    lp_views = rng.binomial(clicks, 0.7)
+    purchases = rng.binomial(lp_views, 0.02)
+    fb = pd.DataFrame({
+        'date': _days(rng, n_rows).date,
+        'name': np.array([f'Adset {i}' for i in range(n_adsets)], dtype=object)[adset_codes],
+        'adset_name': np.array([f'Adset {i}' for i in range(n_adsets)], dtype=object)[adset_codes],
+        'campaign_name': np.where(rng.random(n_rows) < 0.95, CONVERSION_CAMPAIGN, '[TOPO] Video views'),
+        'spend': rng.gamma(2, 40, n_rows).round(2),
+        'reach': (impressions * rng.uniform(0.6, 0.95, n_rows)).round(),
+        'impressions': impressions,
+        'inline_link_clicks': clicks,
+        'cost_per_thruplay': rng.gamma(2, 0.05, n_rows).round(3),
+        'n_video_view': rng.binomial(impressions.astype(np.int64), 0.2),
+        'n_landing_page_view': lp_views,
+        'n_post_engagement': rng.poisson(30, n_rows),
+        'n_post_reaction': rng.poisson(8, n_rows),
+        'n_comments': rng.poisson(1, n_rows),
+        'n_shares': rng.poisson(0.5, n_rows),
+        'n_purchase': purchases,
+        'action_value_purchase': np.where(purchases > 0, purchases * rng.choice([97.0, 297.0, 997.0], n_rows), np.nan),
+        'video_name': _labels(rng, 'video', 300, n_rows),
+    })
+    if ads: # name is the ad, adset_name its adset
+        fb['name'] = np.char.add(fb['adset_name'].to_numpy(dtype=str), np.char.add(' - Anúncio ', rng.integers(0, 6, n_rows).astype(str)))
+        fb['ad_id'] = rng.integers(10 ** 14, 10 ** 15, n_rows).astype(str)
+        fb['hash'] = _labels(rng, 'hash', 2000, n_rows)
+        fb['asset_type'] = rng.choice(['video_asset', 'image_asset', 'unknown'], n_rows, p=[0.6, 0.3, 0.1])
+    fb['date'] = fb['date'].astype(DATE_DTYPE)
+    return apply_schema(fb, FB_SCHEMA) # read_fb_parquet
+
+
+def raw_annotations(fb: pd.DataFrame, seed: int = 0) -> pd.DataFrame:
+    """Annotations of the adsets of fb, a tenth of them still without annotation"""
+    rng = _rng(seed)
+    adsets = fb['adset_name'].astype(str).unique()
+    annotated = adsets[rng.random(len(adsets)) < 0.9]
+    annotations = pd.DataFrame({column: rng.choice(values, len(annotated)) for column, values in ANNOTATION_VALUES.items()},
+                               index=pd.Index(annotated, name='adset_name'))
+    return annotations
+
+
+def raw_hotmart(n_rows: int, seed: int = 0) -> pd.DataFrame:
+    """Hotmart sales, one row per transaction and commission source (PRODUCER, AFFILIATE, COPRODUCER)"""
+    rng = _rng(seed)
+    n_transactions = max(1, int(n_rows / 1.3))
+    transaction_of_row = np.sort(np.concatenate([np.arange(n_transactions), rng.integers(0, n_transactions, n_rows - n_transactions)]))
+    first = np.r_[True, transaction_of_row[1:] != transaction_of_row[:-1]]
+
+    def per_transaction(values):
+        return values[transaction_of_row]
+
+    order_date = per_transaction(_days(rng, n_transactions).to_numpy()) + per_transaction(rng.integers(0, 86400, n_transactions).astype('timedelta64[s]'))
+    price = per_transaction(rng.choice([97.0, 297.0, 497.0, 997.0, 1997.0], n_transactions, p=[0.3, 0.3, 0.2, 0.15, 0.05]))
+    source = np.where(first, 'PRODUCER', rng.choice(['AFFILIATE', 'COPRODUCER'], n_rows, p=[0.8, 0.2]))
+    return pd.DataFrame({
+        'transaction': np.char.add('HP', transaction_of_row.astype(str)).astype(object),
+        'status': per_transaction(rng.choice(HOTMART_STATUS[0], n_transactions, p=HOTMART_STATUS[1])),
+        'source': source,
+        'product_name': per_transaction(rng.choice(HOTMART_PRODUCTS, n_transactions)),
+        'tracking.source': per_transaction(rng.choice(np.array(HOTMART_SOURCES, dtype=object), n_transactions)),
+        'tracking.source_sck': per_transaction(rng.choice(np.array(HOTMART_SCK, dtype=object), n_transactions)),
+        'tracking.external_code': per_transaction(_labels(rng, 'ext', 500, n_transactions)),
+        'payment.type': per_transaction(rng.choice(PAYMENT_TYPES, n_transactions)),
+        'commission.value': np.where(source == 'PRODUCER', price * 0.9, price * 0.3).round(2),
+        'order_date': order_date,
+        'approved_date': order_date + per_transaction(rng.integers(0, 3 * 86400, n_transactions).astype('timedelta64[s]')),
+        'email': per_transaction(_emails(rng, n_transactions, n_people(n_rows))),
+    })
+
+
+def raw_ga4(n_rows: int, seed: int = 0) -> pd.DataFrame:
+    """GA4 events, grouped in sessions of about 5 events"""
+    rng = _rng(seed)
+    n_sessions = max(1, n_rows // 5)
+    session_of_event = rng.integers(0, n_sessions, n_rows)
+    session_ids = rng.choice(10 ** 10, n_sessions, replace=False)
+    paths = _labels(rng, '/pagina', 400, n_rows)
+    return pd.DataFrame({
+        'event_date': _days(rng, n_sessions)[session_of_event],
+        'event_name': rng.choice(GA4_EVENTS[0], n_rows, p=GA4_EVENTS[1]),
+        'ga_session_id': session_ids[session_of_event],
+        'Path': paths,
+        'event_page_location': np.where(rng.random(n_rows) < 0.05, 'https://pay.hotmart.com/checkout', 'https://asimov.academy' + paths),
+        'utm_source_std': rng.choice(GA4_SOURCES, n_sessions)[session_of_event],
+        'default_channel': rng.choice(GA4_CHANNELS, n_sessions)[session_of_event],
+        'utm_content': _labels(rng, 'content', 1000, n_sessions)[session_of_event],
+        'utm_campaign': _labels(rng, 'campaign', 200, n_sessions)[session_of_event],
+        'utm_source': rng.choice(['google', 'facebook', 'youtube', 'activecampaign', '(direct)'], n_sessions)[session_of_event],
+        'utm_medium': rng.choice(['cpc', 'organic', 'email', '(none)'], n_sessions)[session_of_event],
+    })
+
+
+def raw_active_campaign(n_rows: int, seed: int = 0) -> pd.DataFrame:
+    """ActiveCampaign campaign reports, one row per sent campaign"""
+    rng = _rng(seed)
+    send_date = _days(rng, n_rows)
+    send_amt = rng.integers(500, 50000, n_rows)
+    opens = rng.binomial(send_amt, 0.25)
+    automation = _labels(rng, 'Automação', 80, n_rows)
+    automation[rng.random(n_rows) < 0.3] = None # campanhas avulsas
+    return pd.DataFrame({
+        'automation_name': automation,
+        'headline': _labels(rng, 'Assunto', max(10, n_rows // 3), n_rows),
+        'send_date': send_date,
+        'last_date': send_date + pd.to_timedelta(rng.integers(0, 3, n_rows), unit='D'),
+        'send_amt': send_amt,
+        'uniquelinkclicks': rng.binomial(opens, 0.1),
+        'uniqueopens': opens,
+        'replies': rng.binomial(opens, 0.001),
+        'hardbounces': rng.binomial(send_amt, 0.005),
+        'unsubscribes': rng.binomial(send_amt, 0.002),
+    })
+
+
+def raw_active_contacts(n_rows: int, seed: int = 0) -> tuple:
+    """ActiveCampaign contacts and their tags (array of tag ids per contact, a fifth of the contacts without tags)"""
+    rng = _rng(seed)
+    ids = rng.choice(10 ** 8, n_rows, replace=False)
+    contacts = pd.DataFrame({
+        'id': ids.astype(str),
+        'email': _emails(rng, n_rows, n_people(n_rows)),
+        'cdate': _days(rng, n_rows),
+    })
+    tagged = ids[rng.random(n_rows) < 0.8]
+    n_tags = rng.poisson(3, len(tagged)) + 1
+    tags = np.minimum(rng.zipf(1.5, n_tags.sum()), 300).astype(str) # ids chegam como str no feather
+    active_tags = pd.DataFrame({'contact': tagged.astype(str),
+                                'tag': np.split(tags, np.cumsum(n_tags)[:-1])})
+    return contacts, active_tags
+
+
+def raw_sales_journeys(n_rows: int, seed: int = 0) -> pd.DataFrame:
+    """Valid sales with the list of sources (utm_source_wchannel) touched before the purchase"""
+    rng = _rng(seed)
+    n_sources = rng.integers(0, 5, n_rows)
+    sources = np.array(JOURNEY_SOURCES, dtype=object)[np.minimum(rng.zipf(1.6, n_sources.sum()) - 1, len(JOURNEY_SOURCES) - 1)]
+    order_date = _days(rng, n_rows)
+    return pd.DataFrame({
+        'transaction': np.char.add('HP', np.arange(n_rows).astype(str)).astype(object),
+        'order_date': order_date,
+        'commission.value': rng.choice([87.3, 267.3, 447.3, 897.3], n_rows),
+        'utm_source_wchannel': np.split(sources, np.cumsum(n_sources)[:-1]),
+    })
+
+
+def raw_leads(n_rows: int, seed: int = 0) -> pd.DataFrame:
+    """Rows of the free funnel leads sheet, in sheet (signup) order, with Data already parsed"""
+    rng = _rng(seed)
+    data = np.sort(_days(rng, n_rows).to_numpy())
+    return pd.DataFrame({
+        'Data': data,
+        'Nome': _labels(rng, 'Lead', max(10, n_rows // 2), n_rows),
+        'Email': _emails(rng, n_rows, n_people(n_rows)),
+    })
+
+
+def _compact(name: str, df: pd.DataFrame) -> pd.DataFrame:
+    return compact_dataset(name, df)[0]
+
+
+def generate_fb(n_rows: int, seed: int = 0) -> pd.DataFrame:
+    return _compact('fb', datasets.prepare_fb(raw_fb(n_rows, seed)))
+
+
+def generate_ads(n_rows: int, seed: int = 0) -> pd.DataFrame:
+    return _compact('ads', datasets.prepare_fb_ads(datasets.prepare_fb(raw_fb(n_rows, seed, ads=True))))
+
+
+def generate_hotmart(n_rows: int, seed: int = 0) -> pd.DataFrame:
+    return _compact('hotmart', datasets.prepare_hotmart(raw_hotmart(n_rows, seed)))
+
+
+def generate_ga4(n_rows: int, seed: int = 0) -> pd.DataFrame:
+    return _compact('ga4', datasets.prepare_ga4(raw_ga4(n_rows, seed)))
+
+
+def generate_active_campaign(n_rows: int, seed: int = 0) -> pd.DataFrame:
+    return _compact('active_campaign', datasets.prepare_active_campaign(raw_active_campaign(n_rows, seed)))
+
+
+def generate_active_contacts(n_rows: int, seed: int = 0) -> pd.DataFrame:
+    return datasets.prepare_active_contacts(*raw_active_contacts(n_rows, seed))
+
+
+def generate_sales_journeys(n_rows: int, seed: int = 0) -> pd.DataFrame:
+    return datasets.prepare_sales_journeys(raw_sales_journeys(n_rows, seed))
+
+
+# dataset name (see datasets.DATASETS, plus the leads sheet): generator(n_rows, seed)
+GENERATORS = {
+    'fb': generate_fb,
+    'ads': generate_ads,
+    'dct': generate_ads,
+    'hotmart': generate_hotmart,
+    'ga4': generate_ga4,
+    'active_campaign': generate_active_campaign,
+    'active_contacts': generate_active_contacts,
+    'sales_journeys': generate_sales_journeys,
+    'leads': raw_leads,
+}
+
+
+def generate(name: str, n_rows: int, seed: int = 0) -> pd.DataFrame:
+    """The dataset name with n_rows rows (before the preprocessing filters), as load_dataset would return it"""
+    if name not in GENERATORS:
+        raise KeyError(f'Unknown dataset {name}, options: {list(GENERATORS)}')
+    return GENERATORS[name](n_rows, seed)
@@ -0,0 +1,225 @@
+"""
+Benchmarks of the heavy computations of the pages on synthetic data (see benchmarks.generators), offline.
+
+    python -m benchmarks.run --rows 10k 100k 1M
+    python -m benchmarks.run --rows 10k 100k --save benchmarks/baselines/local.json
+    python -m benchmarks.run --rows 10k 100k --compare benchmarks/baselines/local.json
+
+Every case generates its datasets with the number of rows asked (untimed setup), then runs the computation repeat
+times: the wall time reported is the best run and the peak memory is the tracemalloc peak of one extra run (traced
+runs are slower, so they are not timed). --compare exits with status 1 when a case got slower (or used more memory)
+than tolerance times its baseline.
+"""
+import argparse
+import json
+import logging
+import platform
+import re
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.generators import generate, raw_annotations
+from attribution import attribute_sales, revenue_split_views, split_revenue_by_source
+from funnel import merge_leads
+from masks import HOTMART_MASKS, Mask
+from metrics import get_email_revenue_sales, get_funnel_metrics, get_global_metrics, get_hotmart_metrics, group_metrics
+from peaks import daily_totals, detect_peaks
+from periods import date_bounds
+from rollups import build_fb_cube, build_ga4_cube, build_hotmart_cube
+from tags import TagIndex
+
+SIZES = [10_000, 100_000, 1_000_000, 10_000_000]
+DEFAULT_SIZES = [10_000, 100_000]
+DEFAULT_REPEAT = 3
+DEFAULT_TOLERANCE = 1.5
+
+
+def setup_sales_att(n_rows: int) -> tuple:
+    ga4 = generate('ga4', n_rows)
+    partitions = dict(tuple(ga4.groupby('event_name', observed=True, sort=False)))
+    return (partitions.get('page_view', ga4.iloc[:0]), partitions.get('purchase', ga4.iloc[:0]))
+
+
+def setup_journeys(n_rows: int) -> tuple:
+    return (generate('sales_journeys', n_rows),)
+
+
+def setup_fb(n_rows: int) -> tuple:
+    return (generate('fb', n_rows),)
+
+
+def setup_fb_cube_sources(n_rows: int) -> tuple:
+    fb = generate('fb', n_rows)
+    return (fb, raw_annotations(fb))
+
+
+def setup_fb_cube(n_rows: int) -> tuple:
+    return (build_fb_cube(*setup_fb_cube_sources(n_rows)),)
+
+
+def setup_hotmart_cube(n_rows: int) -> tuple:
+    return (build_hotmart_cube(generate('hotmart', n_rows)),)
+
+
+def setup_hotmart_metrics(n_rows: int) -> tuple:
+    cube = setup_hotmart_cube(n_rows)[0]
+    fb = generate('fb', n_rows)
+    return (cube, fb, list(date_bounds(cube)))
+
+
+def setup_funnel(n_rows: int) -> tuple:
+    return (generate('leads', n_rows), generate('hotmart', n_rows))
+
+
+def setup_funnel_metrics(n_rows: int) -> tuple:
+    merged = merge_leads(*setup_funnel(n_rows))
+    return (merged.loc[merged['conversion_time'] >= 0],)
+
+
+def setup_tag_lists(n_rows: int) -> tuple:
+    return (generate('active_contacts', n_rows)['tag'],)
+
+
+def setup_new_leads(n_rows: int) -> tuple:
+    contacts = generate('active_contacts', n_rows)
+    start, end = date_bounds(contacts)
+    return (TagIndex.from_frame(contacts), start + (end - start) / 4, end)
+
+
+def setup_producer_sales(n_rows: int) -> tuple:
+    hotmart = generate('hotmart', n_rows)
+    start, end = date_bounds(hotmart)
+    valid, producer = (Mask.from_bool(HOTMART_MASKS[name](hotmart)) for name in ['valid', 'producer'])
+    return (valid & producer, hotmart, start + (end - start) / 4, end)
+
+
+def setup_daily_revenue(n_rows: int) -> tuple:
+    cube = setup_hotmart_cube(n_rows)[0]
+    valid, producer = (Mask.from_bool(HOTMART_MASKS[name](cube)) for name in ['valid', 'producer'])
+    return (daily_totals((valid & producer).select(cube), 'commission.value'),)
+
+
+# name: (what it stands for in the pages, setup(n_rows) -> args, function timed with args)
+CASES = {
+    'get_sales_att': ('GA4.get_sales_att', setup_sales_att, attribute_sales),
+    'get_sales_att_by_day': ('GA4.get_sales_att(by_day=True)', setup_sales_att,
+                             lambda page_views, purchases: attribute_sales(page_views, purchases, by_day=True)),
+    'get_revenue_by_source': ('attribution.split_revenue_by_source (totals of Vendas_por_canal)', setup_journeys, split_revenue_by_source),
+    'get_revenue_by_source_daily': ('Vendas_por_canal.get_revenue_by_source_daily', setup_journeys,
+                                    lambda journeys: split_revenue_by_source(journeys, by=['order_date'], sort=True)),
+    'get_revenue_views': ('Vendas_por_canal.get_revenue_views', setup_journeys, revenue_split_views),
+    'get_metrics': ('Hotmart.get_metrics', setup_hotmart_metrics, get_hotmart_metrics),
+    'get_global_metrics': ('FacebookAds.get_global_metrics', setup_fb, get_global_metrics),
+    'group_data': ('FacebookAds.group_data', setup_fb_cube, lambda cube: group_metrics(cube, 'name')),
+    'group_data_by_annotation': ('FacebookAds.group_data by big_idea (was count_adsets_by_annotation)', setup_fb_cube,
+                                 lambda cube: group_metrics(cube, 'big_idea')),
+    'get_email_revenue_sales': ('Email_marketing.get_email_revenue_sales', setup_hotmart_cube, get_email_revenue_sales),
+    'merge_leads': ('Funil_gratuito lead join (funnel.merge_leads)', setup_funnel, merge_leads),
+    'get_funnel_metrics': ('Funil_gratuito.get_funnel_metrics', setup_funnel_metrics, get_funnel_metrics),
+    'get_new_leads': ('Email_marketing.get_new_leads (tags.TagIndex.select_without)', setup_new_leads,
+                      lambda index, start, end: index.select_without(index.frame, [172, 214, 246, 252, 258, 264, 270, 276], start, end)),
+    'build_tag_index': ('tags.load_tag_index', setup_tag_lists, TagIndex.from_lists),
+    'select_producer_sales': ("Picos_de_venda valid & producer sales of a window (masks.Mask.select)", setup_producer_sales,
+                              lambda mask, hotmart, start, end: mask.select(hotmart, start, end)),
+    'detect_peaks': ('Picos_de_venda peak detection (peaks.detect_peaks)', setup_daily_revenue, detect_peaks),
+    'build_fb_cube': ('rollups fb_daily', setup_fb_cube_sources, build_fb_cube),
+    'build_hotmart_cube': ('rollups hotmart_daily', lambda n_rows: (generate('hotmart', n_rows),), build_hotmart_cube),
+    'build_ga4_cube': ('rollups ga4_daily', lambda n_rows: (generate('ga4', n_rows),), build_ga4_cube),
+}
+
+
+def parse_rows(value: str) -> int:
+    """10000, 10k or 1M"""
+    match = re.fullmatch(r'(\d+(?:\.\d+)?)([kKmM]?)', value)
+    if match is None:
+        raise argparse.ArgumentTypeError(f'Invalid number of rows {value}')
+    number, suffix = match.groups()
+    return int(float(number) * {'': 1, 'k': 10 ** 3, 'm': 10 ** 6}[suffix.lower()])
+
+
+def measure(func, args: tuple, repeat: int) -> dict:
+    """Best wall time of repeat runs of func(*args) and the peak of memory allocated by one run"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        func(*args)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {'seconds': min(times), 'median_seconds': float(np.median(times)), 'peak_mb': peak / 1024 ** 2}
+
+
+def run(cases: list, sizes: list, repeat: int) -> dict:
+    """{case: {n_rows (str): measure}}"""
+    results = {}
+    for name in cases:
+        _, setup, func = CASES[name]
+        results[name] = {}
+        for n_rows in sizes:
+            args = setup(n_rows)
+            results[name][str(n_rows)] = measure(func, args, repeat)
+            result = results[name][str(n_rows)]
+            print(f'{name:<30} {n_rows:>10,} rows {result["seconds"] * 1000:>10.1f} ms {result["peak_mb"]:>9.1f} MB', flush=True)
+    return results
+
+
+def environment() -> dict:
+    return {'python': platform.python_version(), 'pandas': pd.__version__, 'numpy': np.__version__,
+            'machine': platform.machine(), 'system': platform.system()}
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Cases and sizes whose time or peak memory is above tolerance times the baseline"""
+    regressions = []
+    for name, by_size in results.items():
+        for n_rows, result in by_size.items():
+            reference = baseline['results'].get(name, {}).get(n_rows)
+            if reference is None:
+                continue
+            for measure_name in ['seconds', 'peak_mb']:
+                ratio = result[measure_name] / max(reference[measure_name], 1e-9)
+                print(f'{name:<30} {int(n_rows):>10,} rows {measure_name:<8} {ratio:>6.2f}x baseline')
+                if ratio > tolerance:
+                    regressions.append((name, n_rows, measure_name, ratio))
+    return regressions
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description='Benchmarks of the dashboard computations on synthetic data')
+    parser.add_argument('--rows', nargs='+', type=parse_rows, default=DEFAULT_SIZES,
+                        help=f'dataset sizes, e.g. 10k 100k 1M (default {DEFAULT_SIZES}, up to {SIZES[-1]:,})')
+    parser.add_argument('--cases', nargs='+', choices=list(CASES), default=list(CASES))
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT)
+    parser.add_argument('--save', help='JSON file where the results are saved as a baseline')
+    parser.add_argument('--compare', help='JSON baseline to compare the results with')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args(argv)
+
+    for logger_name in [name for name in logging.root.manager.loggerDict if name.startswith('streamlit')]:
+        logging.getLogger(logger_name).setLevel(logging.ERROR) # caches used outside of streamlit run
+    results = run(args.cases, args.rows, args.repeat)
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as baseline_file:
+            json.dump({'environment': environment(), 'results': results}, baseline_file, indent=2)
+            baseline_file.write('\n')
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as baseline_file:
+            regressions = compare(results, json.load(baseline_file), args.tolerance)
+        for name, n_rows, measure_name, ratio in regressions:
+            print(f'REGRESSION {name} {int(n_rows):,} rows: {measure_name} {ratio:.2f}x the baseline', file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
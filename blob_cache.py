@@ -0,0 +1,128 @@
+"""
+On-disk cache of bucket blobs.
+
+Entries are content addressed by (bucket, name, generation, md5), so a blob is downloaded again only when the
+bucket has a new generation of it. Writes go to a temporary file that is atomically renamed into place, which keeps
+the cache consistent when several server processes share the directory. The total size is capped and the least
+recently used entries are evicted first. Temporary files left behind by a process that died while writing are
+removed once they are older than STALE_TMP_SECONDS (at startup and on each eviction).
+"""
+import hashlib
+import os
+import tempfile
+import threading
+import time
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'dashboard-geral-mkt', 'blobs')
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+TMP_PREFIX = '.tmp-'
+STALE_TMP_SECONDS = 3600 # a write in progress (possibly by another process) is never this old
+
+
+class BlobCache:
+
+    def __init__(self, directory: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(self.directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        self.bytes_downloaded = 0
+        self.sweep_temp_files()
+
+    @staticmethod
+    def key(bucket_name: str, file_name: str, generation, md5_hash) -> str:
+        return hashlib.sha256(f'{bucket_name}/{file_name}#{generation}:{md5_hash}'.encode()).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key)
+
+    def get(self, bucket_name: str, file_name: str, generation, md5_hash) -> bytes:
+        """Returns the cached content or None"""
+        path = self._path(self.key(bucket_name, file_name, generation, md5_hash))
+        try:
+            with open(path, 'rb') as f:
+                content = f.read()
+            os.utime(path) # mtime is the recency used by the LRU eviction
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+            self.bytes_saved += len(content)
+        return content
+
+    def put(self, bucket_name: str, file_name: str, generation, md5_hash, content: bytes):
+        path = self._path(self.key(bucket_name, file_name, generation, md5_hash))
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=TMP_PREFIX)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(content)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        with self._lock:
+            self.bytes_downloaded += len(content)
+        self.evict()
+
+    def _entries(self) -> list:
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.startswith(TMP_PREFIX):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError: # removed by another process
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def size(self) -> int:
+        return sum(size for _, size, _ in self._entries())
+
+    def sweep_temp_files(self, max_age: float = STALE_TMP_SECONDS) -> int:
+        """Removes the temporary files older than max_age seconds (writes that never finished), returns how many"""
+        removed = 0
+        now = time.time()
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if not entry.name.startswith(TMP_PREFIX):
+                    continue
+                try:
+                    if now - entry.stat().st_mtime > max_age:
+                        os.remove(entry.path)
+                        removed += 1
+                except FileNotFoundError: # renamed into place or removed by another process
+                    pass
+        return removed
+
+    def evict(self):
+        """Removes the least recently used entries until the cache fits in max_bytes (and the stale temporary files)"""
+        self.sweep_temp_files()
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def stats(self) -> dict:
+        requests = self.hits + self.misses
+        return {'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / requests if requests > 0 else 0.0,
+                'bytes_saved': self.bytes_saved,
+                'bytes_downloaded': self.bytes_downloaded,
+                'size': self.size()}
@@ -0,0 +1,77 @@
+"""
+Classification of the Hotmart sales by tracking.source_sck, done once when the dataset is loaded.
+
+The rules below are evaluated over the distinct sck/source values only and the results are broadcast to the rows
+through the categorical codes, so the pages can filter on the resulting columns instead of splitting strings:
+
+    sck_prefix : first '_' separated token of tracking.source_sck (categorical)
+    sck_channel: canonical channel given by SCK_CHANNEL_RULES, or the sck itself when no rule matches (categorical)
+    is_*       : boolean flags given by SCK_FLAG_RULES
+"""
+import numpy as np
+import pandas as pd
+
+# (channel, substrings that tracking.source_sck must contain). The first rule that matches gives the channel.
+SCK_CHANNEL_RULES = [
+    ('e-mail upgrade', ['mail', 'upgrade']),
+    ('e-mail', ['mail']),
+    ('vendas upgrade', ['venda', 'upgrade']),
+    ('vendas', ['venda']),
+    ('home', ['home']),
+    ('popup', ['popup']),
+    ('basico', ['basico']),
+    ('seja-pro', ['seja-pro']),
+]
+
+# flag: [(column, operation, pattern)]. A row is flagged when any of its conditions is true.
+SCK_FLAG_RULES = {
+    'is_email': [('sck_prefix', 'contains', 'email'), ('tracking.source', 'contains', 'email')],
+    'is_cart_abandonment': [('sck_prefix', 'contains', 'email-abandono-carrinho')],
+    'is_sales_team': [('sck_prefix', 'contains', 'venda')],
+    'is_free_funnel': [('sck_prefix', 'isin', ['basico', 'basico-expirou', 'seja-pro'])],
+}
+
+
+def _match(values: pd.Series, operation: str, pattern) -> pd.Series:
+    if operation == 'contains':
+        return values.str.contains(pattern, regex=False)
+    elif operation == 'isin':
+        return values.isin(pattern)
+    raise ValueError(f'Unknown operation {operation}')
+
+
+def _per_value(series: pd.Series, func) -> np.ndarray:
+    """Evaluates func over the distinct values of series and broadcasts the result to every row"""
+    categorical = series.astype('category')
+    results = func(pd.Series(categorical.cat.categories))
+    return np.asarray(results)[categorical.cat.codes.to_numpy()]
+
+
+def get_sck_channel(sck: pd.Series) -> pd.Series:
+    """Applies SCK_CHANNEL_RULES to the distinct values of sck"""
+    channel = pd.Series(sck.to_numpy(), index=sck.index, dtype=object)
+    matched = pd.Series(False, index=sck.index)
+    for label, substrings in SCK_CHANNEL_RULES:
+        rule_mask = ~matched
+        for substring in substrings:
+            rule_mask &= sck.str.contains(substring, regex=False)
+        channel[rule_mask] = label
+        matched |= rule_mask
+    return channel
+
+
+def classify_sck(hotmart: pd.DataFrame) -> pd.DataFrame:
+    """
+    Adds sck_prefix, sck_channel and the SCK_FLAG_RULES flags to hotmart (tracking.source_sck and tracking.source
+    must be already filled)
+    """
+    sck = hotmart['tracking.source_sck']
+    hotmart['sck_prefix'] = pd.Categorical(_per_value(sck, lambda values: values.str.split('_').str[0]))
+    hotmart['sck_channel'] = pd.Categorical(_per_value(sck, get_sck_channel))
+
+    for flag, conditions in SCK_FLAG_RULES.items():
+        mask = np.zeros(len(hotmart), dtype=bool)
+        for column, operation, pattern in conditions:
+            mask |= _per_value(hotmart[column], lambda values: _match(values, operation, pattern).to_numpy(dtype=bool))
+        hotmart[flag] = mask
+    return hotmart
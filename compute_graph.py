@@ -0,0 +1,116 @@
+"""
+Incremental recompute of the computations of a page, declared as a dependency graph.
+
+A page declares its inputs (widget values and the datasets, each with a version key) and its computations as
+nodes with explicit dependencies (inputs or other nodes). The outputs of the nodes are kept in the session between
+reruns and a node is executed again only when one of its dependencies changed since its output was computed: an
+input whose value (or key) is different, or an upstream node that was executed again. Changing a widget therefore
+re-executes only the nodes downstream of it, everything else is reused.
+
+The session only keeps the keys of the inputs, their values (the shared datasets) are held by the graph of the
+current rerun, and when the key of an input changes the outputs of the nodes downstream of it are dropped at once.
+So the session never pins the frames of an old data version, even for nodes the page doesn't get on that rerun.
+
+Nodes are evaluated lazily by get, so the inputs they depend on can be set further down the script (a widget
+inside an expander, for example), as long as it is before the first get that needs them. The outputs are shared
+between reruns and must not be modified. last_run gives what each node did on the current rerun (see
+debug.show_graph_panel).
+"""
+import time
+import streamlit as st
+
+RAN = 'ran'
+REUSED = 'reused'
+
+
+class GraphState:
+    """What a graph keeps between the reruns of a session"""
+
+    def __init__(self):
+        self.keys = {} # input: key of its current value
+        self.values = {} # node: current output
+        self.versions = {} # input or node: number of times it changed
+        self.dependencies = {} # node: versions of its dependencies when it was executed
+        self.dependents = {} # input or node: nodes that depend on it directly
+
+    def drop_downstream(self, name: str):
+        """Forgets the outputs of the nodes that depend on name, directly or not, so they run again when needed"""
+        pending = list(self.dependents.get(name, ()))
+        while pending:
+            node = pending.pop()
+            if (node in self.values) or (node in self.dependencies):
+                self.values.pop(node, None)
+                self.dependencies.pop(node, None)
+                pending.extend(self.dependents.get(node, ()))
+
+
+def _same(a, b) -> bool:
+    try:
+        return bool(a == b)
+    except (TypeError, ValueError): # e.g. arrays and frames, that compare element-wise
+        return a is b
+
+
+class ComputeGraph:
+    """Inputs and nodes of a page for one rerun, over the GraphState kept in the session"""
+
+    def __init__(self, state: GraphState):
+        self.state = state
+        self.nodes = {} # name: (function, dependencies)
+        self.inputs = {} # input: value set on this rerun
+        self.last_run = {} # node: (RAN or REUSED, seconds)
+
+    def set_input(self, name: str, value, key=None):
+        """
+        Sets the input name. It counts as changed when key (or value itself when key is None) is different from the
+        previous rerun, so pass a version key for the values that are expensive or impossible to compare (frames).
+        """
+        key = value if key is None else key
+        if (name not in self.state.keys) or not _same(self.state.keys[name], key):
+            self.state.versions[name] = self.state.versions.get(name, 0) + 1
+            self.state.drop_downstream(name)
+        self.state.keys[name] = key
+        self.inputs[name] = value
+        return value
+
+    def node(self, name: str, dependencies: list):
+        """Decorator that declares func as the node name, called with the values of dependencies in order"""
+        def register(func):
+            self.nodes[name] = (func, list(dependencies))
+            for dependency in dependencies:
+                self.state.dependents.setdefault(dependency, set()).add(name)
+            return func
+        return register
+
+    def get(self, name: str):
+        """Value of the input or node name, executing the node (and what it depends on) only if needed"""
+        if name not in self.nodes:
+            if name not in self.inputs:
+                raise KeyError(f'{name} is neither a node nor an input set on this rerun')
+            return self.inputs[name]
+        if name in self.last_run:
+            return self.state.values[name]
+
+        func, dependencies = self.nodes[name]
+        values = [self.get(dependency) for dependency in dependencies]
+        versions = tuple(self.state.versions[dependency] for dependency in dependencies)
+        if self.state.dependencies.get(name) == versions:
+            self.last_run[name] = (REUSED, 0.0)
+            return self.state.values[name]
+
+        self.state.drop_downstream(name) # outputs computed from the previous output of name
+        self.state.values.pop(name, None) # not kept alive while the new one is computed
+        start = time.perf_counter()
+        self.state.values[name] = func(*values)
+        self.last_run[name] = (RAN, time.perf_counter() - start)
+        self.state.dependencies[name] = versions
+        self.state.versions[name] = self.state.versions.get(name, 0) + 1
+        return self.state.values[name]
+
+
+def session_graph(graph_id: str) -> ComputeGraph:
+    """The graph graph_id of the current session, to be declared again on each rerun"""
+    state_key = f'compute_graph_{graph_id}'
+    if state_key not in st.session_state:
+        st.session_state[state_key] = GraphState()
+    return ComputeGraph(st.session_state[state_key])
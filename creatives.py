@@ -0,0 +1,163 @@
+"""
+Creative previews of the "Análise pontual" grid, fetched from the Graph API.
+
+All the lookups of a grid are sent together: they are packed in requests to the Graph API batch endpoint (up to
+BATCH_SIZE lookups each) and the batches run concurrently, at most MAX_CONCURRENT_REQUESTS at a time, over a pooled
+keep-alive session. Results are memoized per (kind, key) for PREVIEW_TTL seconds, so the reruns of the page render
+from memory. Setting GRAPH_API_URL points the fetcher to another server (e.g. a local stand-in for tests).
+
+Lookup kinds:
+    video  : key is the video id, returns the embed_html
+    image  : key is the image hash, returns the image url
+    preview: key is the ad_id, returns the html of its first creative's INSTAGRAM_STANDARD preview
+"""
+import json
+import os
+import threading
+import time
+import requests
+from urllib.parse import quote
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+
+GRAPH_API_URL = 'https://graph.facebook.com/v18.0'
+BATCH_SIZE = 50 # limit of the Graph API batch endpoint
+MAX_CONCURRENT_REQUESTS = 4
+PREVIEW_TTL = 60 * 60 # image urls and preview iframes given by the API expire
+REQUEST_TIMEOUT = 30
+
+
+class TTLCache:
+    """Thread-safe dict whose entries expire ttl seconds after being set"""
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+
+class PreviewFetcher:
+    """Fetches and memoizes creative lookups, see the module docstring"""
+
+    def __init__(self, access_token: str, ad_account: str, base_url: str = None, ttl: float = PREVIEW_TTL):
+        self.access_token = access_token
+        self.ad_account = ad_account
+        self.base_url = (base_url or os.environ.get('GRAPH_API_URL', GRAPH_API_URL)).rstrip('/')
+        self.cache = TTLCache(ttl)
+        self.session = requests.Session()
+        self.session.mount('https://', HTTPAdapter(pool_connections=MAX_CONCURRENT_REQUESTS, pool_maxsize=MAX_CONCURRENT_REQUESTS))
+        self.session.mount('http://', HTTPAdapter(pool_connections=MAX_CONCURRENT_REQUESTS, pool_maxsize=MAX_CONCURRENT_REQUESTS))
+        self.batch_requests = 0
+        self._requests_lock = threading.Lock()
+
+    def _batch_items(self, kind: str, key: str) -> list:
+        """Batch endpoint requests of a lookup, the last one gives its result"""
+        if kind == 'video':
+            return [{'method': 'GET', 'relative_url': f'{key}?fields=embed_html'}]
+        elif kind == 'image':
+            hashes = quote(json.dumps([key]))
+            return [{'method': 'GET', 'relative_url': f'{self.ad_account}/adimages?hashes={hashes}&fields=url'}]
+        elif kind == 'preview':
+            name = f'creative_{key}'
+            return [{'method': 'GET', 'name': name, 'relative_url': f'{key}/adcreatives?fields=id', 'omit_response_on_success': False},
+                    {'method': 'GET', 'relative_url': f'{{result={name}:$.data.0.id}}/previews?ad_format=INSTAGRAM_STANDARD'}]
+        raise ValueError(f'Unknown lookup kind {kind}')
+
+    @staticmethod
+    def _parse(kind: str, body: dict):
+        if kind == 'video':
+            return body.get('embed_html')
+        data = body.get('data') or []
+        if len(data) == 0:
+            return None
+        if kind == 'image':
+            return data[0].get('url')
+        return data[0].get('body', '').replace(';t', '&t')
+
+    def _run_batch(self, lookups: list) -> dict:
+        batch, result_positions = [], []
+        for kind, key in lookups:
+            batch += self._batch_items(kind, key)
+            result_positions.append(len(batch) - 1)
+
+        response = self.session.post(f'{self.base_url}/', data={'access_token': self.access_token, 'include_headers': 'false',
+                                                                 'batch': json.dumps(batch)}, timeout=REQUEST_TIMEOUT)
+        with self._requests_lock:
+            self.batch_requests += 1
+        response.raise_for_status()
+        answers = response.json()
+
+        results = {}
+        for (kind, key), position in zip(lookups, result_positions):
+            answer = answers[position] if position < len(answers) else None # the answers may be cut short
+            if (answer is None) or (answer.get('code') != 200):
+                results[(kind, key)] = None
+                continue
+            try:
+                results[(kind, key)] = self._parse(kind, json.loads(answer['body']))
+            except (KeyError, ValueError):
+                results[(kind, key)] = None
+        return results
+
+    def _chunks(self, lookups: list) -> list:
+        """lookups packed in order in chunks of at most BATCH_SIZE batch items, the items of a lookup kept together"""
+        chunks, items = [], 0
+        for lookup in lookups:
+            size = len(self._batch_items(*lookup))
+            if (len(chunks) == 0) or (items + size > BATCH_SIZE):
+                chunks.append([])
+                items = 0
+            chunks[-1].append(lookup)
+            items += size
+        return chunks
+
+    def fetch(self, lookups: list) -> dict:
+        """
+        Returns {(kind, key): result} for lookups, a list of (kind, key). Failed lookups give None and are not
+        memoized, so they are tried again in the next call.
+        """
+        results = {}
+        missing = []
+        for lookup in dict.fromkeys(lookups):
+            cached = self.cache.get(lookup)
+            if cached is None:
+                missing.append(lookup)
+            else:
+                results[lookup] = cached
+
+        if len(missing) > 0:
+            chunks = self._chunks(missing)
+            with ThreadPoolExecutor(max_workers=min(MAX_CONCURRENT_REQUESTS, len(chunks))) as executor:
+                for chunk, future in zip(chunks, [executor.submit(self._run_batch, chunk) for chunk in chunks]):
+                    try:
+                        fetched = future.result()
+                    except (requests.RequestException, ValueError): # failed request or invalid batch response
+                        fetched = {lookup: None for lookup in chunk}
+                    for lookup, value in fetched.items():
+                        if value is not None:
+                            self.cache.set(lookup, value)
+                        results[lookup] = value
+        return results
+
+    def stats(self) -> dict:
+        return {**self.cache.stats(), 'batch_requests': self.batch_requests}
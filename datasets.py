@@ -0,0 +1,305 @@
+"""
+Process-wide registry of the datasets used by the dashboard.
+
+Every dataset is downloaded and preprocessed once per blob generation and the resulting object is shared by all
+the sessions of the server process. The frames returned by load_dataset are shared, so the pages must treat them
+as read-only (copy before adding or changing columns).
+
+The frames with a time column come sorted by it and with the 'day' key used by periods.slice_period. The datasets
+declared in schemas.DATASET_SCHEMAS are cast to their compact types when loaded (see get_memory_reports).
+
+load_datasets loads the datasets a page needs concurrently (download and parsing of each one in a worker thread), so
+a cold start takes about as long as the slowest dataset instead of the sum of all of them.
+
+The preprocessing of each dataset (prepare_*) is kept apart from its download, so it also runs on frames that don't
+come from the bucket (see benchmarks.generators).
+"""
+import logging
+import threading
+import time
+import numpy as np
+import pandas as pd
+import streamlit as st
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+
+from gcs import get_data_from_bucket, get_blob_generation
+from schemas import compact_dataset, read_fb_csv, read_fb_parquet, to_date
+from channels import classify_sck
+from periods import index_by_day
+from identity import add_person_id
+from instrumentation import instrumented, timed
+import annotations
+
+BUCKET = 'dashboard_marketing_processed'
+LOAD_WORKERS = 8
+
+logger = logging.getLogger(__name__)
+
+
+def get_custom_metrics(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Appends the metrics: Hook_rate, Hold_rate and Attraction_index in a df of facebook ads
+    Hook_rate: views greater then 3s / impressions
+    Hold_rate: views greater then 15s / impressions
+    Attraction_index: views greater then 15s / views greater then 3s
+    """
+    mock_df = df.copy()
+    needed_cols = {'spend', 'cost_per_thruplay', 'n_video_view', 'impressions', 'date'}
+    if not needed_cols.issubset(set(mock_df.columns)):
+        raise Exception('spend, cost_per_thruplay, n_video_view, impressions or date not found in columns')
+    else:
+        mock_df['date'] = to_date(mock_df['date'])
+        mock_df.sort_values(by='date', inplace=True)
+        return mock_df
+
+
+@instrumented('process_data', detail=lambda file_name, columns=None: file_name)
+def process_data(file_name, columns: list = None):
+    """
+    Loads the facebook file_name (without extension) from the bucket. The typed parquet version is used when it exists,
+    otherwise the legacy csv. columns limits the columns read (see schemas.FB_REQUIRED_COLUMNS).
+    """
+    if get_blob_generation(BUCKET, f'{file_name}.parquet') is not None:
+        tmp_file = get_data_from_bucket(bucket_name=BUCKET, file_name=f'{file_name}.parquet', file_type='.parquet')
+        fb_data = read_fb_parquet(tmp_file, columns=columns)
+    else:
+        tmp_file = get_data_from_bucket(bucket_name=BUCKET, file_name=f'{file_name}.csv')
+        fb_data = read_fb_csv(tmp_file, columns=columns)
+    return prepare_fb(fb_data)
+
+
+def prepare_fb(fb_data: pd.DataFrame) -> pd.DataFrame:
+    """Preprocessing of a facebook file already read (see schemas.read_fb_parquet): conversion campaign only, with lucro"""
+    fb_data = get_custom_metrics(fb_data)
+    fb_data['action_value_purchase'] = fb_data['action_value_purchase'].fillna(value=0)
+    fb_data['lucro'] = fb_data['action_value_purchase'] - fb_data['spend']
+    fb_data['lucro'] = fb_data['lucro'].round(2)
+    fb = fb_data.loc[(fb_data['campaign_name'] == '[CONVERSAO] [DIP] Broad')]
+    return index_by_day(fb, 'date')
+
+
+def load_fb_ads(file_name, columns: list = None):
+    """process_data for the ads level files, ad_id is kept as str"""
+    return prepare_fb_ads(process_data(file_name, columns=columns))
+
+
+def prepare_fb_ads(ads: pd.DataFrame) -> pd.DataFrame:
+    ads['ad_id'] = ads['ad_id'].astype(str)
+    return ads
+
+
+def load_annotations() -> pd.DataFrame:
+    """Annotations snapshot plus the pending deltas of its log (see annotations)"""
+    return annotations.load_annotations(BUCKET)
+
+
+def load_hotmart() -> pd.DataFrame:
+    tmp_hotmart = get_data_from_bucket(bucket_name=BUCKET, file_name='processed_hotmart.parquet', file_type='.parquet')
+    return prepare_hotmart(pd.read_parquet(BytesIO(tmp_hotmart), engine='pyarrow'))
+
+
+def prepare_hotmart(raw_hotmart: pd.DataFrame) -> pd.DataFrame:
+    raw_hotmart['count'] = np.ones(len(raw_hotmart), dtype=np.int8)
+    raw_hotmart['order_date'] = pd.to_datetime(raw_hotmart['order_date'])
+    raw_hotmart['approved_date'] = pd.to_datetime(raw_hotmart['approved_date'])
+    raw_hotmart['tracking.source_sck'] = raw_hotmart['tracking.source_sck'].fillna(value='Desconhecido')
+    raw_hotmart['tracking.source'] = raw_hotmart['tracking.source'].fillna(value='Desconhecido')
+    raw_hotmart = classify_sck(raw_hotmart)
+    raw_hotmart = add_person_id(raw_hotmart, 'email')
+    return index_by_day(raw_hotmart, 'order_date')
+
+
+def load_ga4() -> pd.DataFrame:
+    tmp_ga4 = get_data_from_bucket(bucket_name=BUCKET, file_name='ga4_data_dash.parquet', file_type='.parquet')
+    return prepare_ga4(pd.read_parquet(BytesIO(tmp_ga4), engine='pyarrow'))
+
+
+def prepare_ga4(raw_ga4: pd.DataFrame) -> pd.DataFrame:
+    raw_ga4['count'] = np.ones(len(raw_ga4), dtype=np.int8)
+    return index_by_day(raw_ga4, 'event_date')
+
+
+def load_active_campaign() -> pd.DataFrame:
+    tmp_active = get_data_from_bucket(bucket_name=BUCKET, file_name='ActiveCampaign.feather', file_type='.feather')
+    return prepare_active_campaign(pd.read_feather(BytesIO(tmp_active)))
+
+
+def prepare_active_campaign(raw_active: pd.DataFrame) -> pd.DataFrame:
+    raw_active['automation_name'] = raw_active['automation_name'].fillna(value='Sem automação')
+    return index_by_day(raw_active, 'last_date')
+
+
+def load_active_contacts() -> pd.DataFrame:
+    tmp_contacts = get_data_from_bucket(bucket_name=BUCKET, file_name='contacts_activecampaign.feather', file_type='.feather')
+    raw_contacts = pd.read_feather(BytesIO(tmp_contacts))
+    tmp_tag = get_data_from_bucket(bucket_name=BUCKET, file_name='ActiveCampaign_contacts_TAGs.feather', file_type='.feather')
+    return prepare_active_contacts(raw_contacts, pd.read_feather(BytesIO(tmp_tag)))
+
+
+def prepare_active_contacts(raw_contacts: pd.DataFrame, active_tags: pd.DataFrame) -> pd.DataFrame:
+    """
+    Contacts joined with their tags (the array of tag ids of each contact, as read, NaN for the contacts without
+    tags). The tag queries are done on the index built from them, see tags.load_tag_index.
+    """
+    raw_contacts['id'] = raw_contacts['id'].astype(int)
+    active_tags['contact'] = active_tags['contact'].astype(int)
+    active_contacts = raw_contacts.merge(active_tags, left_on='id', right_on='contact', how='left')
+    active_contacts.drop(['contact'], axis=1, inplace=True)
+    active_contacts = add_person_id(active_contacts, 'email')
+    return index_by_day(active_contacts, 'cdate')
+
+
+def load_sales_journeys() -> pd.DataFrame:
+    tmp_journeys = get_data_from_bucket(bucket_name=BUCKET, file_name='sales_journeys.parquet', file_type='.parquet')
+    return prepare_sales_journeys(pd.read_parquet(BytesIO(tmp_journeys), engine='pyarrow'))
+
+
+def prepare_sales_journeys(sales_journeys: pd.DataFrame) -> pd.DataFrame:
+    return index_by_day(sales_journeys, 'order_date')
+
+
+# name: (blobs the dataset is built from, loader). Loaders that take columns accept a column projection.
+DATASETS = {
+    'fb': (['processed_adsets.parquet', 'processed_adsets.csv'], lambda columns=None: process_data('processed_adsets', columns=columns)),
+    'ads': (['processed_ads.parquet', 'processed_ads.csv'], lambda columns=None: load_fb_ads('processed_ads', columns=columns)),
+    'dct': (['processed_ads_by_media.parquet', 'processed_ads_by_media.csv'], lambda columns=None: load_fb_ads('processed_ads_by_media', columns=columns)),
+    'annotations': ([annotations.SNAPSHOT_FILE, annotations.LOG_FILE], load_annotations),
+    'hotmart': (['processed_hotmart.parquet'], load_hotmart),
+    'ga4': (['ga4_data_dash.parquet'], load_ga4),
+    'active_campaign': (['ActiveCampaign.feather'], load_active_campaign),
+    'active_contacts': (['contacts_activecampaign.feather', 'ActiveCampaign_contacts_TAGs.feather'], load_active_contacts),
+    'sales_journeys': (['sales_journeys.parquet'], load_sales_journeys),
+}
+
+
+class DatasetRegistry:
+    """
+    Keeps one loaded copy of each dataset (and column projection), keyed by name and by the generation of the blobs
+    it was built from. A dataset is reloaded only when one of its blobs gets a new generation in the bucket.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._locks = {name: threading.Lock() for name in DATASETS}
+        self.load_times = {} # name: seconds spent downloading and parsing it the last time it was loaded
+        self.memory_reports = {} # name: schemas.memory_report of the last load
+
+    def version(self, name: str) -> tuple:
+        files, _ = DATASETS[name]
+        return tuple(get_blob_generation(BUCKET, file_name) for file_name in files)
+
+    def get(self, name: str, columns: list = None):
+        if name not in DATASETS:
+            raise KeyError(f'Unknown dataset {name}, options: {list(DATASETS)}')
+        key = (name, None if columns is None else tuple(columns))
+        version = self.version(name)
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == version:
+            return entry[1]
+
+        with self._locks[name]: # one load per dataset even if many sessions ask for it at the same time
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                _, loader = DATASETS[name]
+                start = time.perf_counter()
+                with timed('load_dataset', detail=name) as timer:
+                    dataset, report = compact_dataset(name, loader() if columns is None else loader(columns=list(columns)))
+                    timer.rows_out = len(dataset) if isinstance(dataset, pd.DataFrame) else None
+                self.load_times[name] = time.perf_counter() - start
+                if report is not None:
+                    self.memory_reports[name] = report
+                entry = (version, dataset)
+                self._entries[key] = entry
+        return entry[1]
+
+    def patch(self, name: str, patch, previous: dict, current: dict):
+        """
+        Applies patch (which may modify the frame it gets in place) to a copy of each loaded copy of name that was
+        at the blob generations previous ({file: generation}) and keeps it as being at current, instead of
+        reloading them after a small change uploaded by this process. The frames already handed out are never
+        modified, other sessions may be reading them. Copies at other generations are dropped and reloaded on the
+        next get.
+        """
+        files, _ = DATASETS[name]
+        # generation 0 (blob not created yet) is None in the versions given by get_blob_generation
+        previous_version = tuple(previous.get(file_name) or None for file_name in files)
+        version = tuple(current.get(file_name) or None for file_name in files)
+        get_blob_generation.clear()
+        with self._locks[name]:
+            for key in [key for key in self._entries if key[0] == name]:
+                entry_version, dataset = self._entries[key]
+                if entry_version == previous_version:
+                    patched = dataset.copy()
+                    patch(patched)
+                    self._entries[key] = (version, patched)
+                else:
+                    self._entries.pop(key, None)
+
+    def invalidate(self, name: str):
+        """Forces the next get(name) to check the bucket generation again (e.g. after uploading the blob)"""
+        get_blob_generation.clear()
+        for key in [key for key in self._entries if key[0] == name]:
+            self._entries.pop(key, None)
+
+
+@st.cache_resource(show_spinner=False)
+def get_registry() -> DatasetRegistry:
+    return DatasetRegistry()
+
+
+def load_dataset(name: str, columns: list = None):
+    """
+    Returns the shared, preprocessed dataset name (see DATASETS). The returned object must not be modified.
+    columns, for the datasets that support it, limits the columns read from the file.
+    """
+    return get_registry().get(name, columns=columns)
+
+
+def _attach_script_run_ctx(ctx):
+    # lets the worker threads use st.cache_data/st.secrets like the script thread
+    if ctx is not None:
+        add_script_run_ctx(threading.current_thread(), ctx)
+
+
+def load_datasets(names: list, columns: dict = None) -> dict:
+    """
+    Same as load_dataset for each of names, loading them concurrently in a bounded thread pool.
+    columns maps a name to its column projection. Returns {name: dataset}.
+    """
+    registry = get_registry()
+    columns = {} if columns is None else columns
+    wall_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, min(LOAD_WORKERS, len(names))), initializer=_attach_script_run_ctx,
+                            initargs=(get_script_run_ctx(),)) as executor:
+        futures = {name: executor.submit(registry.get, name, columns.get(name)) for name in names}
+        loaded = {name: future.result() for name, future in futures.items()}
+
+    timings = {name: round(registry.load_times.get(name, 0), 3) for name in names}
+    logger.info('Loaded %s in %.3fs (per dataset: %s)', names, time.perf_counter() - wall_start, timings)
+    return loaded
+
+
+def get_load_timings() -> dict:
+    """Seconds each dataset took to download and parse the last time it was loaded by this process"""
+    return dict(get_registry().load_times)
+
+
+def get_memory_reports() -> dict:
+    """{name: memory report (see schemas.memory_report)} of the datasets loaded by this process"""
+    return dict(get_registry().memory_reports)
+
+
+def get_dataset_version(name: str) -> tuple:
+    """Version key (blob generations) of the dataset name, to be used in caches derived from it"""
+    return get_registry().version(name)
+
+
+def invalidate_dataset(name: str):
+    get_registry().invalidate(name)
+
+
+def patch_dataset(name: str, patch, previous: dict, current: dict):
+    """See DatasetRegistry.patch"""
+    get_registry().patch(name, patch, previous, current)
@@ -0,0 +1,57 @@
+"""
+Debug panels of the dashboard, shown in the sidebar only when the page is opened with the query param ?debug=1. The
+pages call them for logged in users only, the timings and stats are of every session.
+"""
+import pandas as pd
+import streamlit as st
+
+from datasets import get_memory_reports
+from instrumentation import debug_requested, get_session_records, get_stage_stats
+
+
+def show_memory_panel():
+    """Memory of each loaded dataset before and after its schema cast (see schemas.DATASET_SCHEMAS)"""
+    if not debug_requested():
+        return
+    reports = get_memory_reports()
+    with st.sidebar.expander('Debug - memória dos datasets', expanded=False):
+        if len(reports) == 0:
+            st.write('Nenhum dataset carregado')
+            return
+        totals = pd.DataFrame({name: report.loc['total', ['bytes_before', 'bytes_after', 'ratio']] for name, report in reports.items()}).T
+        totals[['bytes_before', 'bytes_after']] = (totals[['bytes_before', 'bytes_after']].astype(float) / 1024 ** 2).round(1)
+        st.dataframe(totals.rename(columns={'bytes_before': 'MB antes', 'bytes_after': 'MB depois'}))
+        selected = st.selectbox('Dataset', options=list(reports), key='debug_memory_dataset')
+        st.dataframe(reports[selected])
+
+
+def show_graph_panel(graph):
+    """Nodes of a compute_graph.ComputeGraph executed or reused on this rerun, to be called at the end of the page"""
+    if not debug_requested():
+        return
+    with st.sidebar.expander('Debug - grafo de cálculo', expanded=False):
+        runs = pd.DataFrame([{'node': name,
+                              'status': graph.last_run[name][0] if name in graph.last_run else 'not used',
+                              'ms': round(graph.last_run[name][1] * 1000, 1) if name in graph.last_run else None,
+                              'dependencies': ', '.join(dependencies)}
+                             for name, (_, dependencies) in graph.nodes.items()])
+        ran = (runs['status'] == 'ran').sum()
+        st.write(f'{ran} de {len(runs)} nós executados nesta execução')
+        st.dataframe(runs.set_index('node'))
+
+
+def show_performance_panel():
+    """Stages recorded by instrumentation: the last ones of this session and the p50/p95 across sessions"""
+    if not debug_requested():
+        return
+    with st.sidebar.expander('Debug - tempos por etapa', expanded=False):
+        records = pd.DataFrame(list(get_session_records()))
+        if len(records) == 0:
+            st.write('Nenhuma etapa registrada')
+            return
+        records['ms'] = (records['seconds'] * 1000).round(1)
+        records['time'] = pd.to_datetime(records['time'], unit='s')
+        st.write('Últimas etapas desta sessão')
+        st.dataframe(records[['time', 'stage', 'detail', 'ms', 'rows_in', 'rows_out', 'bytes']].iloc[::-1], hide_index=True)
+        st.write('Todas as sessões')
+        st.dataframe(pd.DataFrame(get_stage_stats().summary()).T.sort_values(by='p95_ms', ascending=False))
@@ -0,0 +1,94 @@
+"""
+LRU cache of the Plotly figures of the pages, shared by all the sessions.
+
+A figure is stored as its JSON under (chart id, key), where the key holds everything the figure depends on: the
+version of the data it comes from (rollups.get_cube_version / datasets.get_dataset_version), the filter window and
+the widget values (metric, annotation option, ...). On a rerun where none of them changed, cached_figure returns
+the figure from its JSON without calling the builder, so both the aggregation done inside the builder and the
+construction of the figure (px validation, subplots, ...) are skipped.
+
+The cache keeps at most FIGURE_CACHE_ENTRIES figures and FIGURE_CACHE_MAX_BYTES of JSON, least recently used first.
+"""
+import threading
+import plotly.graph_objects as go
+import plotly.io as pio
+import streamlit as st
+from collections import OrderedDict
+
+from instrumentation import timed
+
+FIGURE_CACHE_ENTRIES = 256
+FIGURE_CACHE_MAX_BYTES = 64 * 1024 ** 2
+
+
+class FigureCache:
+    """Thread-safe LRU of figure JSON strings"""
+
+    def __init__(self, max_entries: int = FIGURE_CACHE_ENTRIES, max_bytes: int = FIGURE_CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: tuple) -> str:
+        with self._lock:
+            figure_json = self._entries.get(key)
+            if figure_json is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return figure_json
+
+    def put(self, key: tuple, figure_json: str):
+        if len(figure_json) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self.size -= len(self._entries.pop(key))
+            self._entries[key] = figure_json
+            self.size += len(figure_json)
+            while (len(self._entries) > self.max_entries) or (self.size > self.max_bytes):
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self.size, 'hits': self.hits, 'misses': self.misses}
+
+
+@st.cache_resource(show_spinner=False)
+def get_figure_cache() -> FigureCache:
+    return FigureCache()
+
+
+def cached_figure(chart_id: str, key: tuple, build) -> go.Figure:
+    """
+    Figure chart_id for key (hashable, see the module docstring), built with build() only when it is not cached.
+    build must depend on nothing that is not in key, and a new Figure is returned on every call, so it can be
+    changed by the caller without affecting the cache.
+    """
+    cache = get_figure_cache()
+    figure_json = cache.get((chart_id,) + tuple(key))
+    if figure_json is None:
+        with timed('figure_build', detail=chart_id) as timer:
+            figure = build()
+            figure_json = figure.to_json()
+            timer.nbytes = len(figure_json)
+        cache.put((chart_id,) + tuple(key), figure_json)
+        return figure
+    with timed('figure_from_cache', detail=chart_id) as timer:
+        timer.nbytes = len(figure_json)
+        return pio.from_json(figure_json, skip_invalid=True)
+
+
+def get_figure_cache_stats() -> dict:
+    return get_figure_cache().stats()
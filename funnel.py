@@ -0,0 +1,57 @@
+"""
+Join of the free funnel leads (Google Sheets) with the Hotmart sales, maintained as the leads sheet grows.
+
+LeadFunnel keeps the merged leads (sheets_hot_merged) and the funnel rows derived from them (funnel_data, the
+purchases made after the lead signed up, with their conversion_time). When the sheet gets new rows only those are
+merged with Hotmart and appended. A new Hotmart version can change the sales of old leads too, so then every lead
+already read is merged again (from the local copy of the sheet, without reading it again).
+"""
+import threading
+import pandas as pd
+
+from identity import PERSON_COLUMN, add_person_id, merge_by_person
+from periods import append_by_day
+
+HOTMART_COLUMNS = [PERSON_COLUMN, 'email', 'approved_date', 'status', 'tracking.source', 'tracking.source_sck', 'source',
+                   'commission.value', 'is_free_funnel']
+
+
+def merge_leads(leads: pd.DataFrame, hotmart: pd.DataFrame) -> pd.DataFrame:
+    """Sales of each lead (joined by person_id, see identity) with the conversion_time in days"""
+    leads = add_person_id(leads.copy(), 'Email')
+    merged = merge_by_person(leads, hotmart[HOTMART_COLUMNS], how='left')
+    merged['tracking.source_sck'] = merged['tracking.source_sck'].astype(object).fillna(value='Desconhecido') # categórica no dataset
+    merged['is_free_funnel'] = merged['is_free_funnel'].fillna(value=False).astype(bool)
+    merged['conversion_time'] = pd.to_datetime(merged['approved_date']) - merged['Data']
+    merged['conversion_time'] = merged['conversion_time'].dt.days
+    return merged
+
+
+class LeadFunnel:
+    """sheets_hot_merged and funnel_data kept up to date append-only, see the module docstring"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hotmart_version = None
+        self.leads_seen = 0
+        self.merged = None
+        self.funnel = None
+
+    def update(self, leads: pd.DataFrame, hotmart: pd.DataFrame, hotmart_version: tuple) -> pd.DataFrame:
+        """
+        Brings the join up to date with leads (all the rows read from the sheet, in sheet order) and returns
+        funnel_data, indexed by periods.index_by_day on Data. The returned frame must not be modified.
+        """
+        with self._lock:
+            if hotmart_version != self.hotmart_version:
+                self.hotmart_version, self.leads_seen, self.merged, self.funnel = hotmart_version, 0, None, None
+
+            new_leads = leads.iloc[self.leads_seen:]
+            if (len(new_leads) > 0) or (self.funnel is None):
+                new_merged = merge_leads(new_leads, hotmart)
+                offset = 0 if self.merged is None else len(self.merged)
+                new_merged.index = pd.RangeIndex(offset, offset + len(new_merged)) # position in merged
+                self.merged = new_merged if self.merged is None else pd.concat([self.merged, new_merged])
+                self.funnel = append_by_day(self.funnel, new_merged.loc[new_merged['conversion_time'] >= 0], 'Data')
+                self.leads_seen = len(leads)
+            return self.funnel
@@ -0,0 +1,42 @@
+"""
+GA4 events split by event type, built once per version of the ga4 dataset and shared by all the sessions.
+
+Most GA4 queries look at a single event type (session_start, page_view or purchase), so instead of filtering the
+mixed event table on every rerun the pages take the partition of that type, a frame with only its events still
+sorted by the 'day' key (periods.slice_period works on it directly). The cost of a query is then proportional to the
+events of its type. The partitions must not be modified, like the datasets they come from.
+
+load_purchase_sessions gives the purchases keyed by ga_session_id (see attribution.purchases_by_session), sorted by
+session so lookups are index searches.
+"""
+import pandas as pd
+import streamlit as st
+
+from attribution import purchases_by_session
+from datasets import load_dataset, get_dataset_version
+
+EVENT_TYPES = ['session_start', 'page_view', 'purchase']
+
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def _get_partitions(version: tuple) -> dict:
+    ga4 = load_dataset('ga4')
+    partitions = {event_name: events for event_name, events in ga4.groupby('event_name', observed=True, sort=False)
+                  if event_name in EVENT_TYPES} # groupby keeps the day order inside each group
+    for event_name in EVENT_TYPES:
+        if event_name not in partitions:
+            partitions[event_name] = ga4.iloc[:0]
+    partitions['purchase_sessions'] = purchases_by_session(partitions['purchase']).sort_index()
+    return partitions
+
+
+def load_ga4_events(event_name: str) -> pd.DataFrame:
+    """The events of the type event_name (one of EVENT_TYPES), sorted by day like the ga4 dataset"""
+    if event_name not in EVENT_TYPES:
+        raise KeyError(f'Unknown event type {event_name}, options: {EVENT_TYPES}')
+    return _get_partitions(get_dataset_version('ga4'))[event_name]
+
+
+def load_purchase_sessions() -> pd.DataFrame:
+    """n_purchases and event_date (first purchase) of every session with purchases, indexed by ga_session_id"""
+    return _get_partitions(get_dataset_version('ga4'))['purchase_sessions']
@@ -0,0 +1,215 @@
+"""
+Google Cloud Storage access for the dashboard.
+
+A single storage.Client (with its credentials and a keep-alive HTTP session) is shared by every session of the
+server process, together with the bucket handles. Setting STORAGE_EMULATOR_HOST (e.g. http://localhost:4443 for
+fake-gcs-server) points the client to a local fake GCS with anonymous credentials.
+
+Downloads go through a BlobCache on disk (BLOB_CACHE_DIR, capped at BLOB_CACHE_MAX_MB), so a blob is only
+transferred again when its generation changes in the bucket.
+"""
+import os
+import threading
+import streamlit as st
+from google.auth.credentials import AnonymousCredentials
+from google.auth.transport.requests import AuthorizedSession
+from google.cloud import storage
+from google.oauth2 import service_account
+from requests.adapters import HTTPAdapter
+from urllib3 import HTTPConnectionPool, HTTPSConnectionPool
+from io import BytesIO
+
+from blob_cache import BlobCache, DEFAULT_CACHE_DIR, DEFAULT_MAX_BYTES
+from instrumentation import instrumented
+
+HTTP_POOL_SIZE = 16
+
+
+class NoBlobsFoundError(Exception):
+    pass
+
+
+class CountingHTTPAdapter(HTTPAdapter):
+    """
+    HTTPAdapter whose urllib3 connection pools register themselves when created, to count the requests and the
+    connections opened by them (the public num_requests/num_connections of the pools)
+    """
+
+    def __init__(self, *args, **kwargs):
+        self._pools_lock = threading.Lock()
+        self._pools = []
+        super().__init__(*args, **kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        adapter = self
+
+        def registered(pool_class):
+            class RegisteredPool(pool_class):
+                def __init__(self, *pool_args, **pool_kwargs):
+                    super().__init__(*pool_args, **pool_kwargs)
+                    with adapter._pools_lock:
+                        adapter._pools.append(self)
+            return RegisteredPool
+
+        self.poolmanager.pool_classes_by_scheme = {'http': registered(HTTPConnectionPool),
+                                                   'https': registered(HTTPSConnectionPool)}
+
+    def counts(self) -> tuple:
+        """(HTTP requests, connections opened) of the pools created so far"""
+        with self._pools_lock:
+            pools = list(self._pools)
+        return sum(pool.num_requests for pool in pools), sum(pool.num_connections for pool in pools)
+
+
+class StoragePool:
+    """
+    Thread-safe holder of the long-lived storage.Client and of the bucket handles.
+    Counts how many times the client was reused and how many HTTP requests ran over an already open connection.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._client = None
+        self._adapter = None
+        self._buckets = {}
+        self.clients_created = 0
+        self.client_reuses = 0
+
+    def _new_client(self) -> storage.Client:
+        if os.environ.get('STORAGE_EMULATOR_HOST'):
+            credentials = AnonymousCredentials()
+            project = os.environ.get('GOOGLE_CLOUD_PROJECT', 'test')
+        else:
+            credentials = service_account.Credentials.from_service_account_info(st.secrets["GOOGLE_STORAGE"])
+            project = credentials.project_id
+        http = AuthorizedSession(credentials)
+        self._adapter = CountingHTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+        http.mount('https://', self._adapter)
+        http.mount('http://', self._adapter)
+        return storage.Client(project=project, credentials=credentials, _http=http)
+
+    def client(self) -> storage.Client:
+        with self._lock:
+            if self._client is None:
+                self._client = self._new_client()
+                self.clients_created += 1
+            else:
+                self.client_reuses += 1
+            return self._client
+
+    def bucket(self, bucket_name: str) -> storage.Bucket:
+        client = self.client()
+        with self._lock:
+            if bucket_name not in self._buckets:
+                self._buckets[bucket_name] = client.bucket(bucket_name)
+            return self._buckets[bucket_name]
+
+    def stats(self) -> dict:
+        http_requests, http_connections = (0, 0) if self._adapter is None else self._adapter.counts()
+        return {'clients_created': self.clients_created,
+                'client_reuses': self.client_reuses,
+                'http_requests': http_requests,
+                'http_connections': http_connections,
+                'connection_reuses': http_requests - http_connections}
+
+
+@st.cache_resource(show_spinner=False)
+def get_storage_pool() -> StoragePool:
+    return StoragePool()
+
+
+def get_pool_stats() -> dict:
+    """Client and connection reuse counters of the shared StoragePool"""
+    return get_storage_pool().stats()
+
+
+@st.cache_resource(show_spinner=False)
+def get_blob_cache() -> BlobCache:
+    max_bytes = int(os.environ['BLOB_CACHE_MAX_MB']) * 1024 ** 2 if 'BLOB_CACHE_MAX_MB' in os.environ else DEFAULT_MAX_BYTES
+    return BlobCache(directory=os.environ.get('BLOB_CACHE_DIR', DEFAULT_CACHE_DIR), max_bytes=max_bytes)
+
+
+def get_cache_stats() -> dict:
+    """Hits, misses, hit rate and bytes saved by the local blob cache"""
+    return get_blob_cache().stats()
+
+
+def _download_with_cache(bucket_name: str, blob: storage.Blob) -> bytes:
+    cache = get_blob_cache()
+    generation, md5_hash = blob.generation, blob.md5_hash
+    blob_content = cache.get(bucket_name, blob.name, generation, md5_hash)
+    if blob_content is None:
+        blob_content = blob.download_as_bytes() # blob carries its generation, so this is the version checked above
+        cache.put(bucket_name, blob.name, generation, md5_hash, blob_content)
+    return blob_content
+
+
+def read_blob(bucket_name: str, file_name: str) -> tuple:
+    """
+    (content, generation, metadata) of file_name, always checking the current generation in the bucket (no TTL).
+    Returns (None, 0, {}) when the blob doesn't exist, 0 being the if_generation_match value to create it.
+    """
+    blob = get_storage_pool().bucket(bucket_name).get_blob(file_name)
+    if blob is None:
+        return None, 0, {}
+    return _download_with_cache(bucket_name, blob), blob.generation, dict(blob.metadata or {})
+
+
+@instrumented('gcs_download', detail=lambda bucket_name, file_name, file_type='csv': file_name)
+def get_data_from_bucket(bucket_name: str, file_name: str, file_type: str = 'csv') -> BytesIO:
+    """
+    Get file_name from google storage bucket (bucket_name). The blob metadata (generation, md5) is checked first and
+    the content is served from the local blob cache when that generation was already downloaded.
+    """
+    bucket = get_storage_pool().bucket(bucket_name)
+    blob = bucket.get_blob(file_name)
+    if blob is None:
+        raise NoBlobsFoundError(f'{file_name} not found in {bucket_name}')
+
+    blob_content = _download_with_cache(bucket_name, blob)
+    if file_type == 'csv':
+        return blob_content.decode('utf-8')
+    return blob_content
+
+
+def read_generation(bucket_name: str, file_name: str) -> int:
+    """
+    Current generation of file_name in the bucket (no TTL), fetching only the blob metadata. 0 when the blob doesn't
+    exist, like read_blob.
+    """
+    blob = get_storage_pool().bucket(bucket_name).get_blob(file_name)
+    return 0 if blob is None else blob.generation
+
+
+@st.cache_data(ttl=300, show_spinner=False)
+def get_blob_generation(bucket_name: str, file_name: str) -> int:
+    """
+    Returns the GCS generation of file_name (None if the blob doesn't exist). Only the blob metadata is fetched,
+    so this is cheap enough to be used as the version key of the data loaded from the blob. Cached for 5 minutes.
+    """
+    return read_generation(bucket_name, file_name) or None
+
+
+def upload_bytes_to_gcs(bucket_name: str, content: bytes, destination_blob_name: str, if_generation_match: int = None,
+                        metadata: dict = None) -> int:
+    """
+    Uploads content to bucket_name/destination_blob_name and returns the new generation.
+    With if_generation_match the upload only happens if the blob is still at that generation (0: doesn't exist yet),
+    otherwise google.api_core.exceptions.PreconditionFailed is raised.
+    """
+    bucket = get_storage_pool().bucket(bucket_name)
+    blob = bucket.blob(destination_blob_name)
+    if metadata is not None:
+        blob.metadata = metadata
+    blob.upload_from_string(content, content_type="application/octet-stream", if_generation_match=if_generation_match)
+    return blob.generation
+
+
+def upload_dataframe_to_gcs(bucket_name, dataframe, destination_blob_name, if_generation_match=None, metadata=None):
+    """Uploads a Pandas DataFrame to Google Cloud Storage in Feather format (see upload_bytes_to_gcs)."""
+    feather_buffer = BytesIO()
+    dataframe.to_feather(feather_buffer)
+
+    return upload_bytes_to_gcs(bucket_name=bucket_name, content=feather_buffer.getvalue(), destination_blob_name=destination_blob_name,
+                               if_generation_match=if_generation_match, metadata=metadata)
@@ -0,0 +1,93 @@
+"""
+Integer identity of the people found in the datasets, to join the sources on email.
+
+Emails are normalized (trimmed, lower case) and mapped to a person_id (int64) by a process-wide IdentityIndex, a
+dict of the normalized emails to their ids, so a batch of new emails costs only its own inserts. Ids are dense (0, 1, 2, ...)
+and never change while the process runs, the index only grows, so the same person gets the same id in Hotmart,
+ActiveCampaign and the Google Sheets leads, whatever the order they are loaded in. Rows without a valid email get
+NO_PERSON.
+
+The loaders add the PERSON_COLUMN next to the email, and the joins between sources are done on it (merge_by_person,
+a sorted merge of the int64 keys: one argsort of the right ids and a binary search of the left ones) instead of hash
+joins on the email strings.
+"""
+import threading
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+PERSON_COLUMN = 'person_id'
+NO_PERSON = -1
+
+
+def normalize_emails(emails: pd.Series) -> pd.Series:
+    """Trimmed, lower case emails, computed over the distinct values only. Empty or non-email values become NA."""
+    codes, uniques = pd.factorize(emails, use_na_sentinel=True)
+    normalized = pd.Series(uniques, dtype=object).astype(str).str.strip().str.lower()
+    normalized = normalized.where(normalized.str.contains('@', regex=False))
+    values = normalized.to_numpy(dtype=object)
+    result = np.full(len(codes), None, dtype=object)
+    result[codes >= 0] = values[codes[codes >= 0]]
+    return pd.Series(result, index=emails.index, dtype=object)
+
+
+class IdentityIndex:
+    """Thread-safe, append only map of normalized email -> person_id"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ids = {} # normalized email: person_id
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def person_ids(self, emails: pd.Series) -> np.ndarray:
+        """person_id of each of emails (int64), new emails get new ids. Invalid emails give NO_PERSON."""
+        codes, uniques = pd.factorize(normalize_emails(emails), use_na_sentinel=True)
+        if len(uniques) == 0:
+            return np.full(len(codes), NO_PERSON, dtype=np.int64)
+        with self._lock:
+            ids = self._ids
+            positions = np.fromiter((ids.setdefault(email, len(ids)) for email in uniques), dtype=np.int64, count=len(uniques))
+        return np.where(codes >= 0, positions[np.maximum(codes, 0)], NO_PERSON)
+
+
+@st.cache_resource(show_spinner=False)
+def get_identity_index() -> IdentityIndex:
+    return IdentityIndex()
+
+
+def add_person_id(df: pd.DataFrame, email_column: str) -> pd.DataFrame:
+    """Adds PERSON_COLUMN to df (in place) from its email_column"""
+    df[PERSON_COLUMN] = get_identity_index().person_ids(df[email_column])
+    return df
+
+
+def merge_by_person(left: pd.DataFrame, right: pd.DataFrame, how: str = 'left') -> pd.DataFrame:
+    """
+    Joins left and right (both with PERSON_COLUMN) on person_id, like left.merge(right, on=PERSON_COLUMN, how=how)
+    for how 'left' or 'inner': rows in the order of left, the matches of each in the order of right. Rows without
+    person never match, in a left join they are kept with the right columns empty.
+    """
+    if how not in ('left', 'inner'):
+        raise ValueError(f'Unsupported join {how}, options: left, inner')
+    right = right.loc[right[PERSON_COLUMN] != NO_PERSON]
+    right_ids = right[PERSON_COLUMN].to_numpy(dtype=np.int64)
+    order = np.argsort(right_ids, kind='stable') # keeps the order of right among the matches of a person
+    sorted_ids = right_ids[order]
+    left_ids = left[PERSON_COLUMN].to_numpy(dtype=np.int64)
+    first = np.searchsorted(sorted_ids, left_ids, side='left')
+    matches = np.searchsorted(sorted_ids, left_ids, side='right') - first
+
+    rows = np.maximum(matches, 1) if how == 'left' else matches # output rows of each left row
+    left_take = np.repeat(np.arange(len(left)), rows)
+    offset = np.arange(len(left_take)) - np.repeat(np.cumsum(rows) - rows, rows) # position among the matches
+    matched = offset < matches[left_take]
+    right_take = np.where(matched, order[np.minimum(first[left_take] + offset, len(order) - 1)] if len(order) > 0 else -1, -1)
+
+    left_part = left.iloc[left_take].reset_index(drop=True)
+    right_part = right.drop(columns=PERSON_COLUMN).reset_index(drop=True).reindex(right_take).reset_index(drop=True) # -1: NA
+    overlap = left_part.columns.intersection(right_part.columns).drop(PERSON_COLUMN, errors='ignore')
+    left_part = left_part.rename(columns={col: f'{col}_x' for col in overlap})
+    right_part = right_part.rename(columns={col: f'{col}_y' for col in overlap})
+    return pd.concat([left_part, right_part], axis=1)
@@ -0,0 +1,171 @@
+"""
+Timing of the stages of a rerun (GCS download, parsing, filtering, KPIs, charts), to find where a slow rerun goes.
+
+The stages are wrapped with the instrumented decorator or the timed context manager, which record the wall time and,
+when known, the rows in and out and the bytes of the stage. Recording is on for the sessions opened with the query
+param ?debug=1 and for every session when the environment variable DASHBOARD_INSTRUMENTATION is set; otherwise
+the wrappers only check that and call the stage, so they cost nothing noticeable.
+
+Each record goes to:
+    - a ring buffer of the session (the last SESSION_RECORDS records, see debug.show_performance_panel)
+    - the process-wide StageStats, that keep the last STAGE_SAMPLES durations of each stage for the p50/p95 across
+      sessions
+    - the log, as one JSON line per record plus a JSON summary with the p50/p95 of every stage at most once per
+      SUMMARY_INTERVAL seconds
+"""
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+ENV_VARIABLE = 'DASHBOARD_INSTRUMENTATION'
+DEBUG_PARAM = 'debug'
+SESSION_RECORDS = 500
+STAGE_SAMPLES = 1000
+SUMMARY_INTERVAL = 60
+
+logger = logging.getLogger(__name__)
+
+
+def debug_requested() -> bool:
+    """True when the page was opened with ?debug=1 (False outside of a streamlit session)"""
+    if get_script_run_ctx(suppress_warning=True) is None:
+        return False
+    return st.query_params.get(DEBUG_PARAM, '0') not in ('', '0', 'false')
+
+
+def instrumentation_enabled() -> bool:
+    return bool(os.environ.get(ENV_VARIABLE)) or debug_requested()
+
+
+class StageStats:
+    """Thread-safe last durations of each stage, shared by the sessions"""
+
+    def __init__(self, samples: int = STAGE_SAMPLES):
+        self.samples = samples
+        self._lock = threading.Lock()
+        self._durations = {}
+        self._last_summary = time.monotonic()
+
+    def add(self, stage: str, seconds: float):
+        with self._lock:
+            self._durations.setdefault(stage, deque(maxlen=self.samples)).append(seconds)
+
+    def summary(self) -> dict:
+        """{stage: {count, p50_ms, p95_ms}} over the samples kept"""
+        with self._lock:
+            durations = {stage: np.array(values) for stage, values in self._durations.items()}
+        return {stage: {'count': len(values),
+                        'p50_ms': round(float(np.percentile(values, 50)) * 1000, 2),
+                        'p95_ms': round(float(np.percentile(values, 95)) * 1000, 2)}
+                for stage, values in durations.items()}
+
+    def summary_due(self) -> bool:
+        """True at most once per SUMMARY_INTERVAL seconds"""
+        with self._lock:
+            now = time.monotonic()
+            if now - self._last_summary < SUMMARY_INTERVAL:
+                return False
+            self._last_summary = now
+            return True
+
+
+@st.cache_resource(show_spinner=False)
+def get_stage_stats() -> StageStats:
+    return StageStats()
+
+
+def get_session_records() -> deque:
+    """Ring buffer with the records of the current session (empty outside of a streamlit session)"""
+    if get_script_run_ctx(suppress_warning=True) is None:
+        return deque(maxlen=SESSION_RECORDS)
+    if 'instrumentation_records' not in st.session_state:
+        st.session_state['instrumentation_records'] = deque(maxlen=SESSION_RECORDS)
+    return st.session_state['instrumentation_records']
+
+
+def record(stage: str, seconds: float, detail: str = None, rows_in: int = None, rows_out: int = None, nbytes: int = None):
+    entry = {'stage': stage, 'detail': detail, 'seconds': round(seconds, 6), 'rows_in': rows_in, 'rows_out': rows_out,
+             'bytes': nbytes, 'time': time.time()}
+    get_session_records().append(entry)
+    stats = get_stage_stats()
+    stats.add(stage, seconds)
+    logger.info(json.dumps(entry, default=str))
+    if stats.summary_due():
+        logger.info(json.dumps({'stage_summary': stats.summary()}))
+
+
+def _rows(value) -> int:
+    return len(value) if isinstance(value, (pd.DataFrame, pd.Series)) else None
+
+
+def _bytes(value) -> int:
+    if isinstance(value, (bytes, str)):
+        return len(value)
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=False, deep=False).sum())
+    return None
+
+
+class timed:
+    """
+    Context manager that records the block as stage when instrumentation is enabled. The counts not known at the
+    start can be set on it inside the block (rows_out, nbytes).
+    """
+
+    def __init__(self, stage: str, detail: str = None, rows_in: int = None):
+        self.stage = stage
+        self.detail = detail
+        self.rows_in = rows_in
+        self.rows_out = None
+        self.nbytes = None
+        self.enabled = False
+
+    def __enter__(self):
+        self.enabled = instrumentation_enabled()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.enabled:
+            record(self.stage, time.perf_counter() - self._start, self.detail, self.rows_in, self.rows_out, self.nbytes)
+        return False
+
+
+def instrumented(stage: str, detail=None):
+    """
+    Decorator that records each call of the function as stage, with the rows of its first DataFrame argument as
+    rows_in and the rows and bytes of its result. detail: function of the call arguments giving the detail of the
+    record (e.g. the file name)
+    """
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not instrumentation_enabled():
+                return func(*args, **kwargs)
+            rows_in = next((len(arg) for arg in args if isinstance(arg, pd.DataFrame)), None)
+            start = time.perf_counter()
+            result = func(*args, **kwargs)
+            seconds = time.perf_counter() - start
+            record(stage, seconds, None if detail is None else detail(*args, **kwargs), rows_in, _rows(result), _bytes(result))
+            return result
+        return wrapper
+    return decorate
+
+
+def plotly_chart(figure, **kwargs):
+    """st.plotly_chart recorded as the stage 'plotly_chart' (serialization of the figure and sending it)"""
+    if not instrumentation_enabled():
+        return st.plotly_chart(figure, **kwargs)
+    title = figure.layout.title.text
+    n_points = sum(len(trace.x) if getattr(trace, 'x', None) is not None else 0 for trace in figure.data)
+    with timed('plotly_chart', detail=title, rows_in=n_points):
+        return st.plotly_chart(figure, **kwargs)
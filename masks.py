@@ -0,0 +1,148 @@
+"""
+Named boolean masks of the shared frames (valid sales, producer rows, email sessions, ...), built once per data version
+and shared by all the sessions.
+
+The same row subsets (status in VALID_STATUS, source == 'PRODUCER', utm_source_std == 'Active Campaign', ...) were
+rescanned from the string columns on every rerun of every page. Instead each frame of FRAMES declares its masks by
+name and load_masks gives the MaskSet of its current version, which evaluates a mask the first time it is asked for
+and keeps it packed (np.packbits, one bit per row). Masks compose with &, | and ~ without unpacking and select
+applies one to a date window (periods.period_rows), unpacking only the bytes of the window:
+
+    hotmart_masks = load_masks('hotmart')
+    producer_sales = (hotmart_masks['valid'] & hotmart_masks['producer']).select(hotmart_masks.frame, start, end)
+
+A mask is only valid for the frame it was built from (the rows are positions), the one MaskSet.frame returns: pages
+select from it rather than from a frame they loaded themselves, which may be of another version if the data changed
+in between (select refuses a frame of another length).
+"""
+import threading
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from datasets import load_dataset, get_dataset_version
+from ga4_events import load_ga4_events
+from periods import period_rows
+from rollups import VALID_STATUS, load_cube, get_cube_version
+
+HOTMART_MASKS = {
+    'valid': lambda df: df['status'].isin(VALID_STATUS),
+    'valid_or_refunded': lambda df: df['status'].isin(VALID_STATUS + ['REFUNDED']), # desprezando compras canceladas
+    'producer': lambda df: df['source'] == 'PRODUCER',
+    'affiliate': lambda df: df['source'] == 'AFFILIATE',
+}
+GA4_MASKS = {
+    'active_campaign': lambda df: df['utm_source_std'] == 'Active Campaign',
+    'session_start': lambda df: df['event_name'] == 'session_start',
+}
+
+# name: (function returning the frame, function returning its version key, {mask name: predicate of the frame})
+FRAMES = {
+    'hotmart': (lambda: load_dataset('hotmart'), lambda: get_dataset_version('hotmart'), HOTMART_MASKS),
+    'hotmart_daily': (lambda: load_cube('hotmart_daily'), lambda: get_cube_version('hotmart_daily'), HOTMART_MASKS),
+    'ga4_sessions': (lambda: load_ga4_events('session_start'), lambda: get_dataset_version('ga4'), GA4_MASKS),
+    'ga4_daily': (lambda: load_cube('ga4_daily'), lambda: get_cube_version('ga4_daily'), GA4_MASKS),
+}
+
+_BITS_SET = np.array([bin(byte).count('1') for byte in range(256)], dtype=np.int64) # bits set of each byte
+
+
+class Mask:
+    """Packed boolean mask over the rows of a frame"""
+
+    def __init__(self, bits: np.ndarray, length: int):
+        self.bits = bits
+        self.length = length
+
+    @classmethod
+    def from_bool(cls, values) -> 'Mask':
+        if isinstance(values, pd.Series):
+            values = values.to_numpy(dtype=bool, na_value=False)
+        values = np.asarray(values, dtype=bool)
+        return cls(np.packbits(values), len(values))
+
+    def __len__(self) -> int:
+        return self.length
+
+    def _check(self, other: 'Mask'):
+        if self.length != other.length:
+            raise ValueError(f'Masks of different frames ({self.length} and {other.length} rows)')
+
+    def __and__(self, other: 'Mask') -> 'Mask':
+        self._check(other)
+        return Mask(self.bits & other.bits, self.length)
+
+    def __or__(self, other: 'Mask') -> 'Mask':
+        self._check(other)
+        return Mask(self.bits | other.bits, self.length)
+
+    def __invert__(self) -> 'Mask':
+        bits = ~self.bits
+        if self.length % 8:
+            bits[-1] &= np.uint8((0xFF << (8 - self.length % 8)) & 0xFF) # the padding bits stay 0
+        return Mask(bits, self.length)
+
+    def count(self) -> int:
+        return int(_BITS_SET[self.bits].sum())
+
+    def window(self, rows: slice = None) -> np.ndarray:
+        """The mask of the rows of the window rows (all the rows when None) as a boolean array"""
+        start, stop, _ = (rows or slice(None)).indices(self.length)
+        stop = max(stop, start)
+        unpacked = np.unpackbits(self.bits[start // 8:(stop + 7) // 8])
+        return unpacked[start % 8:start % 8 + stop - start].view(bool)
+
+    def select(self, df: pd.DataFrame, start=None, end=None) -> pd.DataFrame:
+        """
+        Rows of df (the frame of the mask, MaskSet.frame) where the mask is set, only from start to end (both
+        inclusive, see periods.period_rows) when given
+        """
+        if len(df) != self.length:
+            raise ValueError(f'Mask of {self.length} rows applied to a frame of {len(df)} rows')
+        rows = slice(0, len(df)) if start is None else period_rows(df, start, end)
+        return df.iloc[rows.start + np.flatnonzero(self.window(rows))] # a single take of the rows
+
+
+class MaskSet:
+    """The masks of one version of a frame, each evaluated the first time it is asked for"""
+
+    def __init__(self, frame: pd.DataFrame, predicates: dict, version: tuple = None):
+        self.frame = frame
+        self.predicates = predicates
+        self.version = version # version key of frame, for the caches derived from it
+        self._masks = {}
+        self._lock = threading.Lock()
+
+    def __getitem__(self, name: str) -> Mask:
+        if name not in self.predicates:
+            raise KeyError(f'Unknown mask {name}, options: {list(self.predicates)}')
+        with self._lock:
+            if name not in self._masks:
+                self._masks[name] = Mask.from_bool(self.predicates[name](self.frame))
+            return self._masks[name]
+
+
+class _VersionChanged(Exception):
+    """The frame changed version while it was loaded, so it can't be cached under the version asked for"""
+
+
+@st.cache_resource(show_spinner=False, max_entries=2 * len(FRAMES))
+def _get_masks(name: str, version: tuple) -> MaskSet:
+    load_frame, current_version, predicates = FRAMES[name]
+    frame = load_frame() # of the current version, which is version unless it changed since the key was read
+    if current_version() != version:
+        raise _VersionChanged(name) # not cached, load_masks asks again with the new version
+    return MaskSet(frame, predicates, version)
+
+
+def load_masks(name: str) -> MaskSet:
+    """The shared MaskSet of the current version of the frame name (see FRAMES)"""
+    if name not in FRAMES:
+        raise KeyError(f'Unknown frame {name}, options: {list(FRAMES)}')
+    _, version, _ = FRAMES[name]
+    while True:
+        try:
+            return _get_masks(name, version())
+        except _VersionChanged:
+            continue
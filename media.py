@@ -0,0 +1,145 @@
+"""
+Disk cache of the creative media shown in the "Análise pontual" grid.
+
+Image thumbnails (resized to THUMBNAIL_WIDTH) and video embed html are stored content addressed by the image hash or
+video id, in a BlobCache of their own (MEDIA_CACHE_DIR, capped at MEDIA_CACHE_MAX_MB, least recently used first).
+A grid is then rendered from local bytes, only the misses go to Facebook (through creatives.PreviewFetcher).
+
+MediaStore.prefetch warms the cache in a background thread, e.g. with the top spend creatives of the selected
+window (top_spend_lookups), before they are opened in the grid.
+"""
+import os
+import threading
+import pandas as pd
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from PIL import Image
+
+from blob_cache import BlobCache
+from creatives import PreviewFetcher, MAX_CONCURRENT_REQUESTS, REQUEST_TIMEOUT
+
+DEFAULT_MEDIA_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'dashboard-geral-mkt', 'media')
+DEFAULT_MEDIA_MAX_BYTES = 256 * 1024 ** 2
+THUMBNAIL_WIDTH = 600
+MAX_PREFETCH = 24
+MEDIA_KINDS = ['video', 'image'] # kinds kept on disk, previews expire and stay in the PreviewFetcher memo
+
+
+class MediaCache(BlobCache):
+    """BlobCache of creative media, keyed by (kind, image hash/video id)"""
+
+    # the thumbnail width versions the images, so changing it doesn't serve old thumbnails
+    @staticmethod
+    def _version(kind: str):
+        return THUMBNAIL_WIDTH if kind == 'image' else None
+
+    def get_media(self, kind: str, key: str) -> bytes:
+        return self.get('media', f'{kind}/{key}', self._version(kind), None)
+
+    def put_media(self, kind: str, key: str, content: bytes):
+        self.put('media', f'{kind}/{key}', self._version(kind), None, content)
+
+    def contains_media(self, kind: str, key: str) -> bool:
+        return os.path.exists(self._path(self.key('media', f'{kind}/{key}', self._version(kind), None)))
+
+
+def make_thumbnail(content: bytes, width: int = THUMBNAIL_WIDTH) -> bytes:
+    """Resizes an image to at most width pixels wide, as JPEG (PNG when it has transparency)"""
+    image = Image.open(BytesIO(content))
+    image.thumbnail((width, width * 4))
+    output = BytesIO()
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image.save(output, format='PNG', optimize=True)
+    else:
+        image.convert('RGB').save(output, format='JPEG', quality=85)
+    return output.getvalue()
+
+
+def top_spend_lookups(creatives: pd.DataFrame, n: int = MAX_PREFETCH) -> list:
+    """(kind, key) of the n video/image creatives of creatives (processed_ads_by_media rows) with the highest spend"""
+    kinds = creatives['asset_type'].astype(str).map({'video_asset': 'video', 'image_asset': 'image'})
+    media = pd.DataFrame({'kind': kinds, 'key': creatives['hash'].astype(str), 'spend': creatives['spend']})
+    media = media.loc[media['kind'].notna() & creatives['hash'].notna()]
+    top = media.groupby(by=['kind', 'key'])['spend'].sum().nlargest(n)
+    return list(top.index)
+
+
+class MediaStore:
+    """Creative media served from a MediaCache, fetched through a PreviewFetcher on a miss"""
+
+    def __init__(self, fetcher: PreviewFetcher, cache: MediaCache):
+        self.fetcher = fetcher
+        self.cache = cache
+        self._lock = threading.Lock()
+        self._in_flight = set()
+
+    def _download_thumbnail(self, url: str) -> bytes:
+        response = self.fetcher.session.get(url, timeout=REQUEST_TIMEOUT)
+        response.raise_for_status()
+        return make_thumbnail(response.content)
+
+    def _fetch_and_store(self, lookups: list) -> dict:
+        fetched = self.fetcher.fetch(lookups)
+        results = {}
+        image_urls = {}
+        for (kind, key), value in fetched.items():
+            if (kind == 'image') and (value is not None):
+                image_urls[(kind, key)] = value
+                continue
+            if (kind == 'video') and (value is not None):
+                self.cache.put_media(kind, key, value.encode('utf-8'))
+            results[(kind, key)] = value
+
+        if len(image_urls) > 0:
+            with ThreadPoolExecutor(max_workers=min(MAX_CONCURRENT_REQUESTS, len(image_urls))) as executor:
+                futures = {lookup: executor.submit(self._download_thumbnail, url) for lookup, url in image_urls.items()}
+                for (kind, key), future in futures.items():
+                    try:
+                        thumbnail = future.result()
+                    except (requests.RequestException, OSError):
+                        results[(kind, key)] = None
+                        continue
+                    self.cache.put_media(kind, key, thumbnail)
+                    results[(kind, key)] = thumbnail
+        return results
+
+    def get(self, lookups: list) -> dict:
+        """
+        Returns {(kind, key): content} for lookups (see creatives): thumbnail bytes for the images, embed html for
+        the videos and preview html for the ads. Failed lookups give None.
+        """
+        results = {}
+        missing = []
+        for kind, key in dict.fromkeys(lookups):
+            content = self.cache.get_media(kind, key) if kind in MEDIA_KINDS else None
+            if content is None:
+                missing.append((kind, key))
+            else:
+                results[(kind, key)] = content.decode('utf-8') if kind == 'video' else content
+
+        if len(missing) > 0:
+            results.update(self._fetch_and_store(missing))
+        return results
+
+    def prefetch(self, lookups: list) -> threading.Thread:
+        """Fetches in a background thread the media of lookups that are neither cached nor already being fetched"""
+        with self._lock:
+            pending = [(kind, key) for kind, key in dict.fromkeys(lookups)
+                       if (kind in MEDIA_KINDS) and ((kind, key) not in self._in_flight) and not self.cache.contains_media(kind, key)]
+            self._in_flight.update(pending)
+        if len(pending) == 0:
+            return None
+
+        def run():
+            try:
+                self._fetch_and_store(pending)
+            except requests.RequestException:
+                pass # prefetch is best effort, the grid fetches what is still missing
+            finally:
+                with self._lock:
+                    self._in_flight.difference_update(pending)
+
+        thread = threading.Thread(target=run, name='media-prefetch', daemon=True)
+        thread.start()
+        return thread
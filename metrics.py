@@ -0,0 +1,120 @@
+"""
+KPIs shown by the pages, computed from windows of the datasets and rollup cubes.
+
+They are plain functions of their frames (no streamlit cache, no bucket access), so the pages wrap them in their own
+caches and the benchmarks (see benchmarks) can time them on synthetic data.
+"""
+import pandas as pd
+from millify import millify
+
+from instrumentation import instrumented
+from periods import day_number
+from rollups import VALID_STATUS, aggregate_by
+
+GROUP_MEASURES = ['spend', 'n_purchase', 'lucro', 'n_post_engagement', 'action_value_purchase', 'n_landing_page_view']
+
+
+@instrumented('kpi.get_global_metrics')
+def get_global_metrics(df: pd.DataFrame) -> dict:
+    """Facebook KPIs of a window of the fb dataset or of the fb_daily cube"""
+    metricas = {}
+    metricas['alcance'] = df['reach'].sum()
+    metricas["frequencia"] = df['impressions'].sum()/df['reach'].sum()
+    metricas['cpc'] = df['spend'].sum() / df['inline_link_clicks'].sum()
+    metricas['true_visits'] = df['n_landing_page_view'].sum() / df['inline_link_clicks'].sum()
+    metricas['cptv'] = metricas['cpc'] / metricas['true_visits'] #Mesma coisa que o CPTV
+    metricas['cpm'] = df['spend'].sum() / (df['impressions'].sum()/1000)
+    metricas['lp_views'] = df['n_landing_page_view'].sum()
+    metricas['custo_reaçao'] = df['spend'].sum() / df['n_post_reaction'].sum()
+    metricas['custo_comentario'] = df['spend'].sum() / df['n_comments'].sum()
+    metricas['custo_compartilhamento'] = df['spend'].sum() / df['n_shares'].sum()
+    metricas['investimento'] = df['spend'].sum()
+    metricas['faturamento'] = df['action_value_purchase'].sum()
+    metricas['roas'] = metricas['faturamento'] / metricas['investimento']
+    metricas['lucro'] = metricas['faturamento'] - metricas['investimento']
+    metricas['CPTV'] = df['spend'].sum()/df['n_landing_page_view'].sum()
+    return metricas
+
+
+@instrumented('kpi.group_metrics')
+def group_metrics(window: pd.DataFrame, column: str) -> pd.DataFrame:
+    """
+    Metrics of a window of the fb_daily cube by column plus the number of distinct adsets ('count'), in a single
+    grouped pass
+    """
+    grouped_fb = aggregate_by(window, column, GROUP_MEASURES, distinct='name')
+    grouped_fb.index = grouped_fb.index.astype(str) # plotly tem um bug com pd.Categorical com categorias filtradas
+    grouped_fb['lucro'] = grouped_fb['lucro'].round(2)
+    grouped_fb['Valor gasto (%)'] = (grouped_fb['spend']/grouped_fb['spend'].sum()) * 100
+    grouped_fb['Valor gasto (%)'] = grouped_fb['Valor gasto (%)'].round(1)
+    grouped_fb['cpa_purchase'] = round(grouped_fb['spend'] / grouped_fb['n_purchase'],2)
+    grouped_fb['Valor gasto (R$)'] = grouped_fb['spend'].apply(lambda x: millify(x, precision=1))
+    grouped_fb['ROAS'] = round(grouped_fb['action_value_purchase']/grouped_fb['spend'],2)
+    grouped_fb['CPTV'] = round(grouped_fb['spend'] / grouped_fb['n_landing_page_view'],2)
+    return grouped_fb
+
+
+@instrumented('kpi.get_hotmart_metrics')
+def get_hotmart_metrics(df: pd.DataFrame, fb_data: pd.DataFrame, date_range:list) -> dict:
+    """
+    Calculates the metrics (add metrics here) for a window df of the hotmart_daily cube (see rollups)
+    """
+    metrics = dict()
+    valid_df = df.loc[df['status'].isin(VALID_STATUS)]
+    producer_df = valid_df.loc[valid_df['source'] == 'PRODUCER']
+    metrics['billing'] = producer_df['commission.value'].sum()
+    metrics['n_valid_sales'] = producer_df['n_source_transactions'].sum()
+    refunded_in_range = (df['status'] == 'REFUNDED') & (df['refund_day'] >= day_number(date_range[0])) & (df['refund_day'] <= day_number(date_range[1]))
+    metrics['refunds'] = df.loc[refunded_in_range, 'n_transactions'].sum()
+    metrics['avarage_ticket'] = metrics['billing'] / metrics['n_valid_sales']
+    metrics['affiliates_sales'] = valid_df.loc[valid_df['source'] == 'AFFILIATE', 'count'].sum()
+    metrics['affiliates_revenue'] = producer_df.loc[producer_df['has_affiliate'], 'commission.value'].sum()
+    metrics['sales_team_sales'] = valid_df.loc[valid_df['is_sales_team'], 'count'].sum()
+    metrics['sales_team_revenue'] = valid_df.loc[valid_df['is_sales_team'], 'commission.value'].sum()
+    metrics['profit'] = metrics['billing'] - fb_data['spend'].sum()
+    metrics['email_revenue'] = producer_df.loc[producer_df['is_email'], 'commission.value'].sum()
+    return metrics
+
+
+@instrumented('kpi.get_email_revenue_sales')
+def get_email_revenue_sales(hotmart: pd.DataFrame) -> dict:
+    """
+    Get the e-mail revenue and n_sales from a window of the hotmart_daily cube, by filtering only valid transactions
+    (APPROVED or COMPLETED) whose tracking.sck contains "email".
+
+    PARAMETERS:
+
+    hotmart : pd.DataFrame
+
+    RETURNS
+    dict
+    """
+
+    valid_df = hotmart.loc[hotmart['status'].isin(VALID_STATUS)]
+    hotmart_mail = {}
+
+    hotmart_mail['email_revenue'] = valid_df.loc[valid_df['is_email'] & (valid_df['source'] == 'PRODUCER'), 'commission.value'].sum()
+    hotmart_mail['email_sales'] = valid_df.loc[valid_df['is_email'], 'n_transactions'].sum()
+    hotmart_mail['cart_abandonment'] = valid_df.loc[valid_df['is_cart_abandonment'], 'n_transactions'].sum()
+
+    return hotmart_mail
+
+
+@instrumented('kpi.get_funnel_metrics')
+def get_funnel_metrics(df: pd.DataFrame) -> dict:
+    """Revenue, sales, conversion rate and time of a window of the free funnel data (see funnel.LeadFunnel)"""
+    metrics = {}
+    metrics['revenue'] = df.loc[(df['status'].isin(['COMPLETE', 'APPROVED']))
+                                &(df['source'] == 'PRODUCER')
+                                &(df['is_free_funnel']), 'commission.value'].sum()
+    metrics['n_sales'] = df.loc[(~df['commission.value'].isna())
+                                &(df['status'].isin(['COMPLETE', 'APPROVED']))
+                                &(df['source'] == 'PRODUCER')
+                                &(df['is_free_funnel'])].shape[0]
+
+    metrics['conversion_rate'] = metrics['n_sales'] / len(df['Email'].unique()) * 100
+
+    metrics['average_conversion_time'] = df.loc[(df['status'].isin(['COMPLETE', 'APPROVED']))
+                                                & (~df['conversion_time'].isna())
+                                                &(df['source'] == 'PRODUCER'), 'conversion_time'].mean()
+    return metrics
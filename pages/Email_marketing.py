@@ -1,7 +1,13 @@
 import streamlit as st
 import streamlit_authenticator as stauth
-from FacebookAds import get_data_from_bucket
-from io import BytesIO
+from datasets import load_datasets
+from periods import slice_period, month_bounds, year_bounds, date_bounds
+from rollups import load_cube
+from tags import load_tag_index
+from masks import load_masks
+from metrics import get_email_revenue_sales
+from debug import show_performance_panel
+from instrumentation import plotly_chart
 from datetime import timedelta, datetime
 import pandas as pd
 from millify import millify
@@ -11,6 +17,8 @@ import plotly.graph_objects as go
 import numpy as np
 from math import ceil
 
+st.set_page_config(layout='wide')
+
 @st.cache_data
 def get_active_metrics(data: pd.DataFrame) -> dict:
       """
@@ -26,7 +34,7 @@ def get_active_metrics(data: pd.DataFrame) -> dict:
 
       """
       metrics = dict()
-      grouped_data = data[['automation_name', 'headline', 'send_amt', 'uniquelinkclicks', 'uniqueopens','replies','hardbounces', 'unsubscribes']].groupby(by=['automation_name', 'headline']).sum()
+      grouped_data = data[['automation_name', 'headline', 'send_amt', 'uniquelinkclicks', 'uniqueopens','replies','hardbounces', 'unsubscribes']].groupby(by=['automation_name', 'headline'], observed=True).sum()
       grouped_data['ctr'] = grouped_data['uniquelinkclicks']/grouped_data['send_amt']
       grouped_data['open_rate'] = grouped_data['uniqueopens']/grouped_data['send_amt']
       metrics['open_rate'] = grouped_data['open_rate'].mean()
@@ -43,10 +51,9 @@ def get_active_metrics(data: pd.DataFrame) -> dict:
 
 
 def get_n_email_sessions(ga4: pd.DataFrame) -> int:
-     return len(ga4.loc[(ga4['utm_source_std'] == 'Active Campaign')
-                        & (ga4['event_name'] == 'session_start')])
+     return ga4.loc[(ga4['utm_source_std'] == 'Active Campaign')
+                    & (ga4['event_name'] == 'session_start'), 'count'].sum()
 
-#TODO
 def get_upgrades(hotmart_df: pd.DataFrame, active_contacts_df: pd.DataFrame, active_tags: pd.DataFrame) -> int:
     """
     Given the hotmart transaction info on hotmart_df looks for the transactions that are valid (APROVED or COMPLETE) checks the
@@ -56,89 +63,32 @@ def get_upgrades(hotmart_df: pd.DataFrame, active_contacts_df: pd.DataFrame, act
     return 0 
 
 
-def get_email_revenue_sales(hotmart: pd.DataFrame) -> dict:
+def get_new_leads(date_range: list, forbidden_tags: list) -> int:
     """
-    Get the e-mail revenue and n_sales from Hotmart DataFrame, by filtering only valid transactions (APPROVED or COMPLETED)
-    whose tracking.sck contains "email".
-
-    PARAMETERS:
-
-    ga4 : pd.DataFrame
-
-    RETURNS
-    dict 
+    Get the number of new leads based on cdate in active_contacts and if these contacts doesn't have the forbidden
+    TAGs (see tags.TagIndex)
     """
+    return get_contacts_without_tags(date_range[0], date_range[1], forbidden_tags)['id'].nunique()
 
-    valid_df = hotmart.loc[hotmart['status'].isin(['APPROVED', 'COMPLETE'])]
-    hotmart_mail = {}
 
-    if ((valid_df['tracking.source_sck'].str.contains(pat='email')) | valid_df['tracking.source'].str.contains(pat='email')).sum() > 0:
-        hotmart_mail['email_revenue'] = valid_df.loc[((valid_df['tracking.source_sck'].str.split('_').apply(lambda x: x[0]).str.contains(pat='email')) | (valid_df['tracking.source'].str.contains(pat='email')))
-                                                     & (valid_df['source'] == 'PRODUCER'), 'commission.value'].sum()
-    else:
-        hotmart_mail['email_revenue'] = 0
-    
-    hotmart_mail['email_sales'] = len(valid_df.loc[(valid_df['tracking.source_sck'].str.split('_').apply(lambda x: x[0]).str.contains(pat='email')) |(valid_df['tracking.source'].str.contains('email')), 'transaction'].unique())
-    hotmart_mail['cart_abandonment'] = valid_df.loc[valid_df['tracking.source_sck'].str.split('_').apply(lambda x: x[0]).str.contains('email-abandono-carrinho'), 'transaction'].nunique()
+def get_contacts_without_tags(start, end, forbidden_tags: list) -> pd.DataFrame:
+    """Contacts created from start to end without any of forbidden_tags, from the frame of the tag index"""
+    tag_index = load_tag_index()
+    return tag_index.select_without(tag_index.frame, forbidden_tags, start, end)
 
-    return hotmart_mail
 
-def get_new_leads(active_contacts_df: pd.DataFrame, forbidden_tags: list) -> int:
-    """
-    Get the number of new leads based on cdate in active_contacts_df and if these contacts doesn't have the forbidden TAGs 
-    """
-    # Check if 'tag' column contains lists
-    valid_tags_mask = active_contacts_df['tag'].apply(lambda x: isinstance(x, list))
-
-    # Filter out rows with forbidden tags
-    #filtered_contacts = active_contacts_df.loc[valid_tags_mask & ~active_contacts_df['tag'].apply(lambda x: any(tag in x for tag in forbidden_tags)), 'id'].nunique()   
-    return 0
-
-
-
-try:
-    active_campaign = st.session_state['active_campaign']
-except:
-    tmp_active = get_data_from_bucket(bucket_name='dashboard_marketing_processed', file_name='ActiveCampaign.feather', file_type='.feather')
-    raw_active = pd.read_feather(BytesIO(tmp_active))
-    raw_active['automation_name'] = raw_active['automation_name'].fillna(value='Sem automação')
-    st.session_state['active_campaign'] = raw_active
-    active_campaign = st.session_state['active_campaign']
-
-try:
-    active_contacts = st.session_state['active_campaign_contacts']
-except:
-    tmp_contacts = get_data_from_bucket(bucket_name='dashboard_marketing_processed', file_name='contacts_activecampaign.feather', file_type='.feather')
-    raw_contacts = pd.read_feather(BytesIO(tmp_contacts))
-    raw_contacts['id'] = raw_contacts['id'].astype(int)
-    
-    tmp_tag = get_data_from_bucket(bucket_name='dashboard_marketing_processed', file_name='ActiveCampaign_contacts_TAGs.feather', file_type='.feather')
-    active_tags = pd.read_feather(BytesIO(tmp_tag))
-    active_tags['contact'] = active_tags['contact'].astype(int)
-    active_tags['tag'] = active_tags['tag'].apply(lambda x: x.astype(int))
-    active_contacts = raw_contacts.merge(active_tags, left_on='id', right_on='contact', how='left')
-    active_contacts.drop(['contact'], axis=1, inplace=True)
-    st.session_state['active_campaign_contacts'] = active_contacts
-
-try:
-    ga4 = st.session_state['ga4']
-except:
-    tmp_ga4 = get_data_from_bucket(bucket_name='dashboard_marketing_processed', file_name='ga4_data_dash.parquet', file_type='.parquet')
-    raw_ga4 = pd.read_parquet(BytesIO(tmp_ga4), engine='pyarrow')
-    st.session_state['ga4'] = raw_ga4
-    ga4 = st.session_state['ga4']
-
-try:
-    hotmart = st.session_state['hotmart_data']
-except:
-    tmp_hotmart = get_data_from_bucket(bucket_name='dashboard_marketing_processed', file_name='processed_hotmart.parquet', file_type='.parquet')
-    raw_hotmart = pd.read_parquet(BytesIO(tmp_hotmart), engine='pyarrow')
-    raw_hotmart['count'] = 1
-    raw_hotmart['tracking.source_sck'] = raw_hotmart['tracking.source_sck'].fillna(value='Desconhecido')
-    raw_hotmart['approved_date'] = pd.to_datetime(raw_hotmart['approved_date'])
-    raw_hotmart['order_date'] = pd.to_datetime(raw_hotmart['order_date'])
-    st.session_state['hotmart_data'] = raw_hotmart
-    hotmart = st.session_state['hotmart_data'] = raw_hotmart
+
+datasets = load_datasets(['active_campaign', 'active_contacts', 'ga4', 'hotmart'])
+active_campaign = datasets['active_campaign']
+active_contacts = datasets['active_contacts']
+ga4 = datasets['ga4']
+hotmart = datasets['hotmart']
+active_campaign_cube = load_cube('active_campaign_daily')
+# as seleções usam o frame de cada MaskSet (ver masks), da mesma versão das máscaras
+hotmart_masks = load_masks('hotmart')
+hotmart_cube_masks = load_masks('hotmart_daily')
+ga4_sessions_masks = load_masks('ga4_sessions') # só os session_start, ver ga4_events
+ga4_cube_masks = load_masks('ga4_daily')
 
 
 
@@ -146,34 +96,23 @@ except:
 date_range = st.sidebar.date_input("Periodo atual", value=(active_campaign['last_date'].max()-timedelta(days=6), active_campaign['last_date'].max()), max_value=active_campaign['last_date'].max(), min_value=active_campaign['last_date'].min(), key='active_dates')
 dates_benchmark_active = st.date_input("Periodo de para comparação", value=(active_campaign['last_date'].max()-timedelta(days=13), active_campaign['last_date'].max()-timedelta(days=7)), max_value=active_campaign['last_date'].max(), min_value=active_campaign['send_date'].min(), key='active_dates_benchmark')
 
-limited_active = active_campaign.loc[(active_campaign['last_date'].dt.date >= date_range[0]) & (active_campaign['last_date'].dt.date <= date_range[1])]
-limited_active_benchmark = active_campaign.loc[(active_campaign['last_date'].dt.date >= dates_benchmark_active[0]) & (active_campaign['last_date'].dt.date <= dates_benchmark_active[1])]
-
-limited_contacts = active_contacts.loc[(active_contacts['cdate'].dt.date >= date_range[0]) & (active_contacts['cdate'].dt.date <= date_range[1])]
-limited_contacts_benchmark = active_contacts.loc[(active_contacts['cdate'].dt.date >= dates_benchmark_active[0]) & (active_contacts['cdate'].dt.date <= dates_benchmark_active[1])]
+limited_active = slice_period(active_campaign_cube, date_range[0], date_range[1])
+limited_active_benchmark = slice_period(active_campaign_cube, dates_benchmark_active[0], dates_benchmark_active[1])
 
 ############## HARDCODED PRE-SETS #################################################
 forbidden_tags = [172,214,246,252,258,264,270,276]
 
 ##### OUTRAS FONTES #####
-limited_ga4 = ga4.loc[(ga4['event_date'].dt.date >= date_range[0]) & 
-                      (ga4['event_date'].dt.date <= date_range[1]) &
-                      (ga4['event_name'] == 'session_start')]
+limited_ga4 = ga4_cube_masks['session_start'].select(ga4_cube_masks.frame, date_range[0], date_range[1])
 
-limited_ga4_benchmark = ga4.loc[(ga4['event_date'].dt.date >= dates_benchmark_active[0]) &
-                            (ga4['event_date'].dt.date <= dates_benchmark_active[1]) &
-                            (ga4['event_name'] == 'session_start')]
+limited_ga4_benchmark = ga4_cube_masks['session_start'].select(ga4_cube_masks.frame, dates_benchmark_active[0], dates_benchmark_active[1])
 
 if ((len(limited_ga4) == 0) | (len(limited_active_benchmark) == 0)):
-     st.warning(f'"🚨" dados do GA4 indisponíveis para o periodo selecionado período disponível {ga4["event_date"].max()} - {ga4["event_date"].min()}')
+     st.warning(f'"🚨" dados do GA4 indisponíveis para o periodo selecionado período disponível {date_bounds(ga4)[1]} - {date_bounds(ga4)[0]}')
 
-limited_hotmart = hotmart.loc[(hotmart['order_date'].dt.date >= date_range[0]) & 
-                                (hotmart['order_date'].dt.date <= date_range[1]) & 
-                                (hotmart['status'].isin(['APPROVED','REFUNDED','COMPLETE']))] #desprezando compras canceladas
+limited_hotmart = hotmart_cube_masks['valid_or_refunded'].select(hotmart_cube_masks.frame, date_range[0], date_range[1]) #desprezando compras canceladas
 
-limited_hotmart_benchmark = hotmart.loc[(hotmart['order_date'].dt.date >= dates_benchmark_active[0]) & 
-                        (hotmart['order_date'].dt.date <= dates_benchmark_active[1]) & 
-                        (hotmart['status'].isin(['APPROVED','REFUNDED','COMPLETE']))] #desprezando compras canceladas
+limited_hotmart_benchmark = hotmart_cube_masks['valid_or_refunded'].select(hotmart_cube_masks.frame, dates_benchmark_active[0], dates_benchmark_active[1]) #desprezando compras canceladas
 if ((len(limited_hotmart) == 0) | (len(limited_hotmart_benchmark) == 0)):
      st.warning(f'"🚨" dados da Hotmart indisponíveis para o periodo selecionado período disponível {hotmart["order_date"].max()} - {hotmart["order_date"].min()}')
 
@@ -183,8 +122,8 @@ current_hotmart = get_email_revenue_sales(limited_hotmart)
 benchmark_hot = get_email_revenue_sales(limited_hotmart_benchmark)
 current_email_sessions = get_n_email_sessions((limited_ga4))
 benchmark_email_sessions = get_n_email_sessions(limited_ga4_benchmark)
-current_active_metrics = get_new_leads(active_contacts_df=limited_contacts, forbidden_tags=forbidden_tags)
-benchmark_active_metrics = get_new_leads(active_contacts_df=limited_contacts_benchmark, forbidden_tags=forbidden_tags)
+current_active_metrics = get_new_leads(date_range=date_range, forbidden_tags=forbidden_tags)
+benchmark_active_metrics = get_new_leads(date_range=dates_benchmark_active, forbidden_tags=forbidden_tags)
 email_marketing_target_value = 50000
 ##################### OVERVIEW ####################
 overview = st.expander(label='Visão Geral')
@@ -209,7 +148,7 @@ with overview:
                                                     ]}
                                                 ))
 
-        st.plotly_chart(target_fig, use_container_width=True)
+        plotly_chart(target_fig, use_container_width=True)
     with col_2:
         st.metric(label='Faturamento', value=f'R$ {millify(current_hotmart["email_revenue"], precision=1)}', delta=millify((current_hotmart['email_revenue'] - benchmark_hot['email_revenue']), precision=1))
         st.metric(label='Total de leads', value=active_contacts['id'].nunique())
@@ -227,99 +166,75 @@ with email_hist_exp:
     hist_col1, hist_col2 = st.columns(2)
     with hist_col1:
         if option == 'Não':
-            month = datetime.today().month       
-            hist_sales = hotmart.loc[(hotmart['status'].isin(['APPROVED', 'COMPLETE']))
-                        & (pd.to_datetime(hotmart['order_date']).dt.month == month)
-                        & (pd.to_datetime(hotmart['order_date']).dt.year == datetime.today().year)
-                        & ((hotmart['tracking.source_sck'].str.split('_').apply(lambda x: x[0]).str.contains(pat='email') | (hotmart['tracking.source'].str.contains(pat='email')))), 
-                        ['order_date', 'transaction']].copy()
+            month_start, month_end = month_bounds(datetime.today().year, datetime.today().month)
+            month_hotmart = hotmart_masks['valid'].select(hotmart_masks.frame, month_start, month_end)
+            hist_sales = month_hotmart.loc[month_hotmart['is_email'], ['order_date', 'transaction']].copy()
             hist_sales['date'] = hist_sales['order_date']
             hist_sales = hist_sales[['date', 'transaction']].groupby(by='date').count().reset_index()
             
 
-            tmp_contacts = active_contacts[['cdate','id', 'tag']].copy()
-            tmp_contacts = tmp_contacts.loc[(tmp_contacts['cdate'].dt.month == month)
-                                            & (tmp_contacts['cdate'].dt.year == datetime.today().year)
-                                            & (~tmp_contacts['tag'].isin(forbidden_tags))]
+            tmp_contacts = get_contacts_without_tags(month_start, month_end, forbidden_tags)[['cdate','id']].copy()
             tmp_contacts['date'] = tmp_contacts['cdate'].dt.date
             hist_leads = tmp_contacts[['date', 'id']].groupby(by='date').count().reset_index()
 
-            hist_email_sessions = ga4.loc[(ga4['event_name'] == 'session_start') 
-                                        & (ga4['utm_source_std'] == 'Active Campaign')
-                                        & (ga4['event_date'].dt.month == month)
-                                        & (ga4['event_date'].dt.year == datetime.today().year), ['event_date','event_name']].copy()
+            hist_email_sessions = ga4_sessions_masks['active_campaign'].select(ga4_sessions_masks.frame, month_start, month_end)[['event_date','event_name']].copy()
             hist_email_sessions['date'] = hist_email_sessions['event_date'].dt.date
             hist_email_sessions = hist_email_sessions[['date', 'event_name']].groupby(by='date').count().reset_index()
         
 
         else:
             hist_dates = st.date_input(label='Selecione o periodo desejado', value=[active_campaign['last_date'].max()-timedelta(days=6), active_campaign['last_date'].max()], max_value=active_campaign['last_date'].max(), min_value=active_campaign['last_date'].min())
-            hist_sales = hotmart.loc[(hotmart['status'].isin(['APPROVED', 'COMPLETE']))
-            & (pd.to_datetime(hotmart['order_date']).dt.date >= hist_dates[0])
-            & (pd.hotmart(hotmart['order_date']).dt.date <= hist_dates[1])
-            & ((hotmart['tracking.source_sck'].str.split('_').apply(lambda x: x[0]).str.contains(pat='email') | (hotmart['tracking.source'].str.contains(pat='email')))), 
-            ['order_date', 'transaction']].copy()
+            period_hotmart = hotmart_masks['valid'].select(hotmart_masks.frame, hist_dates[0], hist_dates[1])
+            hist_sales = period_hotmart.loc[period_hotmart['is_email'], ['order_date', 'transaction']].copy()
             hist_sales['date'] = hist_sales['order_date']
             hist_sales = hist_sales[['date', 'transaction']].groupby(by='date').count().reset_index()
 
-            tmp_contacts = active_contacts[['cdate','id', 'tag']].copy()
-            tmp_contacts = tmp_contacts.loc[(tmp_contacts['cdate'].dt.date >= hist_dates[0])
-                                            & (tmp_contacts['cdate'].dt.date <= hist_dates[1])
-                                            & (~tmp_contacts['tag'].isin(forbidden_tags))]
+            tmp_contacts = get_contacts_without_tags(hist_dates[0], hist_dates[1], forbidden_tags)[['cdate','id']].copy()
             tmp_contacts['date'] = tmp_contacts['cdate'].dt.date
             hist_leads = tmp_contacts[['date', 'id']].groupby(by='date').count().reset_index()
 
-            hist_email_sessions = ga4.loc[(ga4['event_name'] == 'session_start')
-                                          & (ga4['utm_source_std'] == 'Active Campaign')
-                                          & (ga4['event_date'].dt.date >= hist_dates[0])
-                                          & (ga4['event_date'].dt.date <= hist_dates[1]), ['event_date','event_name']].copy()
+            hist_email_sessions = ga4_sessions_masks['active_campaign'].select(ga4_sessions_masks.frame, hist_dates[0], hist_dates[1])[['event_date','event_name']].copy()
             hist_email_sessions['date'] = hist_email_sessions['event_date'].dt.date
             hist_email_sessions = hist_email_sessions[['date', 'event_name']].groupby(by='date').count().reset_index()
         
         
         
         fig_hist_sales = px.line(data_frame=hist_sales, x='date', y='transaction', title='Histórico de vendas de email marketing', markers=True).update_traces(marker_size=10).update_layout(yaxis_range=[0, hist_sales['transaction'].max() + 5], yaxis_title='Número de vendas', xaxis_title='Data')
-        st.plotly_chart(fig_hist_sales, use_container_width=True)   
+        plotly_chart(fig_hist_sales, use_container_width=True)   
 
         fig_hist_leads = px.line(data_frame=hist_leads, x='date', y='id', title='Histórico de novos leads').update_layout(yaxis_range=[0, hist_leads['id'].max() + 50], yaxis_title='Número de novos leads', xaxis_title='Data')
-        st.plotly_chart(fig_hist_leads, use_container_width=True)
+        plotly_chart(fig_hist_leads, use_container_width=True)
 
         fig_hist_sessions = px.line(data_frame=hist_email_sessions, x='date', y='event_name', title='Histórico de novas sessões oriundas do email').update_layout(yaxis_range=[0, hist_email_sessions['event_name'].max() + 50], yaxis_title='Número de novas sessões', xaxis_title='Data')
-        st.plotly_chart(fig_hist_sessions, use_container_width=True)
+        plotly_chart(fig_hist_sessions, use_container_width=True)
 
     with hist_col2:
         month_order = ['January', 'February', 'March', 'April', 'May', 'June', 'July', 'August', 'September', 'October', 'November', 'December']
-        year = datetime.today().year
-        hist_sales_y = hotmart.loc[(hotmart['status'].isin(['APPROVED', 'COMPLETE']))
-                                 & (pd.to_datetime(hotmart['order_date']).dt.year == year)
-                                 & ((hotmart['tracking.source_sck'].str.split('_').apply(lambda x: x[0]).str.contains(pat='email') | (hotmart['tracking.source'].str.contains(pat='email')))), 
-                                ['order_date', 'transaction']].copy()
+        year_start, year_end = year_bounds(datetime.today().year)
+        year_hotmart = hotmart_masks['valid'].select(hotmart_masks.frame, year_start, year_end)
+        hist_sales_y = year_hotmart.loc[year_hotmart['is_email'], ['order_date', 'transaction']].copy()
         
         hist_sales_y['month'] = pd.to_datetime(hist_sales_y['order_date']).dt.month_name()
         hist_sales_y = hist_sales_y[['month', 'transaction']].groupby(by='month').count().reset_index()
 
         
-        tmp_contacts = active_contacts[['cdate','id', 'tag']].copy()
-        tmp_contacts = tmp_contacts.loc[(tmp_contacts['cdate'].dt.year == datetime.today().year)
-                                        & (~tmp_contacts['tag'].isin(forbidden_tags))]
+        tmp_contacts = get_contacts_without_tags(year_start, year_end, forbidden_tags)[['cdate','id']].copy()
         tmp_contacts['month'] = tmp_contacts['cdate'].dt.month_name()
         hist_leads_y = tmp_contacts[['month', 'id']].groupby(by='month').count().reset_index()
 
-        hist_email_sessions = ga4.loc[(ga4['event_name'] == 'session_start')
-                                      & (ga4['utm_source_std'] == 'Active Campaign')
-                                      & (ga4['event_date'].dt.year == datetime.today().year), ['event_date','event_name']].copy()
+        hist_email_sessions = ga4_sessions_masks['active_campaign'].select(ga4_sessions_masks.frame, year_start, year_end)[['event_date','event_name']].copy()
     
         hist_email_sessions['month'] = hist_email_sessions['event_date'].dt.month_name()
         hist_email_sessions_y = hist_email_sessions[['month', 'event_name']].groupby(by='month').count().reset_index()   
 
         fig_hist_sales_y = px.bar(data_frame=hist_sales_y, y='month', x='transaction', title='Cumulativo mensal de vendas de email marketing', text='transaction', category_orders={'month': month_order})#.update_layout(yaxis_range=[0, hist_sales['transaction'].max() + 5], yaxis_title='Número de vendas', xaxis_title='Data')
-        st.plotly_chart(fig_hist_sales_y, use_container_width=True)   
+        plotly_chart(fig_hist_sales_y, use_container_width=True)   
 
         fig_hist_leads = px.bar(data_frame=hist_leads_y, x='id', y='month', title='Cumulativo mensal de novos leads', text='id', category_orders={'month': month_order})
-        st.plotly_chart(fig_hist_leads, use_container_width=True)
+        plotly_chart(fig_hist_leads, use_container_width=True)
 
         fig_hist_sessions = px.bar(data_frame=hist_email_sessions_y, y='month', x='event_name', title='Cumulativo mensal de novas sessões oriundas do email', text='event_name',category_orders={'month': month_order})
-        st.plotly_chart(fig_hist_sessions, use_container_width=True)
+        plotly_chart(fig_hist_sessions, use_container_width=True)
 
 active_details_exp = st.expander('Detalhamento por e-mail/automação')
 
@@ -352,7 +267,7 @@ with active_details_exp:
 
     else:
         auto_opt = st.selectbox(label='Selecione a automação', options=active_campaign.loc[active_campaign['automation_name'] != 'Sem automação', 'automation_name'].unique())
-        automation_data = active_campaign.loc[active_campaign['automation_name'] == auto_opt, ['automation_name', 'send_amt', 'uniquelinkclicks', 'uniqueopens', 'replies', 'hardbounces', 'unsubscribes']].groupby(by='automation_name').sum()
+        automation_data = active_campaign.loc[active_campaign['automation_name'] == auto_opt, ['automation_name', 'send_amt', 'uniquelinkclicks', 'uniqueopens', 'replies', 'hardbounces', 'unsubscribes']].groupby(by='automation_name', observed=True).sum()
         automation_data['open_rate'] = automation_data['uniqueopens']/automation_data['send_amt']
         automation_data['ctr'] = automation_data['uniquelinkclicks']/automation_data['send_amt']
         
@@ -372,7 +287,5 @@ with active_details_exp:
             st.metric(label='Bounces', value=automation_data['hardbounces'])
             st.metric(label='Unsubscribes', value=automation_data['unsubscribes'])
 
-
-
-    
-        
\ No newline at end of file
+if st.session_state.get('authentication_status'): # painéis de debug só para quem fez login
+    show_performance_panel()
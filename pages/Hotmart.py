@@ -1,7 +1,13 @@
 import streamlit as st
 import streamlit_authenticator as stauth
-from FacebookAds import get_data_from_bucket, process_data
-from io import BytesIO
+from datasets import load_datasets
+from periods import slice_period, date_bounds
+from rollups import load_cube
+from masks import load_masks, Mask, MaskSet
+from figures import cached_figure
+from debug import show_memory_panel, show_performance_panel
+from instrumentation import plotly_chart
+from metrics import get_hotmart_metrics
 from datetime import timedelta
 import pandas as pd
 from millify import millify
@@ -9,29 +15,35 @@ from plotly.subplots import make_subplots
 import plotly.express as px
 import plotly.graph_objects as go
 
-def get_metrics(df: pd.DataFrame, fb_data: pd.DataFrame, date_range:list) -> dict:
-    """
-    Calculates the metrics (add metrics here) for a given df
-    """
-    metrics = dict()
-    valid_df = df.loc[df['status'].isin(['APPROVED', 'COMPLETE'])]
-    metrics['billing'] = valid_df.loc[valid_df['source'] == 'PRODUCER', 'commission.value'].sum()
-    metrics['n_valid_sales'] = valid_df.loc[(valid_df['source'] == 'PRODUCER'), 'transaction'].nunique()
-    metrics['refunds'] = len(df.loc[(df['status'] == 'REFUNDED') & (df['approved_date'].dt.date >= date_range[0]) & (df['approved_date'].dt.date <= date_range[1]), 'transaction'].unique())
-    metrics['avarage_ticket'] = metrics['billing'] / metrics['n_valid_sales']
-    metrics['affiliates_sales'] = len(valid_df.loc[(valid_df['source'] == 'AFFILIATE'), 'transaction'])
-    transactions_by_affiliates = valid_df.loc[valid_df['source'] == 'AFFILIATE', 'transaction']
-    metrics['affiliates_revenue'] = valid_df.loc[(valid_df['transaction'].isin(transactions_by_affiliates)) & (valid_df['source'] == 'PRODUCER'), 'commission.value'].sum()
-    metrics['sales_team_sales'] = len(valid_df.loc[valid_df['tracking.source_sck'].str.split('_').apply(lambda x: x[0]).str.contains('venda'), 'transaction'])
-    metrics['sales_team_revenue'] = valid_df.loc[valid_df['tracking.source_sck'].str.split('_').apply(lambda x: x[0]).str.contains('venda'), 'commission.value'].sum()
-    metrics['profit'] = metrics['billing'] - fb_data['spend'].sum()
-    if ((valid_df['tracking.source_sck'].str.contains(pat='email')) | (valid_df['tracking.source'].str.contains(pat='email'))).sum() > 0:
-        metrics['email_revenue'] = valid_df.loc[((valid_df['tracking.source_sck'].str.split('_').apply(lambda x: x[0]).str.contains(pat='email'))|
-                                                (valid_df['tracking.source'].str.contains(pat='email'))) &
-                                                (valid_df['source'] == 'PRODUCER'), 'commission.value'].sum()
-    else:
-        metrics['email_revenue'] = 0
-    return metrics
+st.set_page_config(layout='wide')
+
+def build_sck_figure(producer_sales: pd.DataFrame) -> go.Figure:
+    sales_by_sck = producer_sales[['sck_prefix', 'count']].groupby(by='sck_prefix', observed=True).sum().reset_index()
+    sales_by_sck['sck'] = sales_by_sck['sck_prefix'].astype(str)
+    return px.pie(data_frame=sales_by_sck, values='count', names= 'sck', hole=0.5, 
+                  title='Distribuição das vendas por sck', height=600).update_traces(textinfo='percent+value')
+
+
+def build_product_figure(producer_sales: pd.DataFrame) -> go.Figure:
+    product_revenue = producer_sales[['commission.value', 'product_name']].groupby(by='product_name', observed=True).sum()
+    n_products = producer_sales[['count', 'product_name']].groupby(by='product_name', observed=True).sum()
+    product_figure = make_subplots(rows=1, cols=2, column_titles=['Distribuição dos items vendidos', 'Faturamento por item'], shared_yaxes=True, specs=[[{"type": "pie"}, {"type": "pie"}]])
+    
+    product_figure.add_trace(trace= go.Pie(labels=n_products.index, values=n_products['count'], domain=dict(x=[0, 0.5])), row=1, col=1).update_traces(textinfo='percent+value')
+    product_figure.add_trace(go.Pie(labels=product_revenue.index, values=product_revenue['commission.value'],domain=dict(x=[0.51, 1.0])), row=1, col=2).update_traces(textinfo='percent+value')
+    return product_figure
+
+
+def select_producer_sales(hotmart_cube_masks: MaskSet, date_range) -> pd.DataFrame:
+    return (hotmart_cube_masks['valid'] & hotmart_cube_masks['producer']).select(hotmart_cube_masks.frame, date_range[0], date_range[1])
+
+
+def build_historic_figure(hotmart: pd.DataFrame, sales: Mask, hotmart_metric: str, column: str) -> go.Figure:
+    # hotmart: o frame das máscaras (MaskSet.frame), as linhas de sales são posições nele
+    historic_data = sales.select(hotmart)[['approved_date', 'commission.value', 'count']].groupby(by='approved_date').sum()
+    
+    historic_data.sort_index(ascending=True, inplace=True)
+    return px.line(data_frame=historic_data, x=historic_data.index, y=column, title=f'Histórico da metrica: {hotmart_metric}')
 
 
 authenticator = stauth.Authenticate(
@@ -47,43 +59,25 @@ if st.session_state["authentication_status"]:
     authenticator.logout('Logout', 'sidebar')
     st.title('Dados Hotmart')
 
-    try:
-        hotmart = st.session_state['hotmart_data']
-    except:
-        tmp_hotmart = get_data_from_bucket(bucket_name='dashboard_marketing_processed', file_name='processed_hotmart.parquet', file_type='.parquet')
-        raw_hotmart = pd.read_parquet(BytesIO(tmp_hotmart), engine='pyarrow')
-        raw_hotmart['count'] = 1
-        raw_hotmart['order_date'] = pd.to_datetime(raw_hotmart['order_date'])
-        raw_hotmart['tracking.source_sck'] = raw_hotmart['tracking.source_sck'].fillna(value='Desconhecido')
-        raw_hotmart['tracking.source'] = raw_hotmart['tracking.source'].fillna(value='Desconhecido')
-        raw_hotmart['approved_date'] = pd.to_datetime(raw_hotmart['approved_date'])
-        st.session_state['hotmart_data'] = raw_hotmart
-        hotmart = st.session_state['hotmart_data'] = raw_hotmart
-    try:
-        fb = st.session_state['fb']
-    except:
-        fb = process_data('processed_adsets.csv')
-        st.session_state['fb'] = fb
-    
+    datasets = load_datasets(['hotmart', 'fb'], columns={'fb': ['date', 'spend']})
+    hotmart = datasets['hotmart']
+    fb = datasets['fb']
+    hotmart_cube = load_cube('hotmart_daily')
+    show_memory_panel()
 
     ############# FILTRANDO OS DADOS ###########################################
     
-    date_range = st.sidebar.date_input("Periodo atual", value=(pd.to_datetime(hotmart['order_date']).max()-timedelta(days=6), pd.to_datetime(hotmart['order_date']).max()), max_value=pd.to_datetime(hotmart['order_date']).max(), min_value=pd.to_datetime(hotmart['order_date']).min(), key='hotmart_dates')
-    dates_benchmark_hotmart = st.date_input("Periodo de para comparação", value=(pd.to_datetime(hotmart['order_date']).max()-timedelta(days=13), pd.to_datetime(hotmart['order_date']).max()-timedelta(days=7)), max_value=pd.to_datetime(hotmart['order_date']).max(), min_value=pd.to_datetime(hotmart['order_date']).min(), key='hotmart_dates_benchmark')
-    limited_hotmart = hotmart.loc[(hotmart['order_date'].dt.date >= date_range[0]) & 
-                                  (hotmart['order_date'].dt.date <= date_range[1]) & 
-                                  (hotmart['status'].isin(['APPROVED','REFUNDED','COMPLETE']))].copy() #desprezando compras canceladas
-    limited_hotmart['sck'] = limited_hotmart['tracking.source_sck'].apply(lambda x: x.split('_')[0])
-    
-    benchmark = hotmart.loc[(hotmart['order_date'].dt.date >= dates_benchmark_hotmart[0]) & 
-                            (hotmart['order_date'].dt.date <= dates_benchmark_hotmart[1]) & 
-                            (hotmart['status'].isin(['APPROVED','REFUNDED','COMPLETE']))] #desprezando compras canceladas
+    first_day, last_day = date_bounds(hotmart)
+    date_range = st.sidebar.date_input("Periodo atual", value=(last_day-timedelta(days=6), last_day), max_value=last_day, min_value=first_day, key='hotmart_dates')
+    dates_benchmark_hotmart = st.date_input("Periodo de para comparação", value=(last_day-timedelta(days=13), last_day-timedelta(days=7)), max_value=last_day, min_value=first_day, key='hotmart_dates_benchmark')
+    limited_hotmart = slice_period(hotmart_cube, date_range[0], date_range[1])
+    benchmark = slice_period(hotmart_cube, dates_benchmark_hotmart[0], dates_benchmark_hotmart[1])
 
-    limited_fb = fb.loc[(fb['date'] >= date_range[0]) & (fb['date'] <= date_range[1])]
-    benchmark_fb = fb.loc[(fb['date'] >= dates_benchmark_hotmart[0]) & (fb['date'] <= dates_benchmark_hotmart[1])]
+    limited_fb = slice_period(fb, date_range[0], date_range[1])
+    benchmark_fb = slice_period(fb, dates_benchmark_hotmart[0], dates_benchmark_hotmart[1])
     ################ CALCULOS #######################################################
-    current_metrics = get_metrics(limited_hotmart, limited_fb, date_range)
-    benchmark_metrics = get_metrics(benchmark, benchmark_fb,dates_benchmark_hotmart)
+    current_metrics = get_hotmart_metrics(limited_hotmart, limited_fb, date_range)
+    benchmark_metrics = get_hotmart_metrics(benchmark, benchmark_fb,dates_benchmark_hotmart)
     options = {'Faturamento' : 'commission.value',
                'Vendas' : 'count'}
     ################ INICIO #########################################################   
@@ -108,31 +102,20 @@ if st.session_state["authentication_status"]:
         st.metric('Afiliados', value=current_metrics['affiliates_sales'], delta=current_metrics['affiliates_sales'] - benchmark_metrics['affiliates_sales'])
 
     ################## PLOT SCk ######################################
-    sck_figure = px.pie(data_frame=limited_hotmart.loc[(limited_hotmart['status'] != 'REFUNDED') & (limited_hotmart['source'] == 'PRODUCER')], values='count', names= 'sck', hole=0.5, 
-                        title='Distribuição das vendas por sck', height=600).update_traces(textinfo='percent+value')
-    st.plotly_chart(sck_figure, use_container_width=True)
+    hotmart_cube_masks = load_masks('hotmart_daily')
+    window_key = (hotmart_cube_masks.version, tuple(date_range)) # versão do frame de onde as vendas são selecionadas
+    # a seleção só roda quando a figura não está no cache
+    sck_figure = cached_figure('hotmart_sck_pie', window_key, lambda: build_sck_figure(select_producer_sales(hotmart_cube_masks, date_range)))
+    plotly_chart(sck_figure, use_container_width=True)
 
     ###################### PLOT PRODUCTS #############################
-    product_revenue = limited_hotmart.loc[(limited_hotmart['status'] != 'REFUNDED') & (limited_hotmart['source'] == 'PRODUCER'), ['commission.value', 'product_name']].groupby(by='product_name').sum()
-    n_products = limited_hotmart.loc[(limited_hotmart['status'] != 'REFUNDED') & (limited_hotmart['source'] == 'PRODUCER'), ['count', 'product_name']].groupby(by='product_name').sum()
-    product_figure = make_subplots(rows=1, cols=2, column_titles=['Distribuição dos items vendidos', 'Faturamento por item'], shared_yaxes=True, specs=[[{"type": "pie"}, {"type": "pie"}]])
-    
-    product_figure.add_trace(trace= go.Pie(labels=n_products.index, values=n_products['count'], domain=dict(x=[0, 0.5])), row=1, col=1).update_traces(textinfo='percent+value')
-    product_figure.add_trace(go.Pie(labels=product_revenue.index, values=product_revenue['commission.value'],domain=dict(x=[0.51, 1.0])), row=1, col=2).update_traces(textinfo='percent+value')
-    st.plotly_chart(product_figure, use_container_width=True)
+    product_figure = cached_figure('hotmart_product_pies', window_key, lambda: build_product_figure(select_producer_sales(hotmart_cube_masks, date_range)))
+    plotly_chart(product_figure, use_container_width=True)
 
     hotmart_metric = st.selectbox(label='Selecione uma métrica para acompanhar a evolução', options=['Faturamento', 'Vendas'], index=1)
-    if hotmart_metric == 'Faturamento':
-        historic_data = hotmart.loc[hotmart['status'].isin(['APPROVED', 'COMPLETE']) & (hotmart['source'] == 'PRODUCER'), ['approved_date', 'commission.value', 'count']].groupby(by='approved_date').sum()
-    else:
-        historic_data = hotmart.loc[hotmart['status'].isin(['APPROVED', 'COMPLETE']), ['approved_date', 'commission.value', 'count']].groupby(by='approved_date').sum()
-    
-    historic_data.sort_index(ascending=True, inplace=True)
-    historic_fig = px.line(data_frame=historic_data, x=historic_data.index, y=options[hotmart_metric], title=f'Histórico da metrica: {hotmart_metric}')
-    st.plotly_chart(historic_fig, use_container_width=True)
-
-
-    
+    hotmart_masks = load_masks('hotmart')
+    historic_sales = lambda: hotmart_masks['valid'] & hotmart_masks['producer'] if hotmart_metric == 'Faturamento' else hotmart_masks['valid']
+    historic_fig = cached_figure('hotmart_history', (hotmart_masks.version, hotmart_metric), lambda: build_historic_figure(hotmart_masks.frame, historic_sales(), hotmart_metric, options[hotmart_metric]))
+    plotly_chart(historic_fig, use_container_width=True)
 
-    
-    
+    show_performance_panel()
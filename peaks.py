@@ -0,0 +1,149 @@
+"""
+Sales peaks (launches, promotions) detected on the daily Hotmart revenue of the whole history.
+
+The daily producer revenue of the valid sales (hotmart_daily cube, masks valid & producer) is compared with a
+rolling baseline, the median of the BASELINE_DAYS days before each day, and a rolling spread, the median absolute
+deviation from the baseline of those days (scaled to a standard deviation). Medians make both robust to the peaks
+themselves while a peak lasts less than half of the window. The days are then segmented with two thresholds
+(hysteresis), in spreads above the baseline:
+
+    - a peak is a run of days above EXTEND_THRESHOLD, runs separated by up to MAX_GAP quieter days being merged
+    - the run is kept when at least one of its days is above THRESHOLD and it lasts MIN_DAYS or more
+
+Everything is vectorized over the days (a few thousand for years of data), so detection takes milliseconds. It runs
+once per version of the cube and parameters (load_peaks) and aligned_curves puts several peaks on the same day
+offset axis to compare their revenue, spend and ROAS.
+"""
+import numpy as np
+import pandas as pd
+import streamlit as st
+from millify import millify
+
+from datasets import load_dataset, get_dataset_version
+from masks import load_masks
+from periods import DAY_COLUMN, NO_DAY, day_number, from_day_number
+from rollups import get_cube_version
+
+BASELINE_DAYS = 56
+MIN_BASELINE_DAYS = 14
+THRESHOLD = 4.0
+EXTEND_THRESHOLD = 1.5
+MAD_TO_STD = 1.4826
+MIN_DAYS = 3
+MAX_GAP = 2
+BASELINE_FLOOR = 0.25 # of the median revenue of the days with sales, so quiet periods don't make peaks of noise
+
+
+def daily_totals(df: pd.DataFrame, column: str) -> pd.Series:
+    """Sum of column of df (indexed by periods.index_by_day) by day number, with every day from the first to the last"""
+    dated = df.loc[df[DAY_COLUMN] != NO_DAY]
+    if len(dated) == 0:
+        return pd.Series(dtype=float, name=column)
+    days = dated[DAY_COLUMN].to_numpy(dtype=np.int64)
+    first = days.min()
+    totals = np.bincount(days - first, weights=dated[column].to_numpy(dtype=float, na_value=0.0))
+    return pd.Series(totals, index=pd.RangeIndex(first, first + len(totals), name=DAY_COLUMN), name=column)
+
+
+def _runs(active: np.ndarray) -> tuple:
+    """(starts, ends) positions of the runs of True of active, ends inclusive"""
+    edges = np.diff(np.r_[0, active.astype(np.int8), 0])
+    return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1) - 1
+
+
+def detect_peaks(revenue: pd.Series, baseline_days: int = BASELINE_DAYS, threshold: float = THRESHOLD,
+                 extend_threshold: float = EXTEND_THRESHOLD, min_days: int = MIN_DAYS, max_gap: int = MAX_GAP) -> pd.DataFrame:
+    """
+    Peaks of revenue (daily totals by day number, see daily_totals), one row per peak with its start and end
+    (dates, inclusive), days, revenue, baseline (revenue expected for those days), lift (revenue / baseline),
+    best_day and a label for the selectors, sorted by start
+    """
+    columns = ['start', 'end', 'days', 'revenue', 'baseline', 'lift', 'best_day', 'label']
+    values = revenue.to_numpy(dtype=float)
+    if len(values) == 0:
+        return pd.DataFrame(columns=columns)
+
+    selling_days = values[values > 0]
+    floor = (np.median(selling_days) if len(selling_days) > 0 else 0.0) * BASELINE_FLOOR
+    history = revenue.shift(1).rolling(baseline_days, min_periods=MIN_BASELINE_DAYS)
+    baseline = np.maximum(history.median().to_numpy(dtype=float, na_value=np.nan), floor)
+    deviations = (revenue - baseline).abs().shift(1).rolling(baseline_days, min_periods=MIN_BASELINE_DAYS)
+    spread = np.maximum(deviations.median().to_numpy(dtype=float, na_value=np.nan) * MAD_TO_STD, floor)
+    excess = np.nan_to_num((values - baseline) / spread, nan=-np.inf) # no peaks before there is a baseline
+
+    starts, ends = _runs(excess > extend_threshold)
+    if len(starts) > 0:
+        separated = (starts[1:] - ends[:-1] - 1) > max_gap
+        starts, ends = starts[np.r_[True, separated]], ends[np.r_[separated, True]]
+
+    high = np.r_[0, np.cumsum(excess > threshold)]
+    cumulative_revenue = np.r_[0.0, np.cumsum(values)]
+    cumulative_baseline = np.r_[0.0, np.cumsum(np.nan_to_num(baseline))]
+    keep = ((high[ends + 1] - high[starts]) > 0) & ((ends - starts + 1) >= min_days)
+    starts, ends = starts[keep], ends[keep]
+
+    peaks = pd.DataFrame({
+        'start': [from_day_number(day) for day in revenue.index[starts]],
+        'end': [from_day_number(day) for day in revenue.index[ends]],
+        'days': ends - starts + 1,
+        'revenue': cumulative_revenue[ends + 1] - cumulative_revenue[starts],
+        'baseline': cumulative_baseline[ends + 1] - cumulative_baseline[starts],
+        'best_day': [from_day_number(revenue.index[start + np.argmax(values[start:end + 1])]) for start, end in zip(starts, ends)],
+    })
+    peaks['lift'] = peaks['revenue'] / peaks['baseline']
+    peaks['label'] = [f'{start:%d/%m/%Y} - {end:%d/%m/%Y} (R$ {millify(value, precision=1)})'
+                      for start, end, value in zip(peaks['start'], peaks['end'], peaks['revenue'])]
+    return peaks[columns]
+
+
+def aligned_curves(peaks: pd.DataFrame, revenue: pd.Series, spend: pd.Series, days_before: int = 0) -> pd.DataFrame:
+    """
+    Daily revenue, spend (totals by day number, see daily_totals), Lucro and ROAS (Lucro / spend, like the page) of
+    each of peaks by day offset from its start (days_before days before it included, with negative offsets), in long
+    format with the label of the peak
+    """
+    curves = []
+    for peak in peaks.itertuples():
+        first = day_number(peak.start)
+        days = np.arange(first - days_before, first + peak.days)
+        curves.append(pd.DataFrame({'peak': peak.label, 'offset': days - first,
+                                    'Faturamento': revenue.reindex(days, fill_value=0.0).to_numpy(),
+                                    'Investimento FB Ads': spend.reindex(days, fill_value=0.0).to_numpy()}))
+    if len(curves) == 0:
+        return pd.DataFrame(columns=['peak', 'offset', 'Faturamento', 'Investimento FB Ads', 'Lucro', 'ROAS'])
+    aligned = pd.concat(curves, ignore_index=True)
+    aligned['Lucro'] = aligned['Faturamento'] - aligned['Investimento FB Ads']
+    aligned['ROAS'] = aligned['Lucro'] / aligned['Investimento FB Ads'].replace(0.0, np.nan)
+    return aligned
+
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def _get_daily_revenue(version: tuple) -> pd.Series:
+    cube_masks = load_masks('hotmart_daily')
+    producer_sales = (cube_masks['valid'] & cube_masks['producer']).select(cube_masks.frame)
+    return daily_totals(producer_sales, 'commission.value')
+
+
+def load_daily_revenue() -> pd.Series:
+    """Daily producer revenue of the valid sales of the whole history, by day number. Must not be modified."""
+    return _get_daily_revenue(get_cube_version('hotmart_daily'))
+
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def _get_daily_spend(version: tuple) -> pd.Series:
+    return daily_totals(load_dataset('fb', columns=['date', 'spend']), 'spend')
+
+
+def load_daily_spend() -> pd.Series:
+    """Daily Facebook Ads spend of the whole history, by day number. Must not be modified."""
+    return _get_daily_spend(get_dataset_version('fb'))
+
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def _get_peaks(version: tuple, threshold: float, min_days: int) -> pd.DataFrame:
+    return detect_peaks(load_daily_revenue(), threshold=threshold, min_days=min_days)
+
+
+def load_peaks(threshold: float = THRESHOLD, min_days: int = MIN_DAYS) -> pd.DataFrame:
+    """Peaks of the whole history (see detect_peaks) of the current version of the hotmart_daily cube"""
+    return _get_peaks(get_cube_version('hotmart_daily'), threshold, min_days)
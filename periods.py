@@ -0,0 +1,91 @@
+"""
+Date window selection over the loaded datasets.
+
+Every dataset is sorted by its time column when loaded and gets an int32 'day' column (days since 1970-01-01).
+slice_period then finds a window with two binary searches and returns a positional slice of the frame, instead of
+comparing a python date object per row.
+"""
+from datetime import date, timedelta
+import numpy as np
+import pandas as pd
+
+from instrumentation import instrumented
+
+DAY_COLUMN = 'day'
+NO_DAY = np.iinfo(np.int32).max # rows without date go to the end and never fall in a window
+
+
+def to_day_number(series: pd.Series) -> np.ndarray:
+    """Days since 1970-01-01 of a datetime/date series, as int32 (NO_DAY for missing values)"""
+    if isinstance(series.dtype, pd.ArrowDtype) or not pd.api.types.is_datetime64_any_dtype(series.dtype):
+        series = pd.to_datetime(series)
+    if series.dt.tz is not None:
+        series = series.dt.tz_localize(None)
+    missing = series.isna().to_numpy()
+    days = series.to_numpy(dtype='datetime64[ns]').astype('datetime64[D]').astype(np.int64)
+    days[missing] = NO_DAY
+    return days.astype(np.int32)
+
+
+def day_number(day) -> int:
+    """Days since 1970-01-01 of a date/datetime"""
+    return int(np.datetime64(pd.Timestamp(day).date(), 'D').astype(np.int64))
+
+
+def from_day_number(day: int) -> date:
+    return date(1970, 1, 1) + timedelta(days=int(day))
+
+
+def index_by_day(df: pd.DataFrame, time_column: str) -> pd.DataFrame:
+    """Sorts df by time_column and adds the 'day' key used by slice_period"""
+    days = to_day_number(df[time_column])
+    order = np.argsort(days, kind='stable')
+    indexed = df.iloc[order].copy()
+    indexed[DAY_COLUMN] = days[order]
+    return indexed
+
+
+def append_by_day(indexed: pd.DataFrame, new: pd.DataFrame, time_column: str) -> pd.DataFrame:
+    """
+    Same as index_by_day(pd.concat([indexed, new])) for a frame indexed by index_by_day, but only new is sorted when
+    its rows come after the ones of indexed (the usual case for rows appended to a source)
+    """
+    new = index_by_day(new, time_column)
+    if (indexed is None) or (len(indexed) == 0):
+        return new
+    if len(new) == 0:
+        return indexed
+    if new[DAY_COLUMN].iloc[0] >= indexed[DAY_COLUMN].iloc[-1]:
+        return pd.concat([indexed, new])
+    return index_by_day(pd.concat([indexed, new]), time_column)
+
+
+def period_rows(df: pd.DataFrame, start, end) -> slice:
+    """Positions of the rows of df (indexed by index_by_day) from start to end, both inclusive"""
+    days = df[DAY_COLUMN].to_numpy()
+    first = np.searchsorted(days, day_number(start), side='left')
+    last = np.searchsorted(days, day_number(end), side='right')
+    return slice(int(first), int(last))
+
+
+@instrumented('filter')
+def slice_period(df: pd.DataFrame, start, end) -> pd.DataFrame:
+    """Rows of df (indexed by index_by_day) from start to end, both inclusive"""
+    return df.iloc[period_rows(df, start, end)]
+
+
+def date_bounds(df: pd.DataFrame) -> tuple:
+    """(first date, last date) of df (indexed by index_by_day)"""
+    days = df[DAY_COLUMN].to_numpy()
+    valid = days[days != NO_DAY]
+    return from_day_number(valid[0]), from_day_number(valid[-1])
+
+
+def month_bounds(year: int, month: int) -> tuple:
+    first = date(year, month, 1)
+    last = (date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)) - timedelta(days=1)
+    return first, last
+
+
+def year_bounds(year: int) -> tuple:
+    return date(year, 1, 1), date(year, 12, 31)
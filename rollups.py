@@ -0,0 +1,123 @@
+"""
+Daily rollup cubes of the datasets, built once per data version and shared by all the sessions.
+
+A cube has one row per day and combination of its dimensions, with the additive measures summed. It is sorted by
+the 'day' key like the datasets themselves, so periods.slice_period selects a window of a cube the same way and the
+KPIs of a window are sums over days x groups instead of over the raw rows. Ratio metrics (ROAS, CPA, CPTV, ...) must
+be derived from the summed measures, never summed themselves.
+
+Distinct counts of Hotmart transactions are kept additive with the measures n_transactions (1 on the first row of
+each transaction) and n_source_transactions (1 on the first row of each transaction and source). This holds because
+the dimensions of the cube don't change between the rows of a transaction with the same source.
+"""
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from datasets import load_dataset, get_dataset_version
+from periods import DAY_COLUMN, NO_DAY, to_day_number
+from instrumentation import timed
+
+FB_MEASURES = ['spend', 'reach', 'impressions', 'inline_link_clicks', 'n_landing_page_view', 'n_post_engagement',
+               'n_post_reaction', 'n_comments', 'n_shares', 'n_purchase', 'action_value_purchase', 'lucro']
+HOTMART_MEASURES = ['commission.value', 'count', 'n_transactions', 'n_source_transactions']
+GA4_MEASURES = ['count']
+ACTIVE_CAMPAIGN_MEASURES = ['send_amt', 'uniquelinkclicks', 'uniqueopens', 'replies', 'hardbounces', 'unsubscribes']
+
+VALID_STATUS = ['APPROVED', 'COMPLETE']
+
+
+def build_cube(df: pd.DataFrame, dimensions: list, measures: list, date_column: str = 'date') -> pd.DataFrame:
+    """
+    Sums measures of df (indexed by periods.index_by_day) by day and dimensions. The result has the 'day' key, a
+    date_column with the day as datetime and the dimensions and measures, sorted by day. Rows without date are dropped.
+    """
+    dated = df.loc[df[DAY_COLUMN] != NO_DAY]
+    cube = dated.groupby([DAY_COLUMN] + dimensions, observed=True, sort=True, dropna=False)[measures].sum().reset_index()
+    cube.insert(1, date_column, pd.to_datetime(cube[DAY_COLUMN].astype('int64'), unit='D'))
+    return cube
+
+
+def aggregate_by(window: pd.DataFrame, column: str, measures: list, distinct: str = 'name') -> pd.DataFrame:
+    """
+    Sums measures of a cube window by column and counts the distinct values of distinct (column 'count') in the same
+    grouped pass, e.g. the metrics and number of adsets of each big_idea, awareness_level or Author
+    """
+    aggregations = {measure: (measure, 'sum') for measure in measures}
+    aggregations['count'] = (distinct, 'nunique')
+    return window.groupby(by=column, observed=True).agg(**aggregations)
+
+
+def build_fb_cube(fb: pd.DataFrame, annotations: pd.DataFrame) -> pd.DataFrame:
+    """date x adset x (big_idea, awareness_level, Author) cube of the conversion campaign"""
+    cube = build_cube(fb, ['name', 'adset_name'], FB_MEASURES)
+
+    # adsets still without annotations get NaN, so grouping by an annotation drops them (see aggregate_by)
+    adset_annotations = annotations.reindex(cube['adset_name'].astype(str).unique())
+    return cube.merge(adset_annotations, left_on='adset_name', right_index=True, how='left')
+
+
+def build_hotmart_cube(hotmart: pd.DataFrame) -> pd.DataFrame:
+    """
+    order date x status x source x product x sck x flags cube. refund_day is the day of approved_date for the
+    refunded sales (periods.NO_DAY otherwise) and has_affiliate marks the valid transactions sold by an affiliate.
+    """
+    columns = ['day', 'transaction', 'status', 'source', 'product_name', 'sck_prefix', 'is_email',
+               'is_cart_abandonment', 'is_sales_team', 'commission.value', 'count']
+    sales = hotmart[columns].copy()
+
+    refunded = (sales['status'] == 'REFUNDED').to_numpy()
+    sales['refund_day'] = np.where(refunded, to_day_number(hotmart['approved_date']), NO_DAY).astype(np.int32)
+    affiliate_transactions = sales.loc[sales['status'].isin(VALID_STATUS) & (sales['source'] == 'AFFILIATE'), 'transaction']
+    sales['has_affiliate'] = sales['transaction'].isin(affiliate_transactions)
+    sales['n_transactions'] = (~sales['transaction'].duplicated()).astype(int)
+    sales['n_source_transactions'] = (~sales[['transaction', 'source']].duplicated()).astype(int)
+
+    dimensions = ['status', 'source', 'product_name', 'sck_prefix', 'is_email', 'is_cart_abandonment',
+                  'is_sales_team', 'has_affiliate', 'refund_day']
+    return build_cube(sales, dimensions, HOTMART_MEASURES, date_column='order_date')
+
+
+def build_ga4_cube(ga4: pd.DataFrame) -> pd.DataFrame:
+    """event date x event_name x utm_source_std x default_channel cube"""
+    return build_cube(ga4, ['event_name', 'utm_source_std', 'default_channel'], GA4_MEASURES, date_column='event_date')
+
+
+def build_active_campaign_cube(active_campaign: pd.DataFrame) -> pd.DataFrame:
+    """last_date x automation x headline cube of the campaign reports"""
+    return build_cube(active_campaign, ['automation_name', 'headline'], ACTIVE_CAMPAIGN_MEASURES, date_column='last_date')
+
+
+# name: (datasets the cube is built from, builder called with them in this order)
+CUBES = {
+    'fb_daily': (['fb', 'annotations'], build_fb_cube),
+    'hotmart_daily': (['hotmart'], build_hotmart_cube),
+    'ga4_daily': (['ga4'], build_ga4_cube),
+    'active_campaign_daily': (['active_campaign'], build_active_campaign_cube),
+}
+
+
+@st.cache_resource(show_spinner=False, max_entries=2 * len(CUBES))
+def _get_cube(name: str, version: tuple) -> pd.DataFrame:
+    sources, builder = CUBES[name]
+    frames = [load_dataset(source) for source in sources]
+    with timed('build_cube', detail=name, rows_in=len(frames[0])) as timer:
+        cube = builder(*frames)
+        timer.rows_out = len(cube)
+    return cube
+
+
+def get_cube_version(name: str) -> tuple:
+    """Version key of the cube name (versions of its datasets), to be used in caches derived from it"""
+    if name not in CUBES:
+        raise KeyError(f'Unknown cube {name}, options: {list(CUBES)}')
+    sources, _ = CUBES[name]
+    return tuple(get_dataset_version(source) for source in sources)
+
+
+def load_cube(name: str) -> pd.DataFrame:
+    """
+    Returns the shared cube name (see CUBES), rebuilt only when one of its datasets changes. The returned frame must
+    not be modified.
+    """
+    return _get_cube(name, get_cube_version(name))
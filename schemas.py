@@ -0,0 +1,131 @@
+"""
+Declared column types of the processed files read by the dashboard.
+
+The Facebook files (processed_adsets, processed_ads and processed_ads_by_media) are read from Parquet with
+categorical names, float32 counters, float64 money columns (FB_MONEY) and a native date32 date column. The CSV
+versions are still accepted (read with the same dtypes) until every artifact is converted with:
+
+    python schemas.py
+
+DATASET_SCHEMAS declares the compact types of the other datasets (categoricals for the low cardinality labels,
+small or nullable integers for the counters), applied by the dataset registry after loading them. Money columns are
+kept as float64 so the sums of a period don't lose the cents. memory_report gives the bytes of each column before
+and after the cast.
+"""
+import pandas as pd
+import pyarrow as pa
+from io import StringIO, BytesIO
+
+DATE_DTYPE = pd.ArrowDtype(pa.date32())
+
+FB_CATEGORIES = ['name', 'adset_name', 'campaign_name', 'video_name', 'asset_type']
+FB_MONEY = ['spend', 'cost_per_thruplay', 'action_value_purchase'] # float64, see the module docstring
+FB_METRICS = ['reach', 'impressions', 'inline_link_clicks', 'n_video_view', 'n_landing_page_view', 'n_post_engagement',
+              'n_post_reaction', 'n_comments', 'n_shares', 'n_purchase']
+FB_STRINGS = ['ad_id', 'hash']
+FB_SCHEMA = {**{col: 'category' for col in FB_CATEGORIES},
+             **{col: 'float32' for col in FB_METRICS},
+             **{col: 'float64' for col in FB_MONEY},
+             **{col: 'string' for col in FB_STRINGS}}
+
+# Columns always read, process_data needs them whatever the projection asked by the page
+FB_REQUIRED_COLUMNS = ['date', 'campaign_name', 'spend', 'action_value_purchase', 'cost_per_thruplay', 'n_video_view', 'impressions']
+
+FB_FILES = ['processed_adsets', 'processed_ads', 'processed_ads_by_media']
+
+HOTMART_SCHEMA = {**{col: 'category' for col in ['status', 'source', 'product_name', 'tracking.source', 'tracking.source_sck',
+                                                 'tracking.external_code', 'payment.type']},
+                  'count': 'int8'}
+GA4_SCHEMA = {**{col: 'category' for col in ['event_name', 'utm_source_std', 'default_channel', 'Path', 'utm_content',
+                                             'utm_campaign', 'utm_source', 'utm_medium']},
+              'count': 'int8'}
+ACTIVE_CAMPAIGN_SCHEMA = {**{col: 'category' for col in ['automation_name', 'headline']},
+                          **{col: 'Int32' for col in ['send_amt', 'uniquelinkclicks', 'uniqueopens', 'replies',
+                                                      'hardbounces', 'unsubscribes']}}
+
+# dataset name (see datasets.DATASETS): schema
+DATASET_SCHEMAS = {
+    'fb': FB_SCHEMA,
+    'ads': FB_SCHEMA,
+    'dct': FB_SCHEMA,
+    'hotmart': HOTMART_SCHEMA,
+    'ga4': GA4_SCHEMA,
+    'active_campaign': ACTIVE_CAMPAIGN_SCHEMA,
+}
+
+
+def to_date(series: pd.Series) -> pd.Series:
+    """Casts series (str, datetime or date32) to the native date dtype"""
+    if series.dtype == DATE_DTYPE:
+        return series
+    return pd.to_datetime(series).astype(DATE_DTYPE)
+
+
+def apply_schema(df: pd.DataFrame, schema: dict) -> pd.DataFrame:
+    """Casts the columns of df that are declared in schema, the others are left as they are"""
+    dtypes = {col: dtype for col, dtype in schema.items() if (col in df.columns) and (df[col].dtype != dtype)}
+    return df.astype(dtypes) if len(dtypes) > 0 else df
+
+
+def memory_report(before: pd.DataFrame, after: pd.DataFrame) -> pd.DataFrame:
+    """Bytes (deep) and dtype of each column of a frame before and after apply_schema, plus a 'total' row"""
+    report = pd.DataFrame({'dtype_before': before.dtypes.astype(str),
+                           'dtype_after': after.dtypes.astype(str),
+                           'bytes_before': before.memory_usage(deep=True, index=False),
+                           'bytes_after': after.memory_usage(deep=True, index=False)})
+    report.loc['total'] = ['', '', report['bytes_before'].sum(), report['bytes_after'].sum()]
+    report['ratio'] = (report['bytes_before'] / report['bytes_after']).round(2)
+    return report
+
+
+def compact_dataset(name: str, df: pd.DataFrame) -> tuple:
+    """
+    Casts the dataset name to its DATASET_SCHEMAS types. Returns (df, memory report), the report is None for the
+    datasets without schema.
+    """
+    if (name not in DATASET_SCHEMAS) or not isinstance(df, pd.DataFrame):
+        return df, None
+    compacted = apply_schema(df, DATASET_SCHEMAS[name])
+    return compacted, memory_report(df, compacted)
+
+
+def _projection(columns: list) -> list:
+    if columns is None:
+        return None
+    return list(dict.fromkeys(FB_REQUIRED_COLUMNS + list(columns)))
+
+
+def read_fb_parquet(content: bytes, columns: list = None) -> pd.DataFrame:
+    """Reads a Facebook parquet file, only the projected columns (plus FB_REQUIRED_COLUMNS) are decoded"""
+    fb_data = pd.read_parquet(BytesIO(content), engine='pyarrow', columns=_projection(columns))
+    return apply_schema(fb_data, FB_SCHEMA)
+
+
+def read_fb_csv(content: str, columns: list = None) -> pd.DataFrame:
+    """Same as read_fb_parquet for the legacy CSV files"""
+    projection = _projection(columns)
+    usecols = None if projection is None else (lambda col: col in projection)
+    fb_data = pd.read_csv(StringIO(content), usecols=usecols, dtype=FB_SCHEMA)
+    fb_data['date'] = to_date(fb_data['date'])
+    return fb_data
+
+
+def convert_fb_csv_to_parquet(bucket_name: str, file_name: str):
+    """
+    One shot conversion of bucket_name/file_name.csv into bucket_name/file_name.parquet with the FB_SCHEMA types
+    """
+    from gcs import get_data_from_bucket, upload_bytes_to_gcs
+
+    fb_data = read_fb_csv(get_data_from_bucket(bucket_name=bucket_name, file_name=f'{file_name}.csv'))
+    if 'Unnamed: 0' in fb_data.columns:
+        fb_data.drop(['Unnamed: 0'], axis=1, inplace=True)
+    parquet_buffer = BytesIO()
+    fb_data.to_parquet(parquet_buffer, engine='pyarrow', index=False)
+    upload_bytes_to_gcs(bucket_name=bucket_name, content=parquet_buffer.getvalue(), destination_blob_name=f'{file_name}.parquet')
+    return
+
+
+if __name__ == '__main__':
+    for file_name in FB_FILES:
+        print(f'Converting {file_name}.csv')
+        convert_fb_csv_to_parquet(bucket_name='dashboard_marketing_processed', file_name=file_name)
@@ -0,0 +1,139 @@
+"""
+Incremental reader of Google Sheets that only grow at the bottom, like the leads sheet of the free funnel.
+
+IncrementalSheet keeps the rows already read (the watermark is their count) and, on refresh, asks the worksheet only
+for the rows after it, so a refresh costs one small request and the new rows instead of the whole sheet. The
+accumulated frame is also saved to a local feather file, so a restarted server starts from it instead of reading the
+sheet again. Refreshes are throttled to one per REFRESH_INTERVAL seconds.
+
+Rows edited or deleted above the watermark are not seen: reset() drops the local copy and reads the sheet again.
+
+FakeWorksheet is an offline stand-in of gspread.Worksheet (the calls used here only), built from lists of rows or
+from a CSV file, to run the reader without the Sheets API.
+"""
+import csv
+import os
+import threading
+import time
+import pandas as pd
+
+DEFAULT_SHEETS_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'dashboard-geral-mkt', 'sheets')
+REFRESH_INTERVAL = 5 * 60
+
+
+def column_letter(n: int) -> str:
+    """A1 notation letter of the column n (1-based)"""
+    letters = ''
+    while n > 0:
+        n, remainder = divmod(n - 1, 26)
+        letters = chr(ord('A') + remainder) + letters
+    return letters
+
+
+class FakeWorksheet:
+    """In memory worksheet, rows[0] is the header. Counts the requests it receives."""
+
+    def __init__(self, rows: list):
+        self.rows = [[str(value) for value in row] for row in rows]
+        self.requests = 0
+
+    @classmethod
+    def from_csv(cls, path: str):
+        with open(path, newline='', encoding='utf-8') as csv_file:
+            return cls(list(csv.reader(csv_file)))
+
+    def append_row(self, row: list):
+        self.rows.append([str(value) for value in row])
+
+    def row_values(self, row: int) -> list:
+        self.requests += 1
+        return list(self.rows[row - 1]) if row <= len(self.rows) else []
+
+    def get_values(self, range_name: str) -> list:
+        """Only the 'A{first row}:{last column}' ranges used by IncrementalSheet are supported"""
+        self.requests += 1
+        first, last = range_name.split(':')
+        first_row = int(first[1:])
+        n_columns = sum((ord(letter) - ord('A') + 1) * 26 ** i for i, letter in enumerate(reversed(last)))
+        return [row[:n_columns] for row in self.rows[first_row - 1:]]
+
+
+class IncrementalSheet:
+    """Rows of a worksheet read incrementally, see the module docstring"""
+
+    def __init__(self, worksheet, cache_path: str = None, parse=None, refresh_interval: float = REFRESH_INTERVAL):
+        """
+        worksheet: gspread.Worksheet (or FakeWorksheet) with the header in the first row
+        cache_path: feather file with the local copy of the rows (None keeps them only in memory)
+        parse: function applied to each batch of new rows (a DataFrame of str), e.g. to convert the dates
+        """
+        self.worksheet = worksheet
+        self.cache_path = cache_path
+        self.parse = parse
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._last_refresh = None
+        self.header = None
+        self.frame = None
+        self._load_cache()
+
+    @property
+    def watermark(self) -> int:
+        """Number of data rows (after the header) already read"""
+        return 0 if self.frame is None else len(self.frame)
+
+    def _load_cache(self):
+        if (self.cache_path is None) or not os.path.exists(self.cache_path):
+            return
+        try:
+            self.frame = pd.read_feather(self.cache_path)
+            self.header = list(self.frame.columns)
+        except Exception: # corrupted or old file, read the sheet again
+            self.frame, self.header = None, None
+
+    def _save_cache(self):
+        if self.cache_path is None:
+            return
+        os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+        tmp_path = f'{self.cache_path}.{threading.get_ident()}.tmp'
+        self.frame.reset_index(drop=True).to_feather(tmp_path)
+        os.replace(tmp_path, self.cache_path)
+
+    def _fetch_new_rows(self) -> pd.DataFrame:
+        if self.header is None:
+            self.header = self.worksheet.row_values(1)
+        first_row = self.watermark + 2 # 1-based, after the header
+        values = self.worksheet.get_values(f'A{first_row}:{column_letter(len(self.header))}')
+        rows = [list(row) + [''] * (len(self.header) - len(row)) for row in values]
+        new_rows = pd.DataFrame(rows, columns=self.header, dtype=object)
+        new_rows.index = pd.RangeIndex(self.watermark, self.watermark + len(new_rows))
+        if (self.parse is not None) and (len(new_rows) > 0):
+            new_rows = self.parse(new_rows)
+        return new_rows
+
+    def refresh(self, force: bool = False) -> pd.DataFrame:
+        """
+        Reads the rows added to the sheet since the last refresh (not before refresh_interval seconds unless force)
+        and returns them, already appended to frame. Their index is their position in the sheet (0 is the first row
+        after the header).
+        """
+        with self._lock:
+            now = time.monotonic()
+            if (not force) and (self.frame is not None) and (self._last_refresh is not None) and (now - self._last_refresh < self.refresh_interval):
+                return self.frame.iloc[:0]
+            new_rows = self._fetch_new_rows()
+            self._last_refresh = now
+            if self.frame is None:
+                self.frame = new_rows
+            elif len(new_rows) > 0:
+                self.frame = pd.concat([self.frame, new_rows])
+            if len(new_rows) > 0:
+                self._save_cache()
+            return new_rows
+
+    def reset(self):
+        """Forgets the rows read so far (and the local copy), the next refresh reads the whole sheet"""
+        with self._lock:
+            self.frame, self.header, self._last_refresh = None, None, None
+            if (self.cache_path is not None) and os.path.exists(self.cache_path):
+                os.remove(self.cache_path)
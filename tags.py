@@ -0,0 +1,130 @@
+"""
+Sparse contact x tag index of the ActiveCampaign contacts, built once per version of the active_contacts dataset.
+
+The tags of the contacts are kept in compressed sparse form, both ways:
+
+    contact -> tags: CSR, the tags of the row i of active_contacts are tags[indptr[i]:indptr[i + 1]] (sorted)
+    tag -> contacts: the rows of each tag, sorted, in one array cut by tag_indptr (the transposed matrix)
+
+The rows are the positions in active_contacts, which is sorted by cdate, so a cdate window is a range of rows
+(periods.period_rows) and the queries cut the sorted rows of each queried tag to the window with binary searches.
+A query costs about the number of contacts of the queried tags inside the window, not the number of contacts.
+
+has_any, has_all and without return a boolean mask over the rows of the window. Like the masks (see masks), the
+rows are only valid for the frame the index was built from, TagIndex.frame: the pages select from it (select_without
+checks the length) rather than from an active_contacts they loaded themselves, which may be of another version.
+"""
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from datasets import load_dataset, get_dataset_version
+from periods import period_rows
+
+
+class TagIndex:
+    """Contact x tag incidence of the rows of a frame, see the module docstring"""
+
+    def __init__(self, indptr: np.ndarray, tags: np.ndarray, rows: np.ndarray, tag_ids: np.ndarray, tag_indptr: np.ndarray,
+                 frame: pd.DataFrame = None):
+        self.indptr = indptr
+        self.tags = tags
+        self.rows = rows
+        self.tag_ids = tag_ids
+        self.tag_indptr = tag_indptr
+        self.frame = frame # the frame of the rows, when built with from_frame
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, column: str = 'tag') -> 'TagIndex':
+        """Index of the tag lists of column of df, kept as the frame of the index"""
+        index = cls.from_lists(df[column])
+        index.frame = df
+        return index
+
+    @classmethod
+    def from_lists(cls, tag_lists: pd.Series) -> 'TagIndex':
+        """Index of a column holding the array (or list) of tag ids of each row, missing values meaning no tags"""
+        values = tag_lists.to_numpy(dtype=object)
+        has_tags = np.fromiter((isinstance(value, (np.ndarray, list)) for value in values), dtype=bool, count=len(values))
+        lengths = np.zeros(len(values), dtype=np.int64)
+        lengths[has_tags] = [len(value) for value in values[has_tags]]
+        tagged = [np.asarray(value) for value, n in zip(values[has_tags], lengths[has_tags]) if n > 0]
+        entries = np.concatenate(tagged).astype(np.int32) if len(tagged) > 0 else np.zeros(0, dtype=np.int32)
+        entry_rows = np.repeat(np.arange(len(values), dtype=np.int32), lengths)
+
+        # contact -> tags, sorted and without repeated tags inside each row
+        order = np.lexsort((entries, entry_rows))
+        entries, entry_rows = entries[order], entry_rows[order]
+        unique = np.r_[True, (entries[1:] != entries[:-1]) | (entry_rows[1:] != entry_rows[:-1])] if len(entries) > 0 else np.zeros(0, dtype=bool)
+        entries, entry_rows = entries[unique], entry_rows[unique]
+        indptr = np.zeros(len(values) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(entry_rows, minlength=len(values)), out=indptr[1:])
+
+        # tag -> contacts
+        order = np.argsort(entries, kind='stable') # rows stay sorted inside each tag
+        tag_ids, tag_starts = np.unique(entries[order], return_index=True)
+        tag_indptr = np.append(tag_starts, len(entries)).astype(np.int64)
+        return cls(indptr, entries, entry_rows[order], tag_ids, tag_indptr)
+
+    def __len__(self) -> int:
+        return len(self.indptr) - 1
+
+    def tags_of(self, row: int) -> np.ndarray:
+        return self.tags[self.indptr[row]:self.indptr[row + 1]]
+
+    def rows_with(self, tag: int) -> np.ndarray:
+        """Sorted rows that have tag"""
+        position = np.searchsorted(self.tag_ids, tag)
+        if (position == len(self.tag_ids)) or (self.tag_ids[position] != tag):
+            return self.rows[:0]
+        return self.rows[self.tag_indptr[position]:self.tag_indptr[position + 1]]
+
+    def count_tags(self, tags: list, rows: slice = None) -> np.ndarray:
+        """How many of tags (distinct) each row of the window rows (all the rows when None) has"""
+        start, stop, _ = (rows or slice(None)).indices(len(self))
+        counts = np.zeros(max(stop - start, 0), dtype=np.int32)
+        for tag in np.unique(np.asarray(tags, dtype=np.int64)):
+            tag_rows = self.rows_with(tag)
+            first, last = np.searchsorted(tag_rows, [start, stop])
+            counts[tag_rows[first:last] - start] += 1
+        return counts
+
+    def has_any(self, tags: list, rows: slice = None) -> np.ndarray:
+        return self.count_tags(tags, rows) > 0
+
+    def has_all(self, tags: list, rows: slice = None) -> np.ndarray:
+        return self.count_tags(tags, rows) == len(np.unique(tags))
+
+    def without(self, tags: list, rows: slice = None) -> np.ndarray:
+        return self.count_tags(tags, rows) == 0
+
+    def select_without(self, df: pd.DataFrame, tags: list, start=None, end=None) -> pd.DataFrame:
+        """
+        Rows of df (the frame of the index, TagIndex.frame) without any of tags, only from start to end (both
+        inclusive, see periods.period_rows) when given
+        """
+        if len(df) != len(self):
+            raise ValueError(f'Tag index of {len(self)} rows applied to a frame of {len(df)} rows')
+        rows = slice(0, len(df)) if start is None else period_rows(df, start, end)
+        return df.iloc[rows.start + np.flatnonzero(self.without(tags, rows))]
+
+
+class _VersionChanged(Exception):
+    """active_contacts changed version while it was loaded, so it can't be cached under the version asked for"""
+
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def _get_tag_index(version: tuple) -> TagIndex:
+    contacts = load_dataset('active_contacts')
+    if get_dataset_version('active_contacts') != version:
+        raise _VersionChanged() # not cached, load_tag_index asks again with the new version
+    return TagIndex.from_frame(contacts)
+
+
+def load_tag_index() -> TagIndex:
+    """TagIndex of the current version of the active_contacts dataset, its frame included. Must not be modified."""
+    while True:
+        try:
+            return _get_tag_index(get_dataset_version('active_contacts'))
+        except _VersionChanged:
+            continue
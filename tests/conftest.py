@@ -0,0 +1,9 @@
+import logging
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+for logger_name in ['streamlit.runtime.caching.cache_data_api', 'streamlit.runtime.scriptrunner_utils.script_run_context']:
+    logging.getLogger(logger_name).setLevel(logging.ERROR) # caches used outside of streamlit run
@@ -0,0 +1,75 @@
+"""
+Minimal stand-in of the GCS JSON API (blob metadata and media downloads) served by http.server, for the tests that
+point storage.Client to it with STORAGE_EMULATOR_HOST.
+"""
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import quote, unquote, urlparse
+
+
+class FakeGCSServer:
+    """Blobs kept in memory as {(bucket, name): (content, generation)}, requests counted by kind"""
+
+    def __init__(self):
+        self.blobs = {}
+        self.requests = {'metadata': 0, 'media': 0}
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1' # keep-alive, so the client can reuse its connections
+
+            def do_GET(self):
+                server._handle(self)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.httpd.server_address[1]}'
+
+    def start(self) -> 'FakeGCSServer':
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def put(self, bucket: str, name: str, content: bytes):
+        with self._lock:
+            generation = self.blobs[(bucket, name)][1] + 1 if (bucket, name) in self.blobs else 1
+            self.blobs[(bucket, name)] = (content, generation)
+
+    def _handle(self, handler: BaseHTTPRequestHandler):
+        url = urlparse(handler.path)
+        parts = url.path.split('/')
+        # /storage/v1/b/<bucket>/o/<name> or /download/storage/v1/b/<bucket>/o/<name>
+        bucket = parts[parts.index('b') + 1]
+        if 'o' not in parts: # bucket metadata
+            with self._lock:
+                self.requests['metadata'] += 1
+            return self._send(handler, 200, json.dumps({'kind': 'storage#bucket', 'name': bucket}).encode())
+        name = unquote('/'.join(parts[parts.index('o') + 1:]))
+        media = 'alt=media' in url.query
+        with self._lock:
+            self.requests['media' if media else 'metadata'] += 1
+            blob = self.blobs.get((bucket, name))
+        if blob is None:
+            return self._send(handler, 404, json.dumps({'error': {'code': 404, 'message': 'Not Found'}}).encode())
+        content, generation = blob
+        if media:
+            return self._send(handler, 200, content, 'application/octet-stream')
+        metadata = {'kind': 'storage#object', 'bucket': bucket, 'name': name, 'generation': str(generation),
+                    'size': str(len(content)), 'md5Hash': f'md5-{generation}',
+                    'mediaLink': f'{self.url}/download/storage/v1/b/{bucket}/o/{quote(name, safe="")}?generation={generation}&alt=media'}
+        self._send(handler, 200, json.dumps(metadata).encode())
+
+    @staticmethod
+    def _send(handler: BaseHTTPRequestHandler, status: int, body: bytes, content_type: str = 'application/json'):
+        handler.send_response(status)
+        handler.send_header('Content-Type', content_type)
+        handler.send_header('Content-Length', str(len(body)))
+        handler.end_headers()
+        handler.wfile.write(body)
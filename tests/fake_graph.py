@@ -0,0 +1,91 @@
+"""
+Stand-in of the Graph API batch endpoint served by http.server, for the tests of creatives.PreviewFetcher.
+
+Answers every item of a batch like the Graph API (code and JSON body), except for the keys the test marks:
+    failing_keys   : the items that mention them get code 500
+    broken_keys    : a batch that mentions one of them gets HTTP 500 (the whole request fails)
+    truncated_keys : a batch that mentions one of them is answered without its last answer
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote
+
+
+class FakeGraphServer:
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.failing_keys = set()
+        self.broken_keys = set()
+        self.truncated_keys = set()
+        self.batches = [] # items of each batch received
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                server._handle(self)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.httpd.server_address[1]}'
+
+    def start(self) -> 'FakeGraphServer':
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    @staticmethod
+    def _answer(item: dict) -> dict:
+        url = unquote(item['relative_url'])
+        if '/adimages' in url:
+            image_hash = json.loads(url.split('hashes=')[1].split('&')[0])[0]
+            body = {'data': [{'hash': image_hash, 'url': f'https://images/{image_hash}.jpg'}]}
+        elif '/adcreatives' in url:
+            body = {'data': [{'id': 'creative_of_' + url.split('/')[0]}]}
+        elif '/previews' in url:
+            body = {'data': [{'body': '<iframe src="preview?a=1;t=2"></iframe>'}]}
+        else:
+            body = {'embed_html': f'<iframe video="{url.split("?")[0]}"></iframe>'}
+        return {'code': 200, 'body': json.dumps(body)}
+
+    def _handle(self, handler: BaseHTTPRequestHandler):
+        length = int(handler.headers.get('Content-Length', 0))
+        form = parse_qs(handler.rfile.read(length).decode())
+        batch = json.loads(form['batch'][0])
+        with self._lock:
+            self.batches.append(batch)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            time.sleep(self.delay)
+            mentions = lambda keys: [item for item in batch if any(key in unquote(item['relative_url']) for key in keys)]
+            if mentions(self.broken_keys):
+                return self._send(handler, 500, b'{"error": {"message": "boom"}}')
+            failing = mentions(self.failing_keys)
+            answers = [{'code': 500, 'body': '{"error": {}}'} if item in failing else self._answer(item) for item in batch]
+            if mentions(self.truncated_keys):
+                answers = answers[:-1]
+            self._send(handler, 200, json.dumps(answers).encode())
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    @staticmethod
+    def _send(handler: BaseHTTPRequestHandler, status: int, body: bytes):
+        handler.send_response(status)
+        handler.send_header('Content-Type', 'application/json')
+        handler.send_header('Content-Length', str(len(body)))
+        handler.end_headers()
+        handler.wfile.write(body)
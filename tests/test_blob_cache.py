@@ -0,0 +1,41 @@
+import os
+import time
+
+from blob_cache import BlobCache, STALE_TMP_SECONDS, TMP_PREFIX
+
+
+def _old_temp_file(directory, name: str, age: float) -> str:
+    path = os.path.join(directory, TMP_PREFIX + name)
+    with open(path, 'wb') as f:
+        f.write(b'x' * 100)
+    past = time.time() - age
+    os.utime(path, (past, past))
+    return path
+
+
+def test_stale_temp_files_are_swept_at_startup(tmp_path):
+    stale = _old_temp_file(tmp_path, 'dead', STALE_TMP_SECONDS + 60)
+    in_progress = _old_temp_file(tmp_path, 'writing', 5)
+    BlobCache(directory=str(tmp_path))
+    assert not os.path.exists(stale)
+    assert os.path.exists(in_progress)
+
+
+def test_stale_temp_files_are_swept_on_eviction(tmp_path):
+    cache = BlobCache(directory=str(tmp_path), max_bytes=1024)
+    stale = _old_temp_file(tmp_path, 'dead', STALE_TMP_SECONDS + 60)
+    cache.put('bucket', 'file.csv', 1, 'md5', b'content')
+    assert not os.path.exists(stale)
+    assert cache.get('bucket', 'file.csv', 1, 'md5') == b'content'
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = BlobCache(directory=str(tmp_path), max_bytes=250)
+    for generation in range(3):
+        cache.put('bucket', 'file.csv', generation, 'md5', b'x' * 100)
+        past = time.time() - 100 + generation
+        os.utime(os.path.join(tmp_path, cache.key('bucket', 'file.csv', generation, 'md5')), (past, past))
+    cache.evict()
+    assert cache.get('bucket', 'file.csv', 0, 'md5') is None
+    assert cache.get('bucket', 'file.csv', 2, 'md5') is not None
+    assert cache.size() <= 250
@@ -0,0 +1,73 @@
+import weakref
+
+import pandas as pd
+import pytest
+
+from compute_graph import RAN, REUSED, ComputeGraph, GraphState
+
+
+class Frame(pd.DataFrame):
+    """A frame that can be weakly referenced, to see what the session state keeps alive"""
+
+
+def declare(state: GraphState, dataset: pd.DataFrame, version: int, metric: str) -> ComputeGraph:
+    graph = ComputeGraph(state)
+    graph.set_input('fb', dataset, key=version)
+    graph.set_input('metric', metric)
+
+    @graph.node('totals', ['fb'])
+    def totals(fb):
+        return Frame(fb.groupby('name').sum())
+
+    @graph.node('sorted_totals', ['totals', 'metric'])
+    def sorted_totals(totals, metric):
+        return totals.sort_values(metric)
+
+    return graph
+
+
+def dataset(spend: list) -> Frame:
+    return Frame({'name': ['a', 'b', 'c'], 'spend': spend, 'clicks': [3, 2, 1]})
+
+
+def test_only_the_nodes_downstream_of_a_change_run():
+    state = GraphState()
+    fb = dataset([1.0, 2.0, 3.0])
+    graph = declare(state, fb, 1, 'spend')
+    graph.get('sorted_totals')
+    assert graph.last_run['totals'][0] == RAN
+
+    graph = declare(state, fb, 1, 'clicks')
+    assert graph.get('sorted_totals').index.tolist() == ['c', 'b', 'a']
+    assert graph.last_run['totals'][0] == REUSED
+    assert graph.last_run['sorted_totals'][0] == RAN
+
+
+def test_session_state_keeps_only_the_keys_of_the_inputs():
+    state = GraphState()
+    graph = declare(state, dataset([1.0, 2.0, 3.0]), 1, 'spend')
+    graph.get('sorted_totals')
+    assert state.keys == {'fb': 1, 'metric': 'spend'}
+    assert set(state.values) == {'totals', 'sorted_totals'}
+
+
+def test_a_new_version_drops_the_old_outputs():
+    state = GraphState()
+    graph = declare(state, dataset([1.0, 2.0, 3.0]), 1, 'spend')
+    old_totals = weakref.ref(graph.get('totals'))
+    old_sorted = weakref.ref(graph.get('sorted_totals'))
+    del graph
+
+    graph = declare(state, dataset([5.0, 2.0, 3.0]), 2, 'spend') # nothing is got on this rerun
+    assert state.values == {}
+    assert old_totals() is None and old_sorted() is None
+
+    assert graph.get('sorted_totals')['spend'].tolist() == [2.0, 3.0, 5.0]
+    assert graph.last_run['totals'][0] == RAN
+
+
+def test_inputs_must_be_set_on_the_rerun():
+    state = GraphState()
+    declare(state, dataset([1.0, 2.0, 3.0]), 1, 'spend').get('totals')
+    with pytest.raises(KeyError):
+        ComputeGraph(state).get('metric') # the value of a previous rerun is not kept
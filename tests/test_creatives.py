@@ -0,0 +1,98 @@
+import pytest
+
+import creatives
+from creatives import BATCH_SIZE, MAX_CONCURRENT_REQUESTS, PreviewFetcher
+from fake_graph import FakeGraphServer
+
+
+@pytest.fixture
+def graph(monkeypatch):
+    server = FakeGraphServer().start()
+    monkeypatch.setenv('GRAPH_API_URL', server.url)
+    yield server
+    server.stop()
+
+
+def fetcher() -> PreviewFetcher:
+    return PreviewFetcher(access_token='token', ad_account='act_1')
+
+
+def test_graph_api_url_points_to_the_stand_in(graph):
+    results = fetcher().fetch([('video', 'v1'), ('image', 'h1'), ('preview', 'ad1')])
+    assert results[('video', 'v1')] == '<iframe video="v1"></iframe>'
+    assert results[('image', 'h1')] == 'https://images/h1.jpg'
+    assert results[('preview', 'ad1')] == '<iframe src="preview?a=1&t=2"></iframe>'
+    assert len(graph.batches) == 1
+
+
+def test_batches_are_split_at_batch_size_items(graph):
+    previews = fetcher()
+    previews.fetch([('video', f'v{i}') for i in range(2 * BATCH_SIZE + 1)])
+    assert sorted(len(batch) for batch in graph.batches) == [1, BATCH_SIZE, BATCH_SIZE]
+    assert previews.stats()['batch_requests'] == 3
+
+
+def test_the_items_of_a_preview_stay_in_the_same_batch(graph):
+    lookups = [('video', 'v0')] + [('preview', f'ad{i}') for i in range(BATCH_SIZE // 2)]
+    results = fetcher().fetch(lookups)
+    assert all(len(batch) <= BATCH_SIZE for batch in graph.batches)
+    assert sorted(len(batch) for batch in graph.batches) == [2, BATCH_SIZE - 1]
+    assert all(value is not None for value in results.values())
+
+
+def test_concurrent_requests_are_capped(monkeypatch):
+    server = FakeGraphServer(delay=0.2).start()
+    monkeypatch.setenv('GRAPH_API_URL', server.url)
+    try:
+        results = fetcher().fetch([('video', f'v{i}') for i in range(10 * BATCH_SIZE)])
+    finally:
+        server.stop()
+    assert len(server.batches) == 10
+    assert server.max_in_flight == MAX_CONCURRENT_REQUESTS
+    assert all(value is not None for value in results.values())
+
+
+def test_failed_items_and_batches_give_none_and_are_not_memoized(graph):
+    graph.failing_keys = {'v_bad'}
+    graph.broken_keys = {'h_broken'}
+    graph.truncated_keys = {'v_last'}
+    previews = fetcher()
+    lookups = [('video', 'v_ok'), ('video', 'v_bad')] + [('video', f'a{i}') for i in range(BATCH_SIZE - 2)] # batch 1
+    lookups += [('image', 'h_broken')] + [('video', f'b{i}') for i in range(BATCH_SIZE - 1)] # batch 2
+    lookups += [('video', 'v_other'), ('video', 'v_last')] # batch 3
+    results = previews.fetch(lookups)
+
+    assert len(graph.batches) == 3
+    assert results[('video', 'v_ok')] is not None
+    assert results[('video', 'v_bad')] is None # item answered with an error code
+    assert results[('image', 'h_broken')] is None # whole batch failed
+    assert results[('video', 'b0')] is None
+    assert results[('video', 'v_other')] is not None
+    assert results[('video', 'v_last')] is None # missing from a cut short answer
+
+    graph.failing_keys, graph.broken_keys, graph.truncated_keys = set(), set(), set()
+    batches = len(graph.batches)
+    retried = previews.fetch([('video', 'v_ok'), ('video', 'v_bad'), ('image', 'h_broken'), ('video', 'v_last')])
+    assert all(value is not None for value in retried.values())
+    assert len(graph.batches) == batches + 1
+    assert [item['relative_url'].split('?')[0] for item in graph.batches[-1]] == ['v_bad', 'act_1/adimages', 'v_last']
+
+
+def test_cache_hits_make_no_requests(graph):
+    previews = fetcher()
+    lookups = [('video', 'v1'), ('image', 'h1'), ('preview', 'ad1')]
+    first = previews.fetch(lookups)
+    assert len(graph.batches) == 1
+    assert previews.fetch(lookups) == first
+    assert previews.fetch(lookups + lookups) == first # repeated lookups are fetched once
+    assert len(graph.batches) == 1
+    assert previews.stats()['hits'] == 6
+
+
+def test_expired_entries_are_fetched_again(graph, monkeypatch):
+    previews = PreviewFetcher(access_token='token', ad_account='act_1', ttl=60)
+    previews.fetch([('video', 'v1')])
+    now = creatives.time.monotonic()
+    monkeypatch.setattr(creatives.time, 'monotonic', lambda: now + 61)
+    previews.fetch([('video', 'v1')])
+    assert len(graph.batches) == 2
@@ -0,0 +1,27 @@
+import pandas as pd
+
+from annotations import LOG_FILE, SNAPSHOT_FILE, apply_changes
+from datasets import DatasetRegistry
+
+
+def test_patch_leaves_the_frames_already_handed_out_untouched():
+    registry = DatasetRegistry()
+    annotations = pd.DataFrame({'big_idea': ['a', 'b']}, index=['adset_1', 'adset_2'])
+    registry._entries[('annotations', None)] = ((1, 1), annotations)
+    changes = {'adset_2': {'big_idea': 'c'}, 'adset_3': {'big_idea': 'd'}}
+
+    registry.patch('annotations', lambda frame: apply_changes(frame, changes), {SNAPSHOT_FILE: 1, LOG_FILE: 1},
+                   {SNAPSHOT_FILE: 1, LOG_FILE: 2})
+
+    assert annotations['big_idea'].tolist() == ['a', 'b'] # another session may still be reading it
+    version, patched = registry._entries[('annotations', None)]
+    assert version == (1, 2)
+    assert patched['big_idea'].to_dict() == {'adset_1': 'a', 'adset_2': 'c', 'adset_3': 'd'}
+
+
+def test_patch_drops_the_copies_of_other_generations():
+    registry = DatasetRegistry()
+    registry._entries[('annotations', None)] = ((1, 3), pd.DataFrame({'big_idea': ['a']}, index=['adset_1']))
+    registry.patch('annotations', lambda frame: apply_changes(frame, {}), {SNAPSHOT_FILE: 1, LOG_FILE: 1},
+                   {SNAPSHOT_FILE: 1, LOG_FILE: 2})
+    assert registry._entries == {}
@@ -0,0 +1,148 @@
+import pandas as pd
+
+import funnel
+from funnel import LeadFunnel, merge_leads
+from identity import add_person_id
+from periods import index_by_day
+from sheets import FakeWorksheet, IncrementalSheet
+
+HEADER = ['Data', 'Email', 'Nome']
+
+
+def parse_leads(rows: pd.DataFrame) -> pd.DataFrame:
+    rows['Data'] = pd.to_datetime(rows['Data'])
+    return rows
+
+
+def lead_rows(first: int, last: int) -> list:
+    return [[f'2024-01-{1 + i % 28:02d}', f'Lead{i}@Mail.com ', f'Lead {i}'] for i in range(first, last)]
+
+
+def hotmart_sales(buyers: list, value: float = 100.0) -> pd.DataFrame:
+    sales = pd.DataFrame({'email': [f'lead{i}@mail.com' for i in buyers],
+                          'approved_date': '2024-02-01', 'order_date': '2024-02-01', 'status': 'APPROVED',
+                          'tracking.source': 'sheets', 'tracking.source_sck': pd.Categorical(['funil'] * len(buyers)),
+                          'source': 'PRODUCER', 'commission.value': value, 'is_free_funnel': True})
+    return index_by_day(add_person_id(sales, 'email'), 'order_date')
+
+
+def sorted_funnel(funnel: pd.DataFrame) -> pd.DataFrame:
+    return funnel.sort_values(['Email', 'approved_date']).reset_index(drop=True)
+
+
+def test_refresh_reads_only_the_rows_after_the_watermark():
+    worksheet = FakeWorksheet([HEADER] + lead_rows(0, 10))
+    sheet = IncrementalSheet(worksheet, parse=parse_leads)
+    assert len(sheet.refresh()) == 10
+    assert sheet.watermark == 10
+
+    for row in lead_rows(10, 13):
+        worksheet.append_row(row)
+    requests = worksheet.requests
+    new_rows = sheet.refresh(force=True)
+    assert worksheet.requests == requests + 1 # the header is only read once
+    assert new_rows.index.tolist() == [10, 11, 12]
+    assert new_rows['Email'].tolist() == ['Lead10@Mail.com ', 'Lead11@Mail.com ', 'Lead12@Mail.com ']
+    assert sheet.watermark == 13
+    assert len(sheet.refresh(force=True)) == 0
+
+
+def test_refresh_is_throttled():
+    worksheet = FakeWorksheet([HEADER] + lead_rows(0, 3))
+    sheet = IncrementalSheet(worksheet, parse=parse_leads, refresh_interval=3600)
+    sheet.refresh()
+    worksheet.append_row(lead_rows(3, 4)[0])
+    assert len(sheet.refresh()) == 0
+    assert len(sheet.refresh(force=True)) == 1
+
+
+def test_restart_reloads_from_the_feather_cache(tmp_path):
+    cache_path = str(tmp_path / 'leads.feather')
+    worksheet = FakeWorksheet([HEADER] + lead_rows(0, 20))
+    IncrementalSheet(worksheet, cache_path=cache_path, parse=parse_leads).refresh()
+
+    worksheet.append_row(lead_rows(20, 21)[0])
+    worksheet.requests = 0
+    restarted = IncrementalSheet(worksheet, cache_path=cache_path, parse=parse_leads)
+    assert restarted.watermark == 20
+    assert restarted.header == HEADER
+    assert pd.api.types.is_datetime64_any_dtype(restarted.frame['Data']) # parsed before being saved
+    new_rows = restarted.refresh()
+    assert new_rows.index.tolist() == [20]
+    assert worksheet.requests == 1 # only the rows after the cached ones
+    assert restarted.frame['Email'].tolist() == [row[1] for row in lead_rows(0, 21)]
+
+
+def test_reset_reads_the_whole_sheet_again(tmp_path):
+    cache_path = str(tmp_path / 'leads.feather')
+    worksheet = FakeWorksheet([HEADER] + lead_rows(0, 5))
+    sheet = IncrementalSheet(worksheet, cache_path=cache_path, parse=parse_leads)
+    sheet.refresh()
+    worksheet.rows[1][2] = 'Editado'
+    sheet.reset()
+    assert not (tmp_path / 'leads.feather').exists()
+    assert sheet.refresh(force=True)['Nome'].iloc[0] == 'Editado'
+
+
+class CountingMerge:
+    """Stands in for funnel.merge_leads, recording the number of leads of each call"""
+
+    def __init__(self, monkeypatch):
+        self.leads_merged = []
+        monkeypatch.setattr(funnel, 'merge_leads', self)
+
+    def __call__(self, leads, hotmart):
+        self.leads_merged.append(len(leads))
+        return merge_leads(leads, hotmart)
+
+
+def test_update_merges_only_the_new_leads(monkeypatch):
+    merges = CountingMerge(monkeypatch)
+    worksheet = FakeWorksheet([HEADER] + lead_rows(0, 30))
+    sheet = IncrementalSheet(worksheet, parse=parse_leads)
+    hotmart = hotmart_sales([1, 5, 25, 32])
+    lead_funnel = LeadFunnel()
+
+    sheet.refresh()
+    assert len(lead_funnel.update(sheet.frame, hotmart, ('hotmart', 1))) == 3
+    for row in lead_rows(30, 35):
+        worksheet.append_row(row)
+    sheet.refresh(force=True)
+    funnel = lead_funnel.update(sheet.frame, hotmart, ('hotmart', 1))
+    assert merges.leads_merged == [30, 5]
+    assert sorted(funnel['Email'].str.strip().str.lower()) == ['lead1@mail.com', 'lead25@mail.com', 'lead32@mail.com',
+                                                               'lead5@mail.com']
+    assert lead_funnel.merged.index.tolist() == list(range(35)) # positions in merged
+    assert lead_funnel.update(sheet.frame, hotmart, ('hotmart', 1)) is funnel # nothing new, nothing merged
+    assert merges.leads_merged == [30, 5]
+
+
+def test_new_hotmart_version_merges_every_lead_again(monkeypatch):
+    merges = CountingMerge(monkeypatch)
+    leads = IncrementalSheet(FakeWorksheet([HEADER] + lead_rows(0, 30)), parse=parse_leads)
+    leads.refresh()
+    lead_funnel = LeadFunnel()
+    lead_funnel.update(leads.frame, hotmart_sales([1, 5]), ('hotmart', 1))
+
+    funnel = lead_funnel.update(leads.frame, hotmart_sales([1, 5, 7], value=50.0), ('hotmart', 2))
+    assert merges.leads_merged == [30, 30]
+    assert len(funnel) == 3
+    assert (funnel['commission.value'] == 50.0).all()
+
+
+def test_incremental_funnel_equals_a_full_merge():
+    worksheet = FakeWorksheet([HEADER] + lead_rows(0, 40))
+    sheet = IncrementalSheet(worksheet, parse=parse_leads)
+    hotmart = hotmart_sales([0, 3, 3, 17, 41, 44, 55])
+    lead_funnel = LeadFunnel()
+    for last in [40, 43, 43, 50, 60]:
+        for row in lead_rows(len(worksheet.rows) - 1, last):
+            worksheet.append_row(row)
+        sheet.refresh(force=True)
+        funnel = lead_funnel.update(sheet.frame, hotmart, ('hotmart', 1))
+
+    full = merge_leads(sheet.frame, hotmart)
+    full_funnel = full.loc[full['conversion_time'] >= 0]
+    pd.testing.assert_frame_equal(sorted_funnel(funnel.drop(columns='day')), sorted_funnel(full_funnel))
+    pd.testing.assert_frame_equal(lead_funnel.merged.reset_index(drop=True), full.reset_index(drop=True))
+    assert funnel['day'].is_monotonic_increasing
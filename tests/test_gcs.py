@@ -0,0 +1,73 @@
+import pytest
+
+import gcs
+from blob_cache import BlobCache
+from fake_gcs import FakeGCSServer
+
+BUCKET = 'dashboard_marketing_processed'
+
+
+@pytest.fixture
+def fake_gcs(monkeypatch, tmp_path):
+    server = FakeGCSServer().start()
+    monkeypatch.setenv('STORAGE_EMULATOR_HOST', server.url)
+    pool = gcs.StoragePool()
+    cache = BlobCache(directory=str(tmp_path / 'blobs'))
+    monkeypatch.setattr(gcs, 'get_storage_pool', lambda: pool)
+    monkeypatch.setattr(gcs, 'get_blob_cache', lambda: cache)
+    yield server, pool, cache
+    server.stop()
+
+
+def test_client_and_buckets_are_reused(fake_gcs):
+    _, pool, _ = fake_gcs
+    assert pool.bucket(BUCKET) is pool.bucket(BUCKET)
+    assert pool.client() is pool.client()
+    stats = pool.stats()
+    assert stats['clients_created'] == 1
+    assert stats['client_reuses'] == 3
+
+
+def test_requests_reuse_the_connection(fake_gcs):
+    server, pool, _ = fake_gcs
+    server.put(BUCKET, 'warm_up.csv', b'a\n')
+    gcs.get_data_from_bucket(BUCKET, 'warm_up.csv')
+    before = pool.stats()
+    assert before['http_requests'] == sum(server.requests.values())
+
+    for i in range(5):
+        server.put(BUCKET, f'file_{i}.csv', f'a,b\n{i},2\n'.encode())
+        assert gcs.get_data_from_bucket(BUCKET, f'file_{i}.csv') == f'a,b\n{i},2\n'
+
+    after = pool.stats()
+    assert after['http_requests'] - before['http_requests'] == 10 # metadata + media of each blob
+    assert after['http_connections'] == before['http_connections'] # all over the open keep-alive connections
+    assert after['connection_reuses'] - before['connection_reuses'] == 10
+
+
+def test_unchanged_generation_is_served_from_the_cache(fake_gcs):
+    server, _, cache = fake_gcs
+    server.put(BUCKET, 'hotmart.csv', b'x\n1\n')
+    gcs.get_data_from_bucket(BUCKET, 'hotmart.csv')
+    assert gcs.get_data_from_bucket(BUCKET, 'hotmart.csv') == 'x\n1\n'
+    assert server.requests['media'] == 1
+    assert cache.stats()['hits'] == 1
+
+    server.put(BUCKET, 'hotmart.csv', b'x\n2\n') # new generation
+    assert gcs.get_data_from_bucket(BUCKET, 'hotmart.csv') == 'x\n2\n'
+    assert server.requests['media'] == 2
+
+
+def test_missing_blob(fake_gcs):
+    with pytest.raises(gcs.NoBlobsFoundError):
+        gcs.get_data_from_bucket(BUCKET, 'missing.csv')
+    assert gcs.read_blob(BUCKET, 'missing.csv') == (None, 0, {})
+
+
+def test_read_generation_fetches_only_the_metadata(fake_gcs):
+    server, _, _ = fake_gcs
+    server.put(BUCKET, 'annotations_df.feather', b'snapshot' * 1000)
+    server.put(BUCKET, 'annotations_df.feather', b'snapshot' * 1000)
+    assert gcs.read_generation(BUCKET, 'annotations_df.feather') == 2
+    assert gcs.read_generation(BUCKET, 'missing.feather') == 0
+    assert server.requests['media'] == 0
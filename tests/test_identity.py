@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from identity import NO_PERSON, PERSON_COLUMN, IdentityIndex, merge_by_person
+
+
+def test_person_ids_are_dense_and_stable():
+    index = IdentityIndex()
+    first = index.person_ids(pd.Series([' Ana@x.com', 'bia@x.com', 'ana@x.com ', None, 'sem email']))
+    assert first.tolist() == [0, 1, 0, NO_PERSON, NO_PERSON]
+    second = index.person_ids(pd.Series(['carla@x.com', 'BIA@X.COM']))
+    assert second.tolist() == [2, 1]
+    assert len(index) == 3
+
+
+def test_batches_only_insert_their_new_emails():
+    index = IdentityIndex()
+    for batch in range(5):
+        index.person_ids(pd.Series([f'lead{i}@x.com' for i in range(batch * 100, batch * 100 + 150)]))
+    assert len(index) == 550
+    assert index.person_ids(pd.Series(['lead549@x.com', 'lead0@x.com'])).tolist() == [549, 0]
+
+
+@pytest.mark.parametrize('how', ['left', 'inner'])
+def test_merge_by_person_matches_the_hash_merge(how):
+    rng = np.random.default_rng(0)
+    left = pd.DataFrame({PERSON_COLUMN: rng.integers(-1, 50, size=300), 'Data': np.arange(300), 'value': 'lead'})
+    right = pd.DataFrame({PERSON_COLUMN: rng.integers(-1, 50, size=200), 'status': rng.choice(['APPROVED', 'REFUNDED'], size=200),
+                          'value': rng.random(200)})
+    expected = left.merge(right.loc[right[PERSON_COLUMN] != NO_PERSON], on=PERSON_COLUMN, how=how, sort=False)
+    pd.testing.assert_frame_equal(merge_by_person(left, right, how=how), expected)
+
+
+def test_merge_by_person_without_matches():
+    left = pd.DataFrame({PERSON_COLUMN: [NO_PERSON, 3], 'Data': [1, 2]})
+    right = pd.DataFrame({PERSON_COLUMN: pd.Series([], dtype=np.int64), 'status': pd.Series([], dtype=object)})
+    merged = merge_by_person(left, right)
+    assert merged['Data'].tolist() == [1, 2]
+    assert merged['status'].isna().all()
+    assert len(merge_by_person(left, right, how='inner')) == 0
@@ -0,0 +1,84 @@
+from datetime import date
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import masks
+from masks import Mask, MaskSet, load_masks
+from periods import index_by_day
+
+PREDICATES = {'valid': lambda df: df['status'] == 'APPROVED', 'producer': lambda df: df['source'] == 'PRODUCER'}
+
+
+def sales(n_rows: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({'order_date': pd.Timestamp('2024-01-01') + pd.to_timedelta(rng.integers(0, 60, n_rows), unit='D'),
+                       'status': rng.choice(['APPROVED', 'REFUNDED'], n_rows),
+                       'source': rng.choice(['PRODUCER', 'AFFILIATE'], n_rows)})
+    return index_by_day(df, 'order_date')
+
+
+def test_masks_compose_like_the_boolean_filters():
+    df = sales(1001)
+    mask_set = MaskSet(df, PREDICATES)
+    valid, producer = df['status'] == 'APPROVED', df['source'] == 'PRODUCER'
+    for mask, expected in [(mask_set['valid'] & mask_set['producer'], valid & producer),
+                           (mask_set['valid'] | mask_set['producer'], valid | producer),
+                           (~mask_set['valid'], ~valid)]:
+        assert mask.count() == expected.sum()
+        pd.testing.assert_frame_equal(mask.select(mask_set.frame), df.loc[expected])
+
+
+def test_select_a_date_window():
+    df = sales(500)
+    valid = MaskSet(df, PREDICATES)['valid']
+    window = valid.select(df, date(2024, 1, 10), date(2024, 1, 20))
+    days = df['order_date'].dt.date
+    expected = df.loc[(df['status'] == 'APPROVED') & (days >= date(2024, 1, 10)) & (days <= date(2024, 1, 20))]
+    pd.testing.assert_frame_equal(window, expected)
+
+
+def test_select_refuses_a_frame_of_another_version():
+    valid = Mask.from_bool(sales(100)['status'] == 'APPROVED')
+    with pytest.raises(ValueError):
+        valid.select(sales(120))
+
+
+@pytest.fixture
+def versioned_frame(monkeypatch):
+    """A frame of FRAMES whose version can be changed by the test, like a dataset reloaded by another session"""
+    state = {'version': 1, 'loads': 0, 'bump_on_load': False}
+
+    def load_frame():
+        state['loads'] += 1
+        frame = sales(100 + state['version'], seed=state['version'])
+        if state['bump_on_load']: # a new version lands while this one is being loaded
+            state['version'], state['bump_on_load'] = state['version'] + 1, False
+        return frame
+
+    monkeypatch.setitem(masks.FRAMES, 'test_sales', (load_frame, lambda: (state['version'],), PREDICATES))
+    masks._get_masks.clear()
+    yield state
+    masks._get_masks.clear()
+
+
+def test_masks_are_shared_by_version(versioned_frame):
+    assert load_masks('test_sales') is load_masks('test_sales')
+    assert versioned_frame['loads'] == 1
+    versioned_frame['version'] = 2
+    assert len(load_masks('test_sales').frame) == 102
+
+
+def test_a_frame_loaded_during_a_version_change_is_not_cached_under_the_old_version(versioned_frame):
+    versioned_frame['bump_on_load'] = True
+    mask_set = load_masks('test_sales')
+    assert versioned_frame['loads'] == 2
+    assert len(mask_set.frame) == 102 == len(mask_set['valid']) # the frame of the version it is cached under
+    assert masks._get_masks('test_sales', (2,)) is mask_set
+
+
+def test_mask_sets_carry_their_version(versioned_frame):
+    assert load_masks('test_sales').version == (1,)
+    versioned_frame['version'] = 2
+    assert load_masks('test_sales').version == (2,)
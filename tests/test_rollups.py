@@ -0,0 +1,22 @@
+import pandas as pd
+
+from benchmarks.generators import generate, raw_annotations
+from metrics import group_metrics
+from rollups import build_fb_cube
+
+
+def test_unannotated_adsets_are_not_an_annotation_group():
+    fb = generate('fb', 5_000)
+    annotations = raw_annotations(fb)
+    cube = build_fb_cube(fb, annotations)
+    assert cube['big_idea'].isna().any() # some adsets still without annotation
+
+    grouped = group_metrics(cube, 'big_idea')
+    assert '' not in grouped.index
+    assert 'nan' not in grouped.index
+
+    # same groups and spend as grouping the raw rows annotated by the merge (unannotated rows dropped)
+    annotated = fb.merge(annotations, left_on='adset_name', right_index=True, how='inner')
+    expected = annotated.groupby('big_idea')['spend'].sum()
+    pd.testing.assert_series_equal(grouped['spend'].sort_index(), expected.sort_index(), check_names=False,
+                                   check_index_type=False, check_dtype=False)
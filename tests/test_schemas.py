@@ -0,0 +1,30 @@
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+
+from schemas import FB_MONEY, FB_SCHEMA, apply_schema, read_fb_csv
+
+
+def test_fb_money_columns_are_float64():
+    assert all(FB_SCHEMA[col] == 'float64' for col in FB_MONEY)
+    assert FB_SCHEMA['impressions'] == 'float32'
+
+
+def test_spend_sum_keeps_the_cents():
+    cents = np.random.default_rng(0).integers(1, 50_000, size=200_000)
+    spend = [f'{value / 100:.2f}' for value in cents]
+    csv = 'date,campaign_name,spend,action_value_purchase,cost_per_thruplay,n_video_view,impressions\n' + \
+          '\n'.join(f'2024-01-01,c,{value},{value},0.01,1,1' for value in spend)
+    fb_data = read_fb_csv(csv)
+    expected = sum(Decimal(value) for value in spend)
+    for col in ['spend', 'action_value_purchase']:
+        assert fb_data[col].dtype == 'float64'
+        assert Decimal(f'{fb_data[col].sum():.2f}') == expected
+
+
+def test_apply_schema_upcasts_float32_money():
+    fb_data = pd.DataFrame({'spend': np.array([0.1, 0.2], dtype='float32'), 'reach': [1.0, 2.0]})
+    fb_data = apply_schema(fb_data, FB_SCHEMA)
+    assert fb_data['spend'].dtype == 'float64'
+    assert fb_data['reach'].dtype == 'float32'
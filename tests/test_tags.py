@@ -0,0 +1,60 @@
+from datetime import date
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import tags
+from periods import index_by_day
+from tags import TagIndex, load_tag_index
+
+
+def contacts(n_rows: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    tag_lists = [rng.choice([1, 2, 3, 172, 214], size=rng.integers(0, 4)) for _ in range(n_rows)]
+    tag_lists[0] = None # contact without tags
+    df = pd.DataFrame({'id': np.arange(n_rows), 'tag': pd.Series(tag_lists, dtype=object),
+                       'cdate': pd.Timestamp('2024-01-01') + pd.to_timedelta(rng.integers(0, 90, n_rows), unit='D')})
+    return index_by_day(df, 'cdate')
+
+
+def test_select_without_matches_a_scan_of_the_tag_lists():
+    df = contacts(500)
+    index = TagIndex.from_frame(df)
+    selected = index.select_without(index.frame, [172, 214], date(2024, 1, 15), date(2024, 2, 15))
+    days = df['cdate'].dt.date
+    clean = df['tag'].map(lambda value: not isinstance(value, np.ndarray) or not np.isin(value, [172, 214]).any())
+    pd.testing.assert_frame_equal(selected, df.loc[clean & (days >= date(2024, 1, 15)) & (days <= date(2024, 2, 15))])
+
+
+def test_select_without_refuses_a_frame_of_another_version():
+    index = TagIndex.from_frame(contacts(100))
+    with pytest.raises(ValueError):
+        index.select_without(contacts(101), [172])
+
+
+@pytest.fixture
+def versioned_contacts(monkeypatch):
+    """active_contacts whose version can change while it is loaded, like a dataset reloaded by another session"""
+    state = {'version': 1, 'loads': 0, 'bump_on_load': False}
+
+    def load_dataset(name):
+        state['loads'] += 1
+        frame = contacts(100 + state['version'], seed=state['version'])
+        if state['bump_on_load']:
+            state['version'], state['bump_on_load'] = state['version'] + 1, False
+        return frame
+
+    monkeypatch.setattr(tags, 'load_dataset', load_dataset)
+    monkeypatch.setattr(tags, 'get_dataset_version', lambda name: (state['version'],))
+    tags._get_tag_index.clear()
+    yield state
+    tags._get_tag_index.clear()
+
+
+def test_the_index_is_cached_with_the_frame_of_its_version(versioned_contacts):
+    versioned_contacts['bump_on_load'] = True
+    index = load_tag_index()
+    assert versioned_contacts['loads'] == 2
+    assert len(index) == len(index.frame) == 102
+    assert load_tag_index() is index